@@ -1,12 +1,17 @@
+import time
+import threading
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional, Dict, Any
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
+from cachetools import TTLCache
 
 from config import settings
-from supabase_db import get_user_by_id, get_user_by_email
+from supabase_db import get_user_by_id, get_user_by_email, get_user_by_email_async
 
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -16,6 +21,19 @@ import secrets
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_PREFIX}/auth/login", auto_error=False)
 
+# Users resolved from tokens, kept briefly so back-to-back requests skip the users lookup.
+# The cache is per process: invalidate_user_cache only clears the worker that handled the
+# change, so other workers may serve a stale row (is_active, user_type included) for up to
+# the TTL. Sync routes invalidate from threadpool threads, hence the lock.
+_user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=10)
+_user_cache_lock = threading.Lock()
+
+
+def invalidate_user_cache(user_id: int) -> None:
+    """Drop a user's cached row after it changes."""
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
 def generate_reset_token() -> str:
     """Generate a secure password reset token."""
     return secrets.token_urlsafe(32)
@@ -51,19 +69,37 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+@lru_cache(maxsize=1024)
+def _decode_token(token: str) -> dict:
+    """Verify a token's signature once; expiry is checked per call by verify_token."""
+    return jwt.decode(
+        token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM], options={"verify_exp": False}
+    )
+
+
 def verify_token(token: str) -> Optional[dict]:
     """Verify and decode a JWT token."""
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
+        payload = _decode_token(token)
     except JWTError:
         return None
+    exp = payload.get("exp")
+    if exp is not None and exp <= time.time():
+        return None
+    return payload
 
 
 async def get_current_user(
+    request: Request,
     token: Optional[str] = Depends(oauth2_scheme)
 ) -> Optional[Dict[str, Any]]:
-    """Get the current authenticated user from JWT token."""
+    """Get the current authenticated user from JWT token (loaded once per request)."""
+    # Dependency results are cached per route, but request.state also covers
+    # callers outside the dependency graph (middleware, nested routers)
+    cached = getattr(request.state, "user", None)
+    if cached is not None:
+        return cached
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -87,9 +123,15 @@ async def get_current_user(
     except (ValueError, TypeError):
         raise credentials_exception
 
-    user = get_user_by_id(user_id)
+    with _user_cache_lock:
+        user = _user_cache.get(user_id)
     if user is None:
-        raise credentials_exception
+        # The Supabase client is blocking; keep the lookup off the event loop
+        user = await run_in_threadpool(get_user_by_id, user_id)
+        if user is None:
+            raise credentials_exception
+        with _user_cache_lock:
+            _user_cache[user_id] = user
 
     if not user.get('is_active', False):
         raise HTTPException(
@@ -97,6 +139,7 @@ async def get_current_user(
             detail="User account is inactive"
         )
 
+    request.state.user = user
     return user
 
 
@@ -122,11 +165,24 @@ def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
     return user
 
 
+async def authenticate_user_async(email: str, password: str) -> Optional[Dict[str, Any]]:
+    """Async version of authenticate_user; bcrypt runs in a worker thread."""
+    user = await get_user_by_email_async(email)
+    if not user:
+        return None
+    if not await run_in_threadpool(verify_password, password, user['password_hash']):
+        return None
+    return user
+
+
+@lru_cache(maxsize=None)
 def require_user_type(*allowed_types: str):
-    """Dependency factory to require specific user types."""
+    """Dependency factory to require specific user types (one shared checker per type set)."""
+    allowed = frozenset(t.upper() for t in allowed_types)
+
     async def user_type_checker(current_user: Dict[str, Any] = Depends(get_current_active_user)) -> Dict[str, Any]:
         user_type = current_user.get('user_type', '').upper()
-        if user_type not in [t.upper() for t in allowed_types]:
+        if user_type not in allowed:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Access denied. Required user types: {', '.join(allowed_types)}"
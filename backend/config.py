@@ -1,6 +1,7 @@
 import os
+import asyncio
 import warnings
-from typing import Optional, List
+from typing import Any, Awaitable, Callable, Optional, List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import field_validator
 from functools import lru_cache
@@ -27,6 +28,7 @@ class Settings(BaseSettings):
     SUPABASE_DB_URL: Optional[str] = os.getenv("SUPABASE_DB_URL")  # Optional: Supabase connection
     DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
     DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    WORKER_THREADS: int = int(os.getenv("WORKER_THREADS", "100"))  # threadpool size for sync routes
     
     # Database URL normalization - handles postgres:// -> postgresql:// conversion
     @property
@@ -47,6 +49,7 @@ class Settings(BaseSettings):
     LLM_MODEL: str = os.getenv("LLM_MODEL", "gemini-2.5-flash")  
     LLM_TEMPERATURE: float = 0.7
     LLM_MAX_TOKENS: int = 8192
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))  # in-flight Gemini calls per process
     
     # File Storage
     STORAGE_TYPE: str = os.getenv("STORAGE_TYPE", "local")  # local, s3, supabase
@@ -64,10 +67,12 @@ class Settings(BaseSettings):
     TESSERACT_PATH: Optional[str] = os.getenv("TESSERACT_PATH")
     POPPLER_PATH: Optional[str] = os.getenv("POPPLER_PATH")
     OCR_PROVIDER: str = os.getenv("OCR_PROVIDER", "tesseract")  # tesseract or cloud
+    OCR_CONCURRENCY: int = int(os.getenv("OCR_CONCURRENCY", str(os.cpu_count() or 2)))  # concurrent extractions per process
     
     # Redis Cache
     REDIS_URL: Optional[str] = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     CACHE_TTL: int = 3600  # 1 hour
+    LLM_REDIS_CACHE_ENABLED: bool = os.getenv("LLM_REDIS_CACHE_ENABLED", "False").lower() == "true"  # share LLM results across workers
     
     # Email Settings
     MAIL_ENABLED: bool = os.getenv("MAIL_ENABLED", "False").lower() == "true"
@@ -90,6 +95,8 @@ class Settings(BaseSettings):
     # Render frontend URLs should be added via environment variable
     # Store as string to avoid JSON parsing issues, parse in property
     CORS_ORIGINS: str = ""
+    # Preflight cache lifetime in seconds; Firefox honours up to 86400, Chromium caps it at 7200
+    CORS_MAX_AGE: int = int(os.getenv("CORS_MAX_AGE", "86400"))
     
     @property
     def cors_origins_list(self) -> List[str]:
@@ -161,6 +168,18 @@ def get_settings() -> Settings:
 # Global settings instance
 settings = get_settings()
 
+
+def _supabase_http_limits():
+    """Connection limits for the Supabase HTTP pools, sized like a DB pool:
+    DB_POOL_SIZE warm connections plus DB_MAX_OVERFLOW burst."""
+    import httpx
+    return httpx.Limits(
+        max_connections=settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW,
+        max_keepalive_connections=settings.DB_POOL_SIZE,
+        keepalive_expiry=60.0,
+    )
+
+
 # Initialize Supabase client
 try:
     from supabase import create_client, Client
@@ -168,15 +187,80 @@ try:
         supabase = None
     else:
         try:
+            import httpx
             from supabase.lib.client_options import ClientOptions
-            supabase: Client = create_client(
-                settings.SUPABASE_URL,
-                settings.SUPABASE_KEY,
-                options=ClientOptions(postgrest_client_timeout=10),
-            )
+            # One pooled keep-alive HTTP client for all PostgREST/storage calls
+            http_client = httpx.Client(timeout=httpx.Timeout(10.0), limits=_supabase_http_limits())
+            try:
+                options = ClientOptions(postgrest_client_timeout=10, httpx_client=http_client)
+            except TypeError:
+                # Older supabase releases do not accept a shared httpx client
+                http_client.close()
+                options = ClientOptions(postgrest_client_timeout=10)
+            supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY, options=options)
         except Exception:
             supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
 except ImportError:
     supabase = None
     warnings.warn("Supabase client not available. Install with: pip install supabase", UserWarning)
 
+class AsyncOnce:
+    """Run an async initializer once; concurrent callers wait for and share the first result."""
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._done = False
+        self._value: Any = None
+
+    async def run(self, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+        if self._done:
+            return self._value
+        async with self._lock:
+            if not self._done:
+                # A failed initializer leaves _done unset so the next caller retries
+                self._value = await coro_factory()
+                self._done = True
+        return self._value
+
+    def reset(self) -> None:
+        """Forget the cached value so the next run() initializes again."""
+        self._done = False
+        self._value = None
+
+
+# Async Supabase client, created on first use because it must be built inside the running event loop
+_async_supabase_once = AsyncOnce()
+_async_http_client = None
+
+
+async def _create_async_supabase():
+    global _async_http_client
+    import httpx
+    from supabase import acreate_client
+    from supabase.lib.client_options import AsyncClientOptions
+    # Same pool sizing as the sync client, shared by every async PostgREST call
+    http_client = httpx.AsyncClient(timeout=httpx.Timeout(10.0), limits=_supabase_http_limits())
+    try:
+        options = AsyncClientOptions(postgrest_client_timeout=10, httpx_client=http_client)
+        _async_http_client = http_client
+    except TypeError:
+        await http_client.aclose()
+        options = AsyncClientOptions(postgrest_client_timeout=10)
+    return await acreate_client(settings.SUPABASE_URL, settings.SUPABASE_KEY, options=options)
+
+
+async def get_async_supabase():
+    """Get the shared async Supabase client, creating it on first call."""
+    if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
+        raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set")
+    return await _async_supabase_once.run(_create_async_supabase)
+
+
+async def close_async_supabase() -> None:
+    """Close the async client's connection pool (at shutdown); a later call to get_async_supabase rebuilds it."""
+    global _async_http_client
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+    _async_supabase_once.reset()
+    _async_http_client = None
+
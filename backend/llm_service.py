@@ -1,42 +1,476 @@
-import json
+import asyncio
 import hashlib
-from typing import Dict, List, Optional, Any
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
 from datetime import datetime, timezone
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
+import numpy as np
+import orjson
+from cachetools import TTLCache
 
 from config import settings
 import logging
 logger = logging.getLogger(__name__)
 
 
+_GRADE_SCORES = {"A": 12, "A-": 11, "B+": 10, "B": 9, "B-": 8, "C+": 7, "C": 6, "C-": 5, "D+": 4, "D": 3, "E": 1}
+_GRADE_KEYS_SORTED = np.array(sorted(_GRADE_SCORES))
+_GRADE_VALS_SORTED = np.array([_GRADE_SCORES[k] for k in _GRADE_KEYS_SORTED], dtype=np.int8)
+
+
+def rank_subjects_by_grade(subjects: List[str], grades: Dict[str, str]) -> List[str]:
+    """Order subjects from strongest to weakest grade (unknown grades rank as E)."""
+    if not subjects:
+        return []
+    grades_arr = np.array([str(grades.get(s, "E")) for s in subjects])
+    idx = np.minimum(np.searchsorted(_GRADE_KEYS_SORTED, grades_arr), len(_GRADE_KEYS_SORTED) - 1)
+    scores = np.where(_GRADE_KEYS_SORTED[idx] == grades_arr, _GRADE_VALS_SORTED[idx], 1)
+    order = np.argsort(-scores, kind="stable")
+    return [subjects[i] for i in order]
+
+
+# Default safety settings; relatively permissive but safe for edu content
+_SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_ONLY_HIGH"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_ONLY_HIGH"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"},
+]
+
+
+_DEFAULT_SYSTEM_PROMPT = "You are a helpful AI assistant for SmartPath, an educational platform for Kenyan high school students. Always respond in JSON format when requested."
+_JSON_ONLY_INSTRUCTION = "IMPORTANT: Respond ONLY with valid JSON. Do not include any markdown formatting, code blocks, or explanatory text. Just the raw JSON."
+
+
+# Static prompt scaffolding; only the {placeholders} are filled per call.
+# Schemas and rules that never change live in system instructions, which Gemini
+# receives separately from the short per-request user prompt.
+_STUDY_PLAN_SYSTEM = """You are a study planner for SmartPath, an educational platform for Kenyan high school students.
+
+Provide a study plan in JSON format:
+{
+  "weekly_schedule": [
+    {
+      "day": "Monday",
+      "subjects": [
+        {"subject": "Mathematics", "duration_minutes": 60, "focus": "Calculus - Derivatives and Limits", "priority": 8}
+      ]
+    },
+    ...
+  ],
+  "focus_areas": {
+    "Mathematics": "Specific focus areas for Mathematics (e.g., Calculus, Algebra, Geometry)"
+  },
+  "strategies": {
+    "Mathematics": "Detailed study strategy focusing on the requested topics (e.g., Calculus). Include specific techniques, practice methods, and review schedules."
+  },
+  "recommendations": ["tip1", "tip2", ...]
+}
+
+CRITICAL REQUIREMENTS:
+1. If specific focus areas are provided, you MUST prioritize and explicitly mention those topics in:
+   - The "focus_areas" field for that subject
+   - The "strategies" field for that subject  
+   - The "focus" field in weekly_schedule entries for that subject
+
+2. For focus_areas field: 
+   - If user specified topics (e.g., "Calculus, Derivatives"), your focus_areas should expand on these
+   - Example: If user says "Calculus, Derivatives", your focus_areas["Mathematics"] should be something like:
+     "Calculus (Derivatives, Limits, Applications), Algebra fundamentals, Problem-solving techniques"
+   - DO NOT use generic phrases like "Core concepts and fundamentals" - be SPECIFIC
+
+3. For strategies field:
+   - Must explicitly mention the requested focus topics
+   - Provide specific study techniques for those topics
+   - Example: "Focus on mastering Calculus derivatives through daily practice problems. Start with basic derivative rules, then progress to chain rule and product rule. Use visual aids to understand limits and continuity concepts."
+
+4. For weekly_schedule:
+   - Each subject entry should have a "focus" field that mentions the specific topics
+   - Example: "Calculus - Derivatives and Chain Rule" or "Algebra - Quadratic Equations and Factoring"
+
+5. Allocate more time to weaker subjects
+6. Distribute study time across the week for balanced learning
+7. Ensure each subject gets adequate time based on priority
+8. For the subject "Kiswahili", the ENTIRE content in the "focus_areas" field MUST be written in the Swahili language. This includes the explanations and descriptions. Do not mix English. Example: Instead of "Alphabet recognition", use "Kutambua herufi". Instead of "comprehension", use "Ufahamu". Ensure the whole sentence is in Swahili."""
+
+_STUDY_PLAN_PROMPT = """Create a detailed weekly study plan for a Grade {grade_level} Kenyan student.
+
+Subjects to Study: {subjects}
+Available Hours per Day: {available_hours}
+Days until Exam: {days_until_exam}{focus_areas_text}"""
+
+_LEARNING_STRATEGY_PROMPT = """Create a comprehensive learning strategy for a Grade {grade_level} student struggling with {topic} in {subject}.
+
+Difficulty Level: {difficulty}
+
+Provide in JSON format:
+{{
+  "explanation": "Clear explanation of the topic",
+  "examples": ["example1", "example2", ...],
+  "common_misconceptions": ["misconception1", ...],
+  "practice_problems": ["problem1", ...],
+  "resources": ["resource1", ...],
+  "study_tips": ["tip1", "tip2", ...]
+}}
+
+Make it age-appropriate and aligned with Kenyan curriculum."""
+
+_EVALUATE_ANSWER_PROMPT = """Evaluate a student's answer to a question in {subject}.
+
+Question: {question}
+Correct Answer: {correct_answer}
+Student's Answer: {student_answer}
+
+Provide evaluation in JSON format:
+{{
+  "correct": true/false,
+  "score": 0.0-1.0,
+  "feedback": "Detailed feedback on the answer",
+  "suggestions": ["suggestion1", "suggestion2", ...],
+  "key_points": ["point1", "point2", ...]
+}}
+
+Be encouraging and constructive. Highlight what the student got right and what needs improvement."""
+
+_PERFORMANCE_TRENDS_PROMPT = """Summarize academic performance trends for a Kenyan high school student.
+
+Per-subject trends (grades on a 0-12 scale):
+{trend_summary}
+
+Provide analysis in JSON format:
+{{
+  "overall_assessment": "Overall performance assessment",
+  "interventions": ["intervention1", "intervention2", ...]
+}}"""
+
+
+# Response schemas for Gemini structured output
+_STRING_LIST_SCHEMA = {"type": "ARRAY", "items": {"type": "STRING"}}
+
+_LEARNING_STRATEGY_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "explanation": {"type": "STRING"},
+        "examples": _STRING_LIST_SCHEMA,
+        "common_misconceptions": _STRING_LIST_SCHEMA,
+        "practice_problems": _STRING_LIST_SCHEMA,
+        "resources": _STRING_LIST_SCHEMA,
+        "study_tips": _STRING_LIST_SCHEMA,
+    },
+    "required": ["explanation", "examples", "common_misconceptions", "practice_problems", "resources", "study_tips"],
+}
+
+_EVALUATION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "correct": {"type": "BOOLEAN"},
+        "score": {"type": "NUMBER"},
+        "feedback": {"type": "STRING"},
+        "suggestions": _STRING_LIST_SCHEMA,
+        "key_points": _STRING_LIST_SCHEMA,
+    },
+    "required": ["correct", "score", "feedback", "suggestions", "key_points"],
+}
+
+_TRENDS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "overall_assessment": {"type": "STRING"},
+        "interventions": _STRING_LIST_SCHEMA,
+    },
+    "required": ["overall_assessment", "interventions"],
+}
+
+
+@lru_cache(maxsize=64)
+def _study_plan_schema(subjects: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+    """Build the study plan response schema; per-subject maps list the subjects as properties."""
+    if not subjects:
+        return None
+    subject_map = {
+        "type": "OBJECT",
+        "properties": {subject: {"type": "STRING"} for subject in subjects},
+        "required": list(subjects),
+    }
+    return {
+        "type": "OBJECT",
+        "properties": {
+            "weekly_schedule": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "day": {"type": "STRING"},
+                        "subjects": {
+                            "type": "ARRAY",
+                            "items": {
+                                "type": "OBJECT",
+                                "properties": {
+                                    "subject": {"type": "STRING"},
+                                    "duration_minutes": {"type": "INTEGER"},
+                                    "focus": {"type": "STRING"},
+                                    "priority": {"type": "INTEGER"},
+                                },
+                                "required": ["subject", "duration_minutes", "focus", "priority"],
+                            },
+                        },
+                    },
+                    "required": ["day", "subjects"],
+                },
+            },
+            "focus_areas": subject_map,
+            "strategies": subject_map,
+            "recommendations": _STRING_LIST_SCHEMA,
+        },
+        "required": ["weekly_schedule", "focus_areas", "strategies", "recommendations"],
+    }
+
+
+@lru_cache(maxsize=256)
+def _render_study_plan_prompt(
+    grade_level: int,
+    subjects: Tuple[str, ...],
+    available_hours: float,
+    days_until_exam: int,
+    focus_items: Tuple[Tuple[str, Tuple[str, ...]], ...]
+) -> str:
+    """Render the study plan prompt; repeat previews with unchanged inputs reuse the same string."""
+    # Build focus areas section for prompt in a single pass (focus_items only holds non-empty topics)
+    focus_areas_text = ""
+    if focus_items:
+        parts = ["\n\nSpecific Focus Areas Requested by Student:"]
+        parts.extend(f"- {subject}: {', '.join(topics)}" for subject, topics in focus_items)
+        parts.append("\nIMPORTANT: The study plan MUST prioritize and include these specific topics. Allocate more time to these focus areas in the weekly schedule.")
+        focus_areas_text = "\n".join(parts)
+
+    return _STUDY_PLAN_PROMPT.format_map({
+        "grade_level": grade_level,
+        "subjects": ", ".join(subjects),
+        "available_hours": available_hours,
+        "days_until_exam": days_until_exam,
+        "focus_areas_text": focus_areas_text,
+    })
+
+
+def _fit_grade_trend(values: List[float]) -> Dict[str, Any]:
+    """Fit a linear trend to a numeric grade series (0-12 scale)."""
+    y = np.asarray(values, dtype=np.float64)
+    n = len(y)
+    if n < 2:
+        slope, predicted, confidence = 0.0, float(y[0]) if n else 0.0, 0.5
+    else:
+        x = np.arange(n, dtype=np.float64)
+        slope, intercept = np.polyfit(x, y, 1)
+        predicted = slope * n + intercept
+        ss_res = float(((y - (slope * x + intercept)) ** 2).sum())
+        ss_tot = float(((y - y.mean()) ** 2).sum())
+        # R² as confidence; a flat series fits perfectly
+        confidence = 1.0 - ss_res / ss_tot if ss_tot else 1.0
+
+    if slope > 0.1:
+        trend = "improving"
+    elif slope < -0.1:
+        trend = "declining"
+    else:
+        trend = "stable"
+
+    factors = [f"Average of {float(y.mean()) if n else 0.0:.1f}/12 across {n} report(s)"]
+    if n >= 2:
+        factors.append(f"Change of {float(slope):+.2f} grade points per report")
+
+    return {
+        "trend": trend,
+        "predicted_next": round(min(max(float(predicted), 0.0), 12.0), 2),
+        "confidence": round(min(max(confidence, 0.0), 1.0), 2),
+        "factors": factors,
+    }
+
+
+def _strip_code_fences(text: str) -> str:
+    """Remove a surrounding markdown code block from a JSON response."""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    elif text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+
+def _extract_json_block(text: str, openers: str = "{[") -> Optional[str]:
+    """Return the first balanced JSON object/array in text (single linear scan, string-aware)."""
+    start = -1
+    for i, ch in enumerate(text):
+        if ch in openers:
+            start = i
+            break
+    if start < 0:
+        return None
+
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+class _JsonArrayItemScanner:
+    """Incrementally extract complete items of a top-level JSON array field from streamed text."""
+
+    def __init__(self, key: str):
+        self._key = f'"{key}"'
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = ""
+        self._key_pending = False
+        self._array_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self._done = False
+
+    @property
+    def offset(self) -> int:
+        """Number of characters scanned so far."""
+        return self._pos
+
+    def feed(self, chunk: str) -> List[str]:
+        """Consume a chunk and return the raw JSON of any items completed by it."""
+        self._text += chunk
+        text = self._text
+        items: List[str] = []
+        for pos in range(self._pos, len(text)):
+            ch = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start:pos + 1]
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = pos
+                self._key_pending = False
+            elif ch == ":":
+                self._key_pending = self._depth == 1 and self._last_string == self._key
+            elif ch in "{[":
+                self._depth += 1
+                if ch == "[" and self._key_pending and self._array_depth is None:
+                    self._array_depth = self._depth
+                elif (self._array_depth is not None and not self._done
+                      and self._item_start is None and self._depth == self._array_depth + 1):
+                    self._item_start = pos
+                self._key_pending = False
+            elif ch in "}]":
+                if self._item_start is not None and self._depth == self._array_depth + 1:
+                    items.append(text[self._item_start:pos + 1])
+                    self._item_start = None
+                elif self._array_depth is not None and self._depth == self._array_depth:
+                    self._done = True
+                self._depth -= 1
+            elif not ch.isspace():
+                self._key_pending = False
+        self._pos = len(text)
+        return items
+
+
+# Dedicated pool so large parses never queue behind (or starve) the default executor
+_PARSE_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm-json")
+_OFFLOAD_PARSE_BYTES = 16 * 1024
+
+
+async def _aparse(data: str) -> Any:
+    """Parse JSON, moving large payloads off the event loop."""
+    if len(data) > _OFFLOAD_PARSE_BYTES:
+        return await asyncio.get_running_loop().run_in_executor(_PARSE_EXECUTOR, orjson.loads, data)
+    return orjson.loads(data)
+
+
+def _dumps_pretty(data: Any) -> str:
+    """Serialize data as indented JSON for embedding in prompts."""
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+
+
+@lru_cache(maxsize=1)
+def _genai():
+    """Import the Gemini SDK on first use; it is heavy and only AI routes need it."""
+    import google.generativeai as genai
+    genai.configure(api_key=settings.GEMINI_API_KEY)
+    return genai
+
+
+@lru_cache(maxsize=8)
+def get_gemini_model(model_name: str, system_instruction: Optional[str] = None):
+    """Get a shared Gemini model instance (configured once per process)."""
+    return _genai().GenerativeModel(model_name, system_instruction=system_instruction)
+
+
 class LLMService:
     """Service for interacting with Gemini LLM."""
+
+    __slots__ = ("provider", "model_name", "temperature", "max_tokens", "model", "client_available", "_usage_counter", "_sem", "_cache", "_inflight", "_redis")
     
     def __init__(self):
         """Initialize LLM service with Gemini."""
-        self.provider = settings.LLM_PROVIDER.lower()
-        self.model_name = settings.LLM_MODEL
+        # Resolve settings once; they are read on every request path below
+        provider, model_name = settings.LLM_PROVIDER, settings.LLM_MODEL
+        api_key = settings.GEMINI_API_KEY
+        self.provider = provider.lower()
+        self.model_name = model_name
         self.temperature = settings.LLM_TEMPERATURE
         self.max_tokens = settings.LLM_MAX_TOKENS
+        self.model = None
+        self._usage_counter = 0  # total tokens reported by Gemini, for cost telemetry
+        self._sem = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        self._cache: TTLCache = TTLCache(maxsize=10_000, ttl=settings.CACHE_TTL)
+        self._inflight: Dict[bytes, asyncio.Task] = {}
+        # Optional second cache tier shared by all workers (connects lazily on first use)
+        self._redis = None
+        if settings.ENABLE_LLM_CACHING and settings.LLM_REDIS_CACHE_ENABLED and settings.REDIS_URL:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(
+                settings.REDIS_URL,
+                socket_connect_timeout=0.5,
+                socket_timeout=0.5,
+            )
         
         # Initialize Gemini client
-        if settings.GEMINI_API_KEY:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
+        if api_key:
             try:
-                self.model = genai.GenerativeModel(self.model_name)
+                self.model = get_gemini_model(model_name)
                 self.client_available = True
             except Exception as e:
-                logger.warning(f"Gemini initialization error: {e}")
+                logger.warning("Gemini initialization error: %s", e)
                 self.client_available = False
         else:
             self.client_available = False
             logger.warning("No Gemini API key configured. LLM features will be disabled.")
     
-    def _generate_cache_key(self, prompt: str, context: Dict) -> str:
-        """Generate cache key for prompt."""
-        content = f"{prompt}{json.dumps(context, sort_keys=True)}"
-        return hashlib.md5(content.encode()).hexdigest()
+    def _generate_cache_key(self, prompt: str, context_bytes: bytes = b"") -> bytes:
+        """Generate cache key for prompt and pre-serialized context."""
+        return hashlib.blake2b(prompt.encode() + context_bytes, digest_size=16).digest()
     
     # ==================== MATH SOLVER ROUTES ====================
 
@@ -71,9 +505,9 @@ class LLMService:
         
         try:
             response = await self.generate(prompt, json_mode=True)
-            return json.loads(response)
+            return await _aparse(response)
         except Exception as e:
-            logger.error(f"Practice problem generation error: {e}")
+            logger.error("Practice problem generation error: %s", e)
             return []
 
     async def solve_math_problem(
@@ -109,149 +543,272 @@ class LLMService:
         try:
             response = await self.model.generate_content_async(
                 contents,
-                 generation_config=genai.types.GenerationConfig(
+                 generation_config=_genai().types.GenerationConfig(
                     temperature=0.2, # Low temp for math
                     max_output_tokens=4096,
                 )
             )
             return response.text
         except Exception as e:
-            logger.error(f"Math solver error: {e}")
+            logger.error("Math solver error: %s", e)
             return f"Error solving problem: {str(e)}"
 
-    async def _call_gemini(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+    def _model_for(self, system_prompt: Optional[str]):
+        """Get the model carrying the given system instruction."""
+        return get_gemini_model(self.model_name, system_prompt) if system_prompt else self.model
+
+    def _generation_config(self, max_tokens: int, json_mode: bool = False, schema: Optional[Dict[str, Any]] = None):
+        """Build the generation config, asking Gemini for (schema-constrained) JSON when requested."""
+        structured: Dict[str, Any] = {}
+        if json_mode or schema:
+            structured["response_mime_type"] = "application/json"
+        if schema:
+            structured["response_schema"] = schema
+        return _genai().types.GenerationConfig(
+            temperature=self.temperature,
+            max_output_tokens=max_tokens,
+            **structured,
+        )
+
+    async def _generate_content(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        safety_settings: List[Dict[str, str]],
+        max_tokens: int,
+        json_mode: bool = False,
+        schema: Optional[Dict[str, Any]] = None
+    ):
+        """Run a single Gemini generation and record its token usage."""
+        model = self._model_for(system_prompt)
+        generation_config = self._generation_config(max_tokens, json_mode, schema)
+        try:
+            response = await model.generate_content_async(
+                prompt,
+                generation_config=generation_config,
+                safety_settings=safety_settings,
+            )
+        except Exception:
+            # Fallback: retry without safety_settings if the SDK rejects categories
+            response = await model.generate_content_async(prompt, generation_config=generation_config)
+
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self._usage_counter += getattr(usage, "total_token_count", 0) or 0
+        return response
+
+    @staticmethod
+    def _finish_reason(response) -> str:
+        """Get the finish reason name of the first candidate ("SAFETY" if the prompt was blocked)."""
+        candidates = getattr(response, "candidates", None) or []
+        if not candidates:
+            feedback = getattr(response, "prompt_feedback", None)
+            return "SAFETY" if getattr(feedback, "block_reason", None) else ""
+        reason = getattr(candidates[0], "finish_reason", None)
+        return getattr(reason, "name", str(reason or ""))
+
+    @staticmethod
+    def _response_text(response) -> str:
+        """Extract text from a Gemini response, stitching candidate parts if needed."""
+        # Prefer quick accessor; it raises when the candidate has no parts
+        try:
+            text = response.text
+        except Exception:
+            text = None
+        if text and text.strip():
+            return text.strip()
+
+        collected: List[str] = []
+        for cand in getattr(response, "candidates", []) or []:
+            parts = getattr(getattr(cand, "content", None), "parts", []) or []
+            for p in parts:
+                part_text = getattr(p, "text", None)
+                if part_text and part_text.strip():
+                    collected.append(part_text)
+        return "\n".join(collected).strip()
+
+    async def _call_gemini(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        json_mode: bool = False,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> str:
         """Call Gemini API."""
         if not self.client_available:
             raise ValueError("Gemini client not initialized")
         
         try:
-            # Combine system prompt and user prompt
-            full_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
-            
-            # Default safety settings; relatively permissive but safe for edu content
-            # Use a conservative set of safety settings with categories known to be widely supported
-            safety_settings = [
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_ONLY_HIGH"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_ONLY_HIGH"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"},
-            ]
+            max_tokens = self.max_tokens
 
-            # Generate content
-            try:
-                response = self.model.generate_content(
-                    full_prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=self.temperature,
-                        max_output_tokens=self.max_tokens,
-                    ),
-                    safety_settings=safety_settings,
-                )
-            except Exception:
-                # Fallback: retry without safety_settings if the SDK rejects categories
-                response = self.model.generate_content(
-                    full_prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=self.temperature,
-                        max_output_tokens=self.max_tokens,
-                    ),
-                )
+            response = await self._generate_content(prompt, system_prompt, _SAFETY_SETTINGS, max_tokens, json_mode, schema)
+            finish_reason = self._finish_reason(response)
 
-            # Prefer quick accessor, but fall back to stitching from candidates when absent
-            text = getattr(response, "text", None)
-            if text and text.strip():
-                return text.strip()
-
-            # Try to collect text from candidates/parts
-            collected: List[str] = []
-            for cand in getattr(response, "candidates", []) or []:
-                parts = getattr(getattr(cand, "content", None), "parts", []) or []
-                for p in parts:
-                    # Parts often expose .text; fallback to str
-                    part_text = getattr(p, "text", None)
-                    if part_text:
-                        collected.append(part_text)
-            stitched = "\n".join([t for t in collected if t and t.strip()])
-            if stitched.strip():
-                return stitched.strip()
-
-            # No usable text: attempt a second pass with even more permissive thresholds
-            relaxed_settings = [
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-            ]
-            try:
-                response2 = self.model.generate_content(
-                    full_prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=self.temperature,
-                        max_output_tokens=self.max_tokens,
-                    ),
-                    safety_settings=relaxed_settings,
-                )
-            except Exception:
-                response2 = self.model.generate_content(
-                    full_prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=self.temperature,
-                        max_output_tokens=self.max_tokens,
-                    ),
-                )
-            text2 = getattr(response2, "text", None)
-            if text2 and text2.strip():
-                return text2.strip()
-            collected2: List[str] = []
-            for cand in getattr(response2, "candidates", []) or []:
-                parts = getattr(getattr(cand, "content", None), "parts", []) or []
-                for p in parts:
-                    part_text = getattr(p, "text", None)
-                    if part_text:
-                        collected2.append(part_text)
-            stitched2 = "\n".join([t for t in collected2 if t and t.strip()])
-            if stitched2.strip():
-                return stitched2.strip()
+            if finish_reason == "MAX_TOKENS":
+                # Truncated output is useless to JSON callers; retry once with more room
+                max_tokens *= 2
+                logger.info("Gemini hit max_output_tokens; retrying with %d", max_tokens)
+                response = await self._generate_content(prompt, system_prompt, _SAFETY_SETTINGS, max_tokens, json_mode, schema)
+                finish_reason = self._finish_reason(response)
+
+            # A SAFETY block is not retried: the defaults are already the loosest
+            # thresholds we allow, so a second call would only be blocked again
+            text = self._response_text(response)
+            if text:
+                return text
 
             # Still nothing: raise to trigger fallback
-            raise RuntimeError("No text returned from Gemini response")
+            raise RuntimeError(f"No text returned from Gemini response (finish_reason={finish_reason or 'UNKNOWN'})")
         except Exception as e:
             raise Exception(f"Gemini API error: {str(e)}")
     
-    async def generate(self, prompt: str, context: Optional[Dict] = None, system_prompt: Optional[str] = None, json_mode: bool = False) -> str:
+    async def generate(
+        self,
+        prompt: str,
+        context: Optional[Dict] = None,
+        system_prompt: Optional[str] = None,
+        json_mode: bool = False,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> str:
         """Generate text using Gemini LLM."""
         if not self.client_available:
             return self._get_fallback_response(prompt)
         
-        context = context or {}
-        system_prompt = system_prompt or "You are a helpful AI assistant for SmartPath, an educational platform for Kenyan high school students. Always respond in JSON format when requested."
+        try:
+            return await self._generate_raw(prompt, context, system_prompt, json_mode, schema)
+        except Exception as e:
+            logger.error("LLM generation error: %s", e)
+            return self._get_fallback_response(prompt)
+
+    async def _generate_raw(
+        self,
+        prompt: str,
+        context: Optional[Dict] = None,
+        system_prompt: Optional[str] = None,
+        json_mode: bool = False,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Generate text using Gemini LLM, raising on failure instead of falling back."""
+        system_prompt = system_prompt or _DEFAULT_SYSTEM_PROMPT
         
-        # Add context to prompt if provided
+        # Add context to prompt if provided (serialized once; the same bytes key the cache)
         if context:
-            context_str = json.dumps(context, indent=2)
-            prompt = f"{prompt}\n\nContext:\n{context_str}"
+            ctx_bytes = orjson.dumps(context, option=orjson.OPT_SORT_KEYS)
+            prompt = f"{prompt}\n\nContext:\n{ctx_bytes.decode()}"
         
         # Request JSON format if needed
         if json_mode:
-            prompt = f"{prompt}\n\nIMPORTANT: Respond ONLY with valid JSON. Do not include any markdown formatting, code blocks, or explanatory text. Just the raw JSON."
+            prompt = f"{prompt}\n\n{_JSON_ONLY_INSTRUCTION}"
+        
+        # Bound in-flight provider calls so batch fan-outs stay under the rate limit
+        async with self._sem:
+            response = await self._call_gemini(prompt, system_prompt, json_mode, schema)
         
+        # Clean JSON response if json_mode
+        if json_mode:
+            response = _strip_code_fences(response)
+        
+        return response
+
+    async def _generate_json(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> Any:
+        """Generate and parse a JSON response."""
+        return await _aparse(await self._generate_raw(prompt, json_mode=True, schema=schema))
+
+    async def _redis_get(self, key: bytes) -> Any:
+        """Look up a parsed result in the shared Redis tier (None on miss or error)."""
+        if self._redis is None:
+            return None
         try:
-            response = await self._call_gemini(prompt, system_prompt)
-            
-            # Clean JSON response if json_mode
-            if json_mode:
-                # Remove markdown code blocks if present
-                response = response.strip()
-                if response.startswith("```json"):
-                    response = response[7:]
-                elif response.startswith("```"):
-                    response = response[3:]
-                if response.endswith("```"):
-                    response = response[:-3]
-                response = response.strip()
-            
-            return response
+            payload = await self._redis.get(b"llm:" + key)
+            return orjson.loads(zlib.decompress(payload)) if payload else None
         except Exception as e:
-            logger.error(f"LLM generation error: {e}")
-            return self._get_fallback_response(prompt)
+            logger.warning("LLM Redis cache read failed: %s", e)
+            return None
+
+    async def _redis_set(self, key: bytes, value: Any) -> None:
+        """Store a parsed result in the shared Redis tier, compressed."""
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(b"llm:" + key, zlib.compress(orjson.dumps(value), 3), ex=settings.CACHE_TTL)
+        except Exception as e:
+            logger.warning("LLM Redis cache write failed: %s", e)
+
+    async def _fetch_json(self, key: bytes, prompt: str, schema: Optional[Dict[str, Any]] = None) -> Any:
+        """Resolve a local cache miss: shared Redis tier first, then Gemini."""
+        cached = await self._redis_get(key)
+        if cached is not None:
+            return cached
+        parsed = await self._generate_json(prompt, schema)
+        await self._redis_set(key, parsed)
+        return parsed
+
+    def _finish_inflight(self, key: bytes, task: asyncio.Task) -> None:
+        """Drop a finished single-flight call and cache its result if it succeeded."""
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            return
+        # Retrieving the exception also marks it handled when every waiter was cancelled
+        if task.exception() is None:
+            # Failures never reach the cache, so fallbacks are not reused
+            self._cache[key] = task.result()
+
+    async def _cached_generate_json(
+        self,
+        prompt: str,
+        key: Optional[bytes] = None,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """Generate and parse a JSON response, reusing the parsed result for identical prompts."""
+        if not settings.ENABLE_LLM_CACHING:
+            return await self._generate_json(prompt, schema)
+
+        key = key or self._generate_cache_key(prompt)
+        cached = self._cache.get(key)
+        if cached is None:
+            # Single-flight: concurrent callers with the same key share one Gemini call
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._fetch_json(key, prompt, schema))
+                self._inflight[key] = task
+                task.add_done_callback(lambda t, k=key: self._finish_inflight(k, t))
+            # Shield so one cancelled caller does not cancel the shared call
+            cached = await asyncio.shield(task)
+        # Shallow copy so callers can annotate results without touching the cache
+        return dict(cached) if isinstance(cached, dict) else cached
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """Stream generated text from Gemini chunk by chunk."""
+        if not self.client_available:
+            yield self._get_fallback_response(prompt)
+            return
+
+        model = self._model_for(system_prompt or _DEFAULT_SYSTEM_PROMPT)
+        generation_config = self._generation_config(self.max_tokens, schema=schema)
+        async with self._sem:
+            response = await model.generate_content_async(
+                prompt,
+                generation_config=generation_config,
+                safety_settings=_SAFETY_SETTINGS,
+                stream=True,
+            )
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except Exception:
+                    # Chunks without parts (e.g. the final usage-only chunk)
+                    continue
+                if text:
+                    yield text
+
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self._usage_counter += getattr(usage, "total_token_count", 0) or 0
     
     def _get_fallback_response(self, prompt: str) -> str:
         """Return fallback response when LLM is unavailable."""
@@ -272,22 +829,22 @@ class LLMService:
                 focus_areas[subject] = f"Core concepts and fundamentals of {subject}"
                 strategies[subject] = f"Study {subject} regularly with practice exercises and review sessions."
 
-            return json.dumps({
+            return orjson.dumps({
                 "weekly_schedule": [],
                 "focus_areas": focus_areas,
                 "strategies": strategies,
                 "recommendations": ["Study regularly for consistent progress"]
-            })
+            }).decode()
         # For answer evaluation, return a valid structure
         if "evaluate" in prompt.lower() or "student's answer" in prompt.lower():
-            return json.dumps({
+            return orjson.dumps({
                 "correct": False,
                 "score": 0.0,
                 "feedback": "AI evaluation is temporarily unavailable. Please review the correct answer manually.",
                 "suggestions": ["Study the topic more", "Practice similar questions"],
                 "key_points": []
-            })
-        return json.dumps({"error": "LLM service temporarily unavailable", "message": "Please try again later"})
+            }).decode()
+        return orjson.dumps({"error": "LLM service temporarily unavailable", "message": "Please try again later"}).decode()
     
     # ==================== FLASHCARD GENERATION ====================
     
@@ -322,7 +879,7 @@ Make questions progressively more challenging. Ensure content is relevant to Ken
         
         try:
             response = await self.generate(prompt, json_mode=True)
-            data = json.loads(response)
+            data = await _aparse(response)
             
             if isinstance(data, list):
                 return data[:count]
@@ -331,7 +888,7 @@ Make questions progressively more challenging. Ensure content is relevant to Ken
             else:
                 return []
         except Exception as e:
-            logger.error(f"Flashcard generation error: {e}")
+            logger.error("Flashcard generation error: %s", e)
             return []
     
     async def get_resource_recommendations(
@@ -397,9 +954,9 @@ Make questions progressively more challenging. Ensure content is relevant to Ken
         prompt = f"""Analyze the academic performance of a Grade {grade_level} Kenyan student (Curriculum: {curriculum}).
 
 Current Grades:
-{json.dumps(current_grades, indent=2)}
+{_dumps_pretty(current_grades)}
 
-{f"Previous Grades:\n{json.dumps(previous_grades, indent=2)}" if previous_grades else "No previous grades available."}
+{f"Previous Grades:\n{_dumps_pretty(previous_grades)}" if previous_grades else "No previous grades available."}
 
 Provide a comprehensive analysis in JSON format:
 {{
@@ -416,18 +973,15 @@ Be specific, constructive, and culturally appropriate for Kenyan students."""
             response = await self.generate(prompt, json_mode=True)
             # Try to parse JSON response
             try:
-                feedback_data = json.loads(response)
-            except json.JSONDecodeError:
-                # If response is not valid JSON, try to extract JSON from markdown
-                import re
+                feedback_data = await _aparse(response)
+            except orjson.JSONDecodeError:
+                # If response is not valid JSON, try to extract the JSON object from surrounding text
                 feedback_data = None
-                
-                # Try to find JSON object
-                json_match = re.search(r'\{[\s\S]*\}', response)
-                if json_match:
+                json_block = _extract_json_block(response, "{")
+                if json_block:
                     try:
-                        feedback_data = json.loads(json_match.group())
-                    except json.JSONDecodeError:
+                        feedback_data = orjson.loads(json_block)
+                    except orjson.JSONDecodeError:
                         pass
                 
                 # If still no data, use empty dict (fallback will handle it)
@@ -443,7 +997,7 @@ Be specific, constructive, and culturally appropriate for Kenyan students."""
                 "next_steps": feedback_data.get("next_steps", ["Review weak areas", "Practice regularly"])
             }
         except Exception as e:
-            logger.error(f"Feedback generation error: {e}", exc_info=True)
+            logger.error("Feedback generation error: %s", e, exc_info=True)
             return {
                 "strengths": [],
                 "weaknesses": [],
@@ -485,14 +1039,14 @@ Be specific, constructive, and culturally appropriate for Kenyan students."""
         try:
             response = await self.model.generate_content_async(
                 contents,
-                 generation_config=genai.types.GenerationConfig(
+                 generation_config=_genai().types.GenerationConfig(
                     temperature=0.2, # Low temp for math
                     max_output_tokens=2048,
                 )
             )
             return response.text
         except Exception as e:
-            logger.error(f"Math solver error: {e}")
+            logger.error("Math solver error: %s", e)
             return f"Error solving problem: {str(e)}"
     
     # ==================== CHAT ASSISTANT ====================
@@ -573,14 +1127,14 @@ Be specific, constructive, and culturally appropriate for Kenyan students."""
             # We use generate_content with the list of messages for stateless chat
             response = await self.model.generate_content_async(
                 chat_history,
-                generation_config=genai.types.GenerationConfig(
+                generation_config=_genai().types.GenerationConfig(
                     temperature=0.7,
                     max_output_tokens=4096,
                 )
             )
             return response.text
         except Exception as e:
-            logger.error(f"Chat error: {e}")
+            logger.error("Chat error: %s", e)
             return "I'm having trouble connecting right now. Please try again."
 
     # ==================== CAREER RECOMMENDATIONS ====================
@@ -610,12 +1164,12 @@ Be specific, constructive, and culturally appropriate for Kenyan students."""
 Overall GPA: {overall_gpa:.2f}/4.0
 
 **Subject Grades:**
-{json.dumps(grades, indent=2)}
+{_dumps_pretty(grades)}
 
 **Strong Subjects:** {', '.join(strong_subjects) if strong_subjects else 'None identified'}
 **Weak Subjects:** {', '.join(weak_subjects) if weak_subjects else 'None identified'}
 
-{f"**Performance Trends:**\n" + json.dumps(trend_analysis, indent=2) if trend_analysis else ""}
+{f"**Performance Trends:**\n" + _dumps_pretty(trend_analysis) if trend_analysis else ""}
 
 **Instructions:**
 1. Provide 5 specific, actionable recommendations
@@ -642,7 +1196,7 @@ Return your response as a JSON array:"""
                 response_text = response_text.replace('```json', '').replace('```', '').strip()
             
             # Parse JSON
-            recommendations = json.loads(response_text)
+            recommendations = await _aparse(response_text)
             
             # Validate
             if isinstance(recommendations, list) and all(isinstance(r, str) for r in recommendations):
@@ -651,7 +1205,7 @@ Return your response as a JSON array:"""
                 raise ValueError("Invalid response format")
                 
         except Exception as e:
-            logger.error(f"Error generating AI recommendations: {e}")
+            logger.error("Error generating AI recommendations: %s", e)
             # Fallback recommendations
             recs = []
             if weak_subjects:
@@ -696,63 +1250,20 @@ Return ONLY the JSON array, no other text:"""
             response = await self.generate(prompt, json_mode=True)
             
             # Clean response - remove markdown code blocks and extra whitespace
-            import re
-            cleaned_response = response.strip()
-            
-            # Remove markdown code blocks (```json ... ``` or ``` ... ```)
-            cleaned_response = re.sub(r'^```(?:json)?\s*\n?', '', cleaned_response)
-            cleaned_response = re.sub(r'\n?```\s*$', '', cleaned_response)
-            cleaned_response = cleaned_response.strip()
+            cleaned_response = _strip_code_fences(response)
             
             # Parse JSON response
             data = None
-            parse_error = None
-            
-            # Try direct parsing first
             try:
-                data = json.loads(cleaned_response)
-            except json.JSONDecodeError:
-                # Try to find JSON array using bracket matching
-                if cleaned_response.strip().startswith('['):
-                    bracket_count = 0
-                    end_pos = 0
-                    in_string = False
-                    escape_next = False
-                    
-                    for i, char in enumerate(cleaned_response):
-                        if escape_next:
-                            escape_next = False
-                            continue
-                        if char == '\\' and in_string:
-                            escape_next = True
-                            continue
-                        if char == '"' and not escape_next:
-                            in_string = not in_string
-                            continue
-                        if in_string:
-                            continue
-                        if char == '[':
-                            bracket_count += 1
-                        elif char == ']':
-                            bracket_count -= 1
-                            if bracket_count == 0:
-                                end_pos = i + 1
-                                break
-                    
-                    if end_pos > 0:
-                        try:
-                            data = json.loads(cleaned_response[:end_pos])
-                        except json.JSONDecodeError:
-                            pass
-                
-                # Fallback: try regex extraction
-                if data is None:
-                    json_match = re.search(r'\[[\s\S]*?\](?=\s*$)', cleaned_response)
-                    if json_match:
-                        try:
-                            data = json.loads(json_match.group())
-                        except json.JSONDecodeError:
-                            pass
+                data = await _aparse(cleaned_response)
+            except orjson.JSONDecodeError:
+                # Fall back to the first balanced array in the text
+                json_block = _extract_json_block(cleaned_response, "[")
+                if json_block:
+                    try:
+                        data = orjson.loads(json_block)
+                    except orjson.JSONDecodeError:
+                        pass
             
             # If still no data, use empty list (fallback will handle it)
             if data is None:
@@ -805,7 +1316,7 @@ Return ONLY the JSON array, no other text:"""
 
             return normalized[:5]
         except Exception as e:
-            logger.error(f"Career recommendation error: {e}")
+            logger.error("Career recommendation error: %s", e)
             # Enhanced fallback based on subjects
             fallback_careers = {
                 "Mathematics": {
@@ -857,7 +1368,7 @@ Return ONLY the JSON array, no other text:"""
 
             suggestions = []
             # Sort subjects by grade performance
-            sorted_subjects = sorted(subjects, key=lambda s: self._grade_to_score(grades.get(s, "E")), reverse=True)
+            sorted_subjects = rank_subjects_by_grade(subjects, grades)
 
             for subject in sorted_subjects[:5]:
                 if subject in fallback_careers:
@@ -885,30 +1396,29 @@ Return ONLY the JSON array, no other text:"""
                 }
             ]
 
-            while len(suggestions) < 5:
-                for career in general_careers:
-                    if career not in suggestions:
-                        suggestions.append(career)
-                        break
+            for career in general_careers:
+                if len(suggestions) >= 5:
+                    break
+                if career not in suggestions:
+                    suggestions.append(career)
 
             return suggestions[:5]
 
     def _grade_to_score(self, grade: str) -> int:
         """Convert grade to numeric score for sorting."""
-        grade_scores = {"A": 12, "A-": 11, "B+": 10, "B": 9, "B-": 8, "C+": 7, "C": 6, "C-": 5, "D+": 4, "D": 3, "E": 1}
-        return grade_scores.get(grade, 1)
+        return _GRADE_SCORES.get(grade, 1)
     
     # ==================== STUDY PLAN GENERATION ====================
     
-    async def generate_study_plan(
+    def _build_study_plan_prompt(
         self,
         weak_subjects: List[str],
         available_hours: float,
-        exam_date: Optional[datetime] = None,
-        grade_level: int = 10,
-        focus_areas: Optional[Dict[str, List[str]]] = None
-    ) -> Dict[str, Any]:
-        """Generate personalized study plan."""
+        exam_date: Optional[datetime],
+        grade_level: int,
+        focus_areas: Optional[Dict[str, List[str]]]
+    ) -> str:
+        """Build the study plan prompt."""
         if exam_date:
             # Normalize both datetimes to UTC-aware for comparison
             now = datetime.now(timezone.utc)
@@ -921,107 +1431,42 @@ Return ONLY the JSON array, no other text:"""
         else:
             days_until_exam = 90
         
-        # Build focus areas section for prompt
-        focus_areas_text = ""
-        if focus_areas and len(focus_areas) > 0:
-            focus_areas_list = []
-            for subject, topics in focus_areas.items():
-                if topics and len(topics) > 0:
-                    topics_str = ", ".join(topics)
-                    focus_areas_list.append(f"{subject}: {topics_str}")
-            if focus_areas_list:
-                focus_areas_text = f"\n\nSpecific Focus Areas Requested by Student:\n" + "\n".join(f"- {item}" for item in focus_areas_list)
-                focus_areas_text += "\n\nIMPORTANT: The study plan MUST prioritize and include these specific topics. Allocate more time to these focus areas in the weekly schedule."
-        
-        prompt = f"""Create a detailed weekly study plan for a Grade {grade_level} Kenyan student.
-
-Subjects to Study: {', '.join(weak_subjects)}
-Available Hours per Day: {available_hours}
-Days until Exam: {days_until_exam}{focus_areas_text}
-
-Provide a study plan in JSON format:
-{{
-  "weekly_schedule": [
-    {{
-      "day": "Monday",
-      "subjects": [
-        {{"subject": "Mathematics", "duration_minutes": 60, "focus": "Calculus - Derivatives and Limits", "priority": 8}}
-      ]
-    }},
-    ...
-  ],
-  "focus_areas": {{
-    "Mathematics": "Specific focus areas for Mathematics (e.g., Calculus, Algebra, Geometry)"
-  }},
-  "strategies": {{
-    "Mathematics": "Detailed study strategy focusing on the requested topics (e.g., Calculus). Include specific techniques, practice methods, and review schedules."
-  }},
-  "recommendations": ["tip1", "tip2", ...]
-}}
-
-CRITICAL REQUIREMENTS:
-1. If specific focus areas are provided, you MUST prioritize and explicitly mention those topics in:
-   - The "focus_areas" field for that subject
-   - The "strategies" field for that subject  
-   - The "focus" field in weekly_schedule entries for that subject
-
-2. For focus_areas field: 
-   - If user specified topics (e.g., "Calculus, Derivatives"), your focus_areas should expand on these
-   - Example: If user says "Calculus, Derivatives", your focus_areas["Mathematics"] should be something like:
-     "Calculus (Derivatives, Limits, Applications), Algebra fundamentals, Problem-solving techniques"
-   - DO NOT use generic phrases like "Core concepts and fundamentals" - be SPECIFIC
-
-3. For strategies field:
-   - Must explicitly mention the requested focus topics
-   - Provide specific study techniques for those topics
-   - Example: "Focus on mastering Calculus derivatives through daily practice problems. Start with basic derivative rules, then progress to chain rule and product rule. Use visual aids to understand limits and continuity concepts."
+        # Sorted so equivalent focus-area dicts share one cached prompt
+        focus_items = tuple(sorted(
+            (subject, tuple(topics)) for subject, topics in focus_areas.items() if topics
+        )) if focus_areas else ()
+        return _render_study_plan_prompt(grade_level, tuple(weak_subjects), available_hours, days_until_exam, focus_items)
 
-4. For weekly_schedule:
-   - Each subject entry should have a "focus" field that mentions the specific topics
-   - Example: "Calculus - Derivatives and Chain Rule" or "Algebra - Quadratic Equations and Factoring"
-
-5. Allocate more time to weaker subjects
-6. Distribute study time across the week for balanced learning
-7. Ensure each subject gets adequate time based on priority
-8. For the subject "Kiswahili", the ENTIRE content in the "focus_areas" field MUST be written in the Swahili language. This includes the explanations and descriptions. Do not mix English. Example: Instead of "Alphabet recognition", use "Kutambua herufi". Instead of "comprehension", use "Ufahamu". Ensure the whole sentence is in Swahili.
+    async def generate_study_plan(
+        self,
+        weak_subjects: List[str],
+        available_hours: float,
+        exam_date: Optional[datetime] = None,
+        grade_level: int = 10,
+        focus_areas: Optional[Dict[str, List[str]]] = None
+    ) -> Dict[str, Any]:
+        """Generate personalized study plan."""
+        prompt = self._build_study_plan_prompt(weak_subjects, available_hours, exam_date, grade_level, focus_areas)
 
-Example Response Format:
-If Mathematics with focus on "Calculus, Derivatives" is requested:
-{{
-  "focus_areas": {{
-    "Mathematics": "Calculus (Derivatives, Limits, Continuity), Advanced Algebra, Problem-solving strategies"
-  }},
-  "strategies": {{
-    "Mathematics": "Master Calculus derivatives through systematic practice. Day 1-2: Basic derivative rules (power, product, quotient). Day 3-4: Chain rule and composite functions. Day 5-6: Applications of derivatives (optimization, related rates). Review limits and continuity weekly. Practice 10-15 derivative problems daily."
-  }},
-  "weekly_schedule": [
-    {{
-      "day": "Monday",
-      "subjects": [
-        {{"subject": "Mathematics", "duration_minutes": 90, "focus": "Calculus - Basic Derivative Rules", "priority": 8}}
-      ]
-    }}
-  ]
-}}"""
-        
-        import logging
-        logger = logging.getLogger(__name__)
-        
         # Log the request details
-        logger.info(f"Generating study plan for subjects: {weak_subjects}, focus_areas: {focus_areas}")
+        logger.info("Generating study plan subjects=%s focus=%s", weak_subjects, focus_areas)
         
         try:
-            response = await self.generate(prompt, json_mode=True)
+            response = await self.generate(
+                prompt,
+                system_prompt=_STUDY_PLAN_SYSTEM,
+                json_mode=True,
+                schema=_study_plan_schema(tuple(weak_subjects)),
+            )
             if not response:
                 logger.warning("Empty response from LLM, using fallback")
                 raise ValueError("Empty response from LLM")
             
-            # Log raw response for debugging (first 500 chars)
-            logger.debug(f"LLM raw response (first 500 chars): {response[:500]}")
+            logger.debug("LLM raw response length: %d", len(response))
             
-            parsed_response = json.loads(response)
+            parsed_response = await _aparse(response)
             if not isinstance(parsed_response, dict):
-                logger.warning(f"Invalid response format from LLM: {type(parsed_response)}")
+                logger.warning("Invalid response format from LLM: %s", type(parsed_response))
                 raise ValueError("Invalid response format from LLM")
             
             # Validate that we got AI-generated content, not just empty structures
@@ -1029,44 +1474,68 @@ If Mathematics with focus on "Calculus, Derivatives" is requested:
             has_focus_areas = bool(parsed_response.get("focus_areas"))
             has_strategies = bool(parsed_response.get("strategies"))
 
-            logger.info(f"LLM response validation - weekly_schedule: {has_weekly_schedule}, focus_areas: {has_focus_areas}, strategies: {has_strategies}")
+            logger.info("LLM response validation - weekly_schedule: %s, focus_areas: %s, strategies: %s", has_weekly_schedule, has_focus_areas, has_strategies)
 
             # If we have focus_areas from user, ensure LLM addressed them
             if focus_areas and has_focus_areas:
                 for subject, topics in focus_areas.items():
                     llm_focus = parsed_response.get("focus_areas", {}).get(subject, "")
                     if topics and subject in parsed_response.get("focus_areas", {}):
-                        logger.info(f"LLM generated focus_areas for {subject}: {llm_focus[:100]}")
+                        if logger.isEnabledFor(logging.INFO):
+                            logger.info("LLM generated focus_areas for %s: %s", subject, llm_focus[:100])
                     else:
-                        logger.warning(f"LLM did not generate focus_areas for {subject} with requested topics: {topics}")
+                        logger.warning("LLM did not generate focus_areas for %s with requested topics: %s", subject, topics)
 
             return parsed_response
             
-        except json.JSONDecodeError as e:
-            logger.error(f"Study plan JSON decode error: {e}")
-            logger.error(f"Response (first 500 chars): {response[:500] if 'response' in locals() else 'No response'}")
-            
-            # Try to extract JSON from the response if it's wrapped in markdown
-            if 'response' in locals() and response:
-                try:
-                    import re
-                    # Try to find JSON object or array
-                    json_match = re.search(r'\{[\s\S]*\}|\[[\s\S]*\]', response)
-                    if json_match:
-                        parsed_response = json.loads(json_match.group())
-                        logger.info("Successfully extracted JSON from markdown-wrapped response")
-                        return parsed_response
-                except Exception as extract_error:
-                    logger.error(f"Failed to extract JSON from response: {extract_error}")
-            
-            # Only use fallback if we truly can't parse the response
-            logger.warning("Using fallback response due to JSON decode error")
+        except orjson.JSONDecodeError as e:
+            # Schema-constrained output should always parse; surface anything else to the caller
+            logger.error("Study plan JSON decode error at offset %d of %d chars: %s", e.pos, len(response) if 'response' in locals() else 0, e.msg)
             raise ValueError(f"Failed to parse LLM response as JSON: {str(e)}")
             
         except Exception as e:
-            logger.error(f"Study plan generation error: {e}", exc_info=True)
+            logger.error("Study plan generation error: %s", e, exc_info=True)
             # Re-raise to let the service layer handle it
             raise
+
+    async def stream_study_plan(
+        self,
+        weak_subjects: List[str],
+        available_hours: float,
+        exam_date: Optional[datetime] = None,
+        grade_level: int = 10,
+        focus_areas: Optional[Dict[str, List[str]]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream weekly_schedule days as they are generated, then the complete plan.
+
+        Yields {"type": "day", "data": {...}} per finished day and a final {"type": "plan", "data": {...}}.
+        """
+        prompt = self._build_study_plan_prompt(weak_subjects, available_hours, exam_date, grade_level, focus_areas)
+        prompt = f"{prompt}\n\n{_JSON_ONLY_INSTRUCTION}"
+
+        scanner = _JsonArrayItemScanner("weekly_schedule")
+        chunks: List[str] = []
+        days: List[Dict[str, Any]] = []
+        schema = _study_plan_schema(tuple(weak_subjects))
+        async for chunk in self.generate_stream(prompt, system_prompt=_STUDY_PLAN_SYSTEM, schema=schema):
+            chunks.append(chunk)
+            for item in scanner.feed(chunk):
+                try:
+                    day = orjson.loads(item)
+                except orjson.JSONDecodeError:
+                    logger.warning("Skipping malformed streamed schedule day ending at offset %d", scanner.offset)
+                    continue
+                days.append(day)
+                yield {"type": "day", "data": day}
+
+        try:
+            plan = await _aparse(_strip_code_fences("".join(chunks)))
+        except orjson.JSONDecodeError as e:
+            logger.error("Streamed study plan JSON decode error at offset %d of %d chars: %s", e.pos, scanner.offset, e.msg)
+            plan = None
+        if not isinstance(plan, dict):
+            plan = {"weekly_schedule": days, "focus_areas": {}, "strategies": {}, "recommendations": []}
+        yield {"type": "plan", "data": plan}
     
     # ==================== LEARNING STRATEGIES ====================
     
@@ -1078,27 +1547,17 @@ If Mathematics with focus on "Calculus, Derivatives" is requested:
         difficulty: str = "medium"
     ) -> Dict[str, Any]:
         """Generate learning strategy for a specific topic."""
-        prompt = f"""Create a comprehensive learning strategy for a Grade {grade_level} student struggling with {topic} in {subject}.
-
-Difficulty Level: {difficulty}
-
-Provide in JSON format:
-{{
-  "explanation": "Clear explanation of the topic",
-  "examples": ["example1", "example2", ...],
-  "common_misconceptions": ["misconception1", ...],
-  "practice_problems": ["problem1", ...],
-  "resources": ["resource1", ...],
-  "study_tips": ["tip1", "tip2", ...]
-}}
-
-Make it age-appropriate and aligned with Kenyan curriculum."""
+        prompt = _LEARNING_STRATEGY_PROMPT.format_map({
+            "grade_level": grade_level,
+            "topic": topic,
+            "subject": subject,
+            "difficulty": difficulty,
+        })
         
         try:
-            response = await self.generate(prompt, json_mode=True)
-            return json.loads(response)
+            return await self._cached_generate_json(prompt, schema=_LEARNING_STRATEGY_SCHEMA)
         except Exception as e:
-            logger.error(f"Learning strategy error: {e}")
+            logger.error("Learning strategy error: %s", e)
             return {
                 "explanation": f"Study {topic} in {subject} regularly.",
                 "examples": [],
@@ -1107,6 +1566,28 @@ Make it age-appropriate and aligned with Kenyan curriculum."""
                 "resources": [],
                 "study_tips": ["Practice regularly", "Ask for help when needed"]
             }
+
+    async def generate_learning_strategies_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Generate learning strategies concurrently (items hold generate_learning_strategy kwargs)."""
+        return list(await asyncio.gather(*(self.generate_learning_strategy(**item) for item in items)))
+
+    async def generate_plan_with_strategies(
+        self,
+        weak_subjects: List[str],
+        available_hours: float,
+        exam_date: Optional[datetime] = None,
+        grade_level: int = 10,
+        focus_areas: Optional[Dict[str, List[str]]] = None
+    ) -> Dict[str, Any]:
+        """Generate a study plan, then a learning strategy per focus area concurrently, in one call."""
+        plan = await self.generate_study_plan(weak_subjects, available_hours, exam_date, grade_level, focus_areas)
+        plan_focus = plan.get("focus_areas") or {}
+        subjects = list(plan_focus)
+        strategies = await self.generate_learning_strategies_batch([
+            {"subject": subject, "topic": str(plan_focus[subject]), "grade_level": grade_level}
+            for subject in subjects
+        ])
+        return {"plan": plan, "strategies": dict(zip(subjects, strategies))}
     
     # ==================== ANSWER EVALUATION ====================
     
@@ -1118,37 +1599,40 @@ Make it age-appropriate and aligned with Kenyan curriculum."""
         subject: str
     ) -> Dict[str, Any]:
         """Evaluate student's answer and provide feedback."""
-        prompt = f"""Evaluate a student's answer to a question in {subject}.
-
-Question: {question}
-Correct Answer: {correct_answer}
-Student's Answer: {student_answer}
-
-Provide evaluation in JSON format:
-{{
-  "correct": true/false,
-  "score": 0.0-1.0,
-  "feedback": "Detailed feedback on the answer",
-  "suggestions": ["suggestion1", "suggestion2", ...],
-  "key_points": ["point1", "point2", ...]
-}}
-
-Be encouraging and constructive. Highlight what the student got right and what needs improvement."""
+        normalized_answer = " ".join(student_answer.split())
+        prompt = _EVALUATE_ANSWER_PROMPT.format_map({
+            "subject": subject,
+            "question": question,
+            "correct_answer": correct_answer,
+            "student_answer": normalized_answer,
+        })
         
         try:
-            response = await self.generate(prompt, json_mode=True)
-            return json.loads(response)
+            # Only the student's answer is case-folded; question and answer key stay
+            # exact because case can matter there (e.g. "Co" vs "CO")
+            key_bytes = orjson.dumps([subject, question, correct_answer, normalized_answer.casefold()])
+            return await self._cached_generate_json(
+                prompt, key=self._generate_cache_key("evaluate_answer", key_bytes), schema=_EVALUATION_SCHEMA
+            )
         except Exception as e:
-            logger.error(f"Answer evaluation error: {e}")
-            # Simple keyword-based fallback
-            is_correct = student_answer.lower() in correct_answer.lower() or correct_answer.lower() in student_answer.lower()
+            logger.error("Answer evaluation error: %s", e)
+            # Simple keyword-based fallback: containment or token overlap with the correct answer
+            sa = student_answer.casefold().strip()
+            ca = correct_answer.casefold().strip()
+            ca_tokens = set(ca.split())
+            overlap = len(set(sa.split()) & ca_tokens) / max(len(ca_tokens), 1)
+            is_correct = bool(sa) and (sa in ca or ca in sa or overlap > 0.6)
             return {
                 "correct": is_correct,
-                "score": 0.5 if is_correct else 0.0,
+                "score": round(max(overlap, 0.5) if is_correct else overlap, 2),
                 "feedback": "Review the correct answer and try again.",
                 "suggestions": ["Study the topic more", "Practice similar questions"],
                 "key_points": []
             }
+
+    async def evaluate_answers_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Evaluate answers concurrently (items hold evaluate_answer kwargs)."""
+        return list(await asyncio.gather(*(self.evaluate_answer(**item) for item in items)))
     
     # ==================== PERFORMANCE ANALYSIS ====================
     
@@ -1158,38 +1642,34 @@ Be encouraging and constructive. Highlight what the student got right and what n
         subjects: List[str]
     ) -> Dict[str, Any]:
         """Analyze performance trends and predict future grades."""
-        prompt = f"""Analyze academic performance trends for a Kenyan high school student.
-
-Grade History (numeric values 0-12):
-{json.dumps(grade_history, indent=2)}
-
-Subjects: {', '.join(subjects)}
-
-Provide analysis in JSON format:
-{{
-  "trends": {{
-    "subject": {{
-      "trend": "improving|declining|stable",
-      "predicted_next": 8.5,
-      "confidence": 0.85,
-      "factors": ["factor1", "factor2"]
-    }}
-  }},
-  "overall_assessment": "Overall performance assessment",
-  "interventions": ["intervention1", "intervention2", ...]
-}}"""
+        # Numeric trends are computed locally; only the narrative goes to the LLM
+        trends = {subject: _fit_grade_trend(grade_history[subject]) for subject in subjects if grade_history.get(subject)}
+        analysis = {
+            "trends": trends,
+            "overall_assessment": "Continue monitoring performance.",
+            "interventions": []
+        }
+        if not trends:
+            return analysis
+
+        trend_summary = "\n".join(
+            f"- {subject}: {data['trend']}, latest {grade_history[subject][-1]:.1f}, predicted next {data['predicted_next']:.1f}"
+            for subject, data in trends.items()
+        )
+        prompt = _PERFORMANCE_TRENDS_PROMPT.format_map({"trend_summary": trend_summary})
         
         try:
-            response = await self.generate(prompt, json_mode=True)
-            return json.loads(response)
+            response = await self.generate(prompt, json_mode=True, schema=_TRENDS_SCHEMA)
+            qualitative = await _aparse(response)
+            if isinstance(qualitative, dict):
+                analysis["overall_assessment"] = qualitative.get("overall_assessment") or analysis["overall_assessment"]
+                analysis["interventions"] = qualitative.get("interventions") or []
         except Exception as e:
-            logger.error(f"Performance analysis error: {e}")
-            return {
-                "trends": {},
-                "overall_assessment": "Continue monitoring performance.",
-                "interventions": []
-            }
+            logger.error("Performance analysis error: %s", e)
+        return analysis
 
 
-# Global LLM service instance
-llm_service = LLMService()
+@lru_cache(maxsize=1)
+def get_llm_service() -> LLMService:
+    """Get the shared LLM service instance (created on first use)."""
+    return LLMService()
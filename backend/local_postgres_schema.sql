@@ -119,7 +119,7 @@ CREATE TABLE IF NOT EXISTS study_sessions (
     session_id SERIAL PRIMARY KEY,
     user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
     plan_id INTEGER REFERENCES study_plans(plan_id) ON DELETE SET NULL,
-    date TIMESTAMP WITH TIME ZONE NOT NULL,
+    date TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
     duration_minutes INTEGER NOT NULL,
     completed BOOLEAN DEFAULT FALSE,
     notes TEXT,
@@ -138,18 +138,25 @@ CREATE TABLE IF NOT EXISTS learning_insights (
     is_read BOOLEAN DEFAULT FALSE
 );
 
+-- Databases created before study_sessions.date had a default (the API no longer sends it)
+ALTER TABLE study_sessions ALTER COLUMN date SET DEFAULT NOW();
+
 -- Create indexes for better performance
+-- Per-user list queries filter on user_id (plus an optional discriminator) and order by a
+-- timestamp or score, so composite indexes lead with user_id and match that ordering
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
-CREATE INDEX IF NOT EXISTS idx_reports_user_id ON academic_reports(user_id);
-CREATE INDEX IF NOT EXISTS idx_reports_date ON academic_reports(report_date);
+CREATE INDEX IF NOT EXISTS idx_reports_user_date ON academic_reports(user_id, report_date DESC);
 CREATE INDEX IF NOT EXISTS idx_performance_user_subject ON subject_performance(user_id, subject);
-CREATE INDEX IF NOT EXISTS idx_flashcards_user ON flashcards(user_id);
-CREATE INDEX IF NOT EXISTS idx_flashcards_subject ON flashcards(subject);
-CREATE INDEX IF NOT EXISTS idx_career_user ON career_recommendations(user_id);
-CREATE INDEX IF NOT EXISTS idx_study_plans_user ON study_plans(user_id);
-CREATE INDEX IF NOT EXISTS idx_study_sessions_user ON study_sessions(user_id);
-CREATE INDEX IF NOT EXISTS idx_insights_user ON learning_insights(user_id);
-CREATE INDEX IF NOT EXISTS idx_insights_type ON learning_insights(insight_type);
+CREATE INDEX IF NOT EXISTS idx_flashcards_user_active_created ON flashcards(user_id, created_at DESC) WHERE is_active;
+CREATE INDEX IF NOT EXISTS idx_flashcards_user_subject_created ON flashcards(user_id, subject, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_flashcard_reviews_user_card ON flashcard_reviews(user_id, card_id);
+CREATE INDEX IF NOT EXISTS idx_career_user_score_generated ON career_recommendations(user_id, match_score DESC, generated_at DESC);
+CREATE INDEX IF NOT EXISTS idx_study_plans_user_status ON study_plans(user_id, status);
+CREATE INDEX IF NOT EXISTS idx_study_plans_user_created ON study_plans(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_study_sessions_user_date ON study_sessions(user_id, date DESC);
+CREATE INDEX IF NOT EXISTS idx_study_sessions_plan ON study_sessions(plan_id) INCLUDE (duration_minutes);
+CREATE INDEX IF NOT EXISTS idx_insights_user_type_generated ON learning_insights(user_id, insight_type, generated_at DESC);
+CREATE INDEX IF NOT EXISTS idx_insights_user_generated ON learning_insights(user_id, generated_at DESC);
 
 -- Create updated_at trigger function
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -160,6 +167,12 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
+-- Total minutes logged against a study plan (called via RPC; index-only scan on idx_study_sessions_plan)
+CREATE OR REPLACE FUNCTION study_plan_minutes(p_plan_id INTEGER)
+RETURNS BIGINT AS $$
+    SELECT COALESCE(SUM(duration_minutes), 0) FROM study_sessions WHERE plan_id = p_plan_id;
+$$ LANGUAGE sql STABLE;
+
 -- Add triggers for updated_at
 CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
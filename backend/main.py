@@ -1,30 +1,49 @@
 import os
 import sys
+import time
+import queue
+import atexit
+import asyncio
 import logging
+import secrets
+import uuid
+import anyio
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Request
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Tuple
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Request, BackgroundTasks, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordBearer
-from fastapi.responses import JSONResponse, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-import aiofiles
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import orjson
 
-from config import settings
+from config import settings, AsyncOnce, get_async_supabase, close_async_supabase
 
-# Configure logging
+# Configure logging: records are formatted by the QueueHandler and written to stdout
+# by a listener thread, so request handlers never block on the stream
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
 logging.basicConfig(
     level=logging.INFO if not settings.DEBUG else logging.DEBUG,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.StreamHandler(sys.stdout)
+        QueueHandler(_log_queue)
     ]
 )
+_log_listener = QueueListener(_log_queue, logging.StreamHandler(sys.stdout))
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 from models import (
-    UserType,
+    UserType, PlanStatus,
     UserRegister, UserLogin, Token, UserProfile, UserProfileUpdate,
     ReportUpload, ReportResponse, ReportAnalysis,
     PerformanceDashboard, GradeTrend, PerformancePrediction,
@@ -39,35 +58,176 @@ from models import (
     ChatRequest, MessageResponse,
     ResourceCreate, ResourceUpdate, ResourceResponse, ResourceQuery
 )
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, TypeAdapter
+
+# List validators are built once; validating a whole list is cheaper than model_validate per row
+_REPORT_LIST = TypeAdapter(List[ReportResponse])
+_FLASHCARD_LIST = TypeAdapter(List[FlashcardResponse])
+_CAREER_LIST = TypeAdapter(List[CareerRecommendationResponse])
+_STUDY_PLAN_LIST = TypeAdapter(List[StudyPlanResponse])
+_INSIGHT_LIST = TypeAdapter(List[LearningInsightResponse])
+_RESOURCE_LIST = TypeAdapter(List[ResourceResponse])
+_INVITE_CODE_LIST = TypeAdapter(List[InviteCodeResponse])
+_LINKED_STUDENT_LIST = TypeAdapter(List[LinkedStudentResponse])
+_LINKED_GUARDIAN_LIST = TypeAdapter(List[LinkedGuardianResponse])
+_STUDY_SESSION_LIST = TypeAdapter(List[StudySessionResponse])
+
+# Largest batch accepted by the bulk insert routes (each batch is a single insert request)
+MAX_BULK_ITEMS = 100
+
+# Largest page the list routes return; later pages are fetched with the X-Next-Cursor value
+MAX_PAGE_SIZE = 200
+
+
+async def _read_for_student(guardian_id: int, student_id: int, read, denied: str):
+    """Await a read of a student's data alongside the guardian link check; 403 (discarding the rows) if unlinked."""
+    linked, rows = await asyncio.gather(
+        RelationshipService.verify_relationship_async(guardian_id, student_id), read
+    )
+    if not linked:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=denied)
+    return rows
+
+
+def _check_bulk_size(items: List[Any]) -> None:
+    """Reject empty or oversized bulk payloads."""
+    if not items or len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Send between 1 and {MAX_BULK_ITEMS} items"
+        )
+
+
+def _item_response(model: type, row: Dict[str, Any], status_code: int = status.HTTP_200_OK) -> ORJSONResponse:
+    """Validate one row and return it serialized, so FastAPI skips re-validating the response_model."""
+    return ORJSONResponse(
+        model.model_validate(row).model_dump(mode="json", by_alias=True),
+        status_code=status_code
+    )
+
+
+def _list_response(adapter: TypeAdapter, rows: List[Dict[str, Any]], status_code: int = status.HTTP_200_OK, cursor: Optional[str] = None) -> ORJSONResponse:
+    """Validate rows once and return them serialized, so FastAPI skips re-validating the response_model."""
+    return ORJSONResponse(
+        adapter.dump_python(adapter.validate_python(rows), mode="json", by_alias=True),
+        status_code=status_code,
+        headers={"X-Next-Cursor": cursor} if cursor else None
+    )
+
+# Stored integer priority for each PriorityLevel
+_PRIORITY_TO_INT = {PriorityLevel.LOW: 1, PriorityLevel.MEDIUM: 5, PriorityLevel.HIGH: 8}
+
 
 def _convert_priority_to_int(priority: PriorityLevel) -> int:
     """Converts PriorityLevel enum to an integer for database storage."""
-    if priority == PriorityLevel.LOW:
-        return 1
-    elif priority == PriorityLevel.MEDIUM:
-        return 5
-    elif priority == PriorityLevel.HIGH:
-        return 8
-    return 5  # Default to medium if somehow unexpected
+    return _PRIORITY_TO_INT.get(priority, 5)  # Default to medium if somehow unexpected
+
+
+# Report uploads: accepted content types and the magic bytes each must start with
+_REPORT_UPLOAD_SIGNATURES = {
+    "application/pdf": b"%PDF",
+    "image/jpeg": b"\xff\xd8\xff",
+    "image/jpg": b"\xff\xd8\xff",
+    "image/png": b"\x89PNG",
+}
+_REPORT_UPLOAD_TYPES = frozenset(_REPORT_UPLOAD_SIGNATURES)
+# Stored report files get their extension from the validated type, never from the client filename
+_REPORT_UPLOAD_EXTENSIONS = {
+    "application/pdf": ".pdf",
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/png": ".png",
+}
+
+_RESOURCE_UPLOAD_TYPES = frozenset({
+    "application/pdf",
+    "video/mp4",
+    "video/mpeg",
+    "application/msword",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "image/jpeg", "image/png",
+})
+# Profile pictures: accepted types and the extension each is stored under
+_PROFILE_PICTURE_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "image/webp": "webp",
+}
+_PROFILE_PICTURE_TYPES = frozenset(_PROFILE_PICTURE_EXTENSIONS)
+MAX_PROFILE_PICTURE_SIZE = 5 * 1024 * 1024  # 5MB
+_MATH_IMAGE_TYPES = frozenset({"image/jpeg", "image/jpg", "image/png", "image/webp"})
+
+
+async def _validate_report_upload(file: UploadFile) -> None:
+    """Reject report uploads whose declared type or leading bytes are not PDF/JPEG/PNG."""
+    if file.content_type not in _REPORT_UPLOAD_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File type {file.content_type} not supported. Please upload PDF, JPG, or PNG files."
+        )
+    head = await file.read(8)
+    await file.seek(0)
+    if not head.startswith(_REPORT_UPLOAD_SIGNATURES[file.content_type]):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File content does not match its type {file.content_type}. Please upload a valid PDF, JPG, or PNG file."
+        )
+
+
+def _remove_file_quietly(path: str) -> None:
+    """Delete a file if present, logging instead of raising on failure."""
+    try:
+        Path(path).unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning(f"Could not delete file {path}: {e}")
+
+
+async def _generate_feedback_safely(user_id: int) -> None:
+    """Background task: refresh a user's insights after a report upload without failing the upload."""
+    try:
+        logger.info(f"Auto-generating insights for user {user_id} after report upload")
+        await InsightService.generate_feedback(user_id)
+    except Exception as e:
+        logger.warning(f"Could not auto-generate insights after report upload: {e}")
 
 from auth import (
-    authenticate_user, get_current_active_user, create_access_token,
-    get_password_hash, require_user_type
+    authenticate_user_async, get_current_active_user, create_access_token,
+    get_password_hash, require_user_type, invalidate_user_cache, generate_reset_token
 )
 from supabase_db import (
-    get_user_by_email, create_user, get_user_insights, delete_academic_report,
-    delete_flashcard, update_career_recommendation, delete_career_recommendation,
-    delete_study_plan,
-    create_resource, update_resource, delete_resource, get_resource, list_resources,
-    favorite_resource, unfavorite_resource
+    supabase, get_user_by_email, get_user_by_reset_token, create_user, update_user,
+    get_user_insights, create_learning_insight, delete_academic_report,
+    update_career_recommendation, delete_career_recommendation, get_user_career_recommendations,
+    get_user_study_plans,
+    # Aliased where a route of the same name would shadow them
+    delete_flashcard as delete_flashcard_db, update_study_plan as update_study_plan_db,
+    mark_insight_read as mark_insight_read_db,
+    create_resource_async, update_resource_async, delete_resource_async, get_resource_async,
+    list_resources_async, favorite_resource_async, unfavorite_resource_async, DuplicateRecordError,
+    get_user_insights_async, mark_insight_read_async, get_user_career_recommendations_async,
+    delete_study_plan_async, create_study_session_async, update_study_plan_async,
+    get_plan_minutes_studied_async, create_study_sessions_async, create_learning_insights_async,
+    get_user_reports_async, get_user_flashcards_async, REPORT_RESPONSE_COLUMNS,
+    apply_keyset, next_cursor, CURSOR_PATTERN
 )
 from services import (
     ReportService, PerformanceService, FlashcardService,
     CareerService, StudyPlanService, InsightService,
     InviteService, RelationshipService
 )
-from utils import extract_grades_from_text, normalize_subject_name, extract_grades_from_file
+from llm_service import LLMService, get_llm_service
+from email_service import email_service
+from storage_service import storage_service, MAX_RESOURCE_FILE_SIZE
+from utils import (
+    extract_grades_from_text, normalize_subject_name,
+    extract_grades_from_bytes_async, read_upload_bytes, write_file_bytes, save_upload_file
+)
+
+# Route prefix and the shared authenticated-user dependency, built once for all routes
+API = settings.API_V1_PREFIX
+CurrentUser = Depends(get_current_active_user)
+PageCursor = Query(None, pattern=CURSOR_PATTERN, description="X-Next-Cursor from the previous page")
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -76,6 +236,7 @@ app = FastAPI(
     description="SmartPath API - AI-powered learning and career guidance for Kenyan students",
     docs_url="/docs" if not settings.is_production else None,  # Disable docs in production
     redoc_url="/redoc" if not settings.is_production else None,
+    default_response_class=ORJSONResponse,
 )
 
 # Mount static files directory for uploaded files
@@ -83,50 +244,75 @@ os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
 
 # Global exception handler
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_handler(request: Request, exc: StarletteHTTPException):
+    """Serialize HTTP errors with orjson, matching FastAPI's default body and headers."""
+    return ORJSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers=getattr(exc, "headers", None)
+    )
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    """Serialize validation errors with orjson, matching FastAPI's default 422 body."""
+    return ORJSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content={"detail": jsonable_encoder(exc.errors())}
+    )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Handle all uncaught exceptions."""
     logger.error(f"Unhandled exception on {request.url}: {exc}", exc_info=True)
     if settings.is_production:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={"detail": "Internal server error. Please try again later."}
         )
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={"detail": str(exc)}
     )
 
-cors_origins = settings.cors_origins_list.copy()
-vercel_pattern = r"https://.*\.vercel\.app"
+# Security headers middleware (headers are fixed for the life of the process, so they are
+# built and encoded once here; no route sets these itself, so appending never duplicates one)
+_SECURITY_HEADERS: List[Tuple[bytes, bytes]] = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+]
+if settings.is_production:
+    _SECURITY_HEADERS.append((b"content-security-policy", b"default-src 'self'"))
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=cors_origins,  # Exact matches
-    allow_origin_regex=vercel_pattern,  # Pattern for Vercel preview URLs
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["Authorization", "Content-Type", "Accept", "X-Requested-With"],
-    expose_headers=["Authorization", "Content-Type", "Location"],
-    max_age=3600,  # Cache preflight for 1 hour
-)
 
-# Security headers middleware
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """Add security headers to all responses."""
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
-        if settings.ENABLE_SECURITY_HEADERS:
-            response.headers["X-Content-Type-Options"] = "nosniff"
-            response.headers["X-Frame-Options"] = "DENY"
-            response.headers["X-XSS-Protection"] = "1; mode=block"
-            response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-            response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-            if settings.is_production:
-                response.headers["Content-Security-Policy"] = "default-src 'self'"
-        return response
-
-app.add_middleware(SecurityHeadersMiddleware)
+class SecurityHeadersMiddleware:
+    """Add security headers to all responses.
+
+    Plain ASGI rather than BaseHTTPMiddleware: it only edits the response start
+    message, so no per-request task group or Request/Response objects are needed.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *_SECURITY_HEADERS]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+if settings.ENABLE_SECURITY_HEADERS:
+    app.add_middleware(SecurityHeadersMiddleware)
 
 # Trusted host middleware for production security
 if settings.is_production:
@@ -137,18 +323,47 @@ if settings.is_production:
             allowed_hosts=trusted_hosts
         )
 
+# Compress JSON bodies over 1KB; list endpoints shrink several-fold for mobile clients
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# CORS is added last so it is the outermost middleware: preflights are answered
+# before reaching the security-header and trusted-host layers
+cors_origins = settings.cors_origins_list.copy()
+# Single DNS label only: anchored character class, no backtracking on hostile Origin headers
+vercel_pattern = r"^https://[a-z0-9-]+\.vercel\.app$"
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=cors_origins,  # Exact matches
+    allow_origin_regex=vercel_pattern,  # Pattern for Vercel preview URLs
+    allow_credentials=True,
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type", "Accept", "X-Requested-With"],
+    expose_headers=["Authorization", "Content-Type", "Location", "X-Next-Cursor"],
+    max_age=settings.CORS_MAX_AGE,  # Preflight cache; Chromium clamps anything above 7200s
+)
+
 # Application lifecycle events
+_supabase_warmup = AsyncOnce()
+
+
+async def _warm_up_supabase() -> None:
+    if supabase is None:
+        raise Exception("Supabase client not initialized. Check SUPABASE_URL and SUPABASE_KEY in .env")
+
+    # Test Supabase connection
+    await run_in_threadpool(supabase.table('users').select('user_id').limit(1).execute)
+    # Build the shared async client now so its pool is warm before the first request
+    await get_async_supabase()
+
+
 @app.on_event("startup")
 async def startup_event():
-    try:
-        # Import supabase client
-        from config import supabase
+    # Sync (def) routes run on anyio's threadpool; its default of 40 threads is too small under load
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.WORKER_THREADS
 
-        if supabase is None:
-            raise Exception("Supabase client not initialized. Check SUPABASE_URL and SUPABASE_KEY in .env")
-
-        # Test Supabase connection
-        test_response = supabase.table('users').select('user_id').limit(1).execute()
+    try:
+        await _supabase_warmup.run(_warm_up_supabase)
         logger.info("Supabase connection successful")
 
     except Exception as e:
@@ -165,19 +380,19 @@ async def startup_event():
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     logger.info(f"Debug mode: {settings.DEBUG}")
     
-    # Create uploads directory if it doesn't exist
-    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    # The uploads directory is created at import time, before StaticFiles is mounted
     logger.info(f"Upload directory: {settings.UPLOAD_DIR}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("SmartPath API shutting down")
+    await close_async_supabase()
 
 
 # ==================== HEALTH CHECK ====================
 
 @app.get("/health")
-@app.get(f"{settings.API_V1_PREFIX}/health")
+@app.get(f"{API}/health")
 async def health_check():
     """Health check endpoint to test server connectivity."""
     return {"status": "healthy", "service": settings.APP_NAME, "version": settings.APP_VERSION}
@@ -185,23 +400,14 @@ async def health_check():
 
 # ==================== AUTHENTICATION ROUTES ====================
 
-@app.post(f"{settings.API_V1_PREFIX}/auth/register", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
+@app.post(f"{API}/auth/register", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
 async def register(user_data: UserRegister):
     """Register a new user."""
-    from email_service import email_service
-    
-    # Check if user exists
-    existing_user = get_user_by_email(user_data.email)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-
     # Create new user data
     user_data_dict = {
         "email": user_data.email,
-        "password_hash": get_password_hash(user_data.password),
+        # bcrypt is deliberately slow CPU work, so keep it off the event loop
+        "password_hash": await run_in_threadpool(get_password_hash, user_data.password),
         "full_name": user_data.full_name,
         "user_type": user_data.user_type.value,
         "grade_level": user_data.grade_level,
@@ -211,7 +417,15 @@ async def register(user_data: UserRegister):
         "is_active": True
     }
 
-    user = create_user(user_data_dict)
+    # UNIQUE(email) rejects duplicates, so no separate existence check is needed
+    # (Supabase calls block, so run them in the threadpool)
+    try:
+        user = await run_in_threadpool(create_user, user_data_dict)
+    except DuplicateRecordError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -231,10 +445,10 @@ async def register(user_data: UserRegister):
     )
 
 
-@app.post(f"{settings.API_V1_PREFIX}/auth/login", response_model=Token)
-def login(credentials: UserLogin):
+@app.post(f"{API}/auth/login", response_model=Token)
+async def login(credentials: UserLogin):
     """Login and get access token."""
-    user = authenticate_user(credentials.email, credentials.password)
+    user = await authenticate_user_async(credentials.email, credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -254,22 +468,19 @@ def login(credentials: UserLogin):
     )
 
 
-@app.post(f"{settings.API_V1_PREFIX}/auth/forgot-password")
+@app.post(f"{API}/auth/forgot-password")
 async def forgot_password(
     email: EmailStr = Form(...),
 ):
     """Request a password reset email."""
-    from auth import generate_reset_token
-    from email_service import email_service
-    
-    user = get_user_by_email(email)
+    user = await run_in_threadpool(get_user_by_email, email)
     if user:
         token = generate_reset_token()
         # Set token expiration to 1 hour
         expires = (datetime.utcnow() + timedelta(hours=1)).isoformat()
         
         # Save token to user record
-        update_user(user['user_id'], {
+        await run_in_threadpool(update_user, user['user_id'], {
             "reset_token": token,
             "reset_token_expires": expires
         })
@@ -280,133 +491,122 @@ async def forgot_password(
     # Always return success to prevent email enumeration
     return {"message": "If an account exists with this email, a reset link has been sent."}
 
-@app.post(f"{settings.API_V1_PREFIX}/auth/reset-password")
+@app.post(f"{API}/auth/reset-password")
 async def reset_password(
     token: str = Form(...),
     new_password: str = Form(...)
 ):
     """Reset password with a valid token."""
-    from auth import get_password_hash
-    from supabase_db import get_user_by_reset_token
-    
-    user = get_user_by_reset_token(token)
+    user = await run_in_threadpool(get_user_by_reset_token, token)
     if not user:
         raise HTTPException(status_code=400, detail="Invalid or expired reset token")
         
     # Update password and clear token
-    password_hash = get_password_hash(new_password)
-    update_user(user['user_id'], {
+    password_hash = await run_in_threadpool(get_password_hash, new_password)
+    await run_in_threadpool(update_user, user['user_id'], {
         "password_hash": password_hash,
         "reset_token": None,
         "reset_token_expires": None
     })
+    invalidate_user_cache(user['user_id'])
     
     return {"message": "Password reset successfully. You can now login."}
 
 # ==================== RESOURCE LIBRARY ROUTES ====================
 
-@app.get(f"{settings.API_V1_PREFIX}/resources", response_model=PaginatedResponse)
-def get_resources(
+@app.get(f"{API}/resources", response_model=PaginatedResponse)
+async def get_resources(
     q: Optional[str] = None,
     subject: Optional[str] = None,
     grade_level: Optional[int] = None,
     type: Optional[str] = None,
-    page: int = 1,
-    page_size: int = 20,
-    current_user: Optional[Dict[str, Any]] = Depends(get_current_active_user)
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Optional[Dict[str, Any]] = CurrentUser
 ):
     filters = {"q": q, "subject": subject, "grade_level": grade_level, "type": type}
-    data = list_resources(filters, user_id=current_user.get("user_id") if current_user else None, page=page, page_size=page_size)
-    return PaginatedResponse(
-        items=[ResourceResponse.model_validate(item) for item in data["items"]],
-        total=data["total"],
-        page=data["page"],
-        page_size=data["page_size"],
-        total_pages=(data["total"] + page_size - 1) // page_size
-    )
+    data = await list_resources_async(filters, user_id=current_user.get("user_id") if current_user else None, page=page, page_size=page_size)
+    # Items are validated once as a list and the envelope is serialized directly, so FastAPI skips re-validating it
+    items = _RESOURCE_LIST.validate_python(data["items"])
+    return ORJSONResponse({
+        "items": _RESOURCE_LIST.dump_python(items, mode="json", by_alias=True),
+        "total": data["total"],
+        "page": data["page"],
+        "page_size": data["page_size"],
+        "total_pages": (data["total"] + page_size - 1) // page_size,
+    })
 
-@app.get(f"{settings.API_V1_PREFIX}/resources/{{resource_id}}", response_model=ResourceResponse)
-def get_resource_detail(
+@app.get(f"{API}/resources/{{resource_id}}", response_model=ResourceResponse)
+async def get_resource_detail(
     resource_id: int,
-    current_user: Optional[Dict[str, Any]] = Depends(get_current_active_user)
+    current_user: Optional[Dict[str, Any]] = CurrentUser
 ):
-    resource = get_resource(resource_id, user_id=current_user.get("user_id") if current_user else None)
+    resource = await get_resource_async(resource_id, user_id=current_user.get("user_id") if current_user else None)
     if not resource:
         raise HTTPException(status_code=404, detail="Resource not found")
     return ResourceResponse.model_validate(resource)
 
-@app.post(f"{settings.API_V1_PREFIX}/resources", response_model=ResourceResponse)
-def create_resource_item(
+@app.post(f"{API}/resources", response_model=ResourceResponse)
+async def create_resource_item(
     payload: ResourceCreate,
     admin_user: Dict[str, Any] = Depends(require_user_type("admin"))
 ):
     data = payload.model_dump()
-    created = create_resource(data)
+    created = await create_resource_async(data)
     if not created:
         raise HTTPException(status_code=500, detail="Failed to create resource")
     return ResourceResponse.model_validate(created)
 
-@app.put(f"{settings.API_V1_PREFIX}/resources/{{resource_id}}", response_model=ResourceResponse)
-def update_resource_item(
+@app.put(f"{API}/resources/{{resource_id}}", response_model=ResourceResponse)
+async def update_resource_item(
     resource_id: int,
     payload: ResourceUpdate,
     admin_user: Dict[str, Any] = Depends(require_user_type("admin"))
 ):
     data = {k: v for k, v in payload.model_dump().items() if v is not None}
-    updated = update_resource(resource_id, data)
+    updated = await update_resource_async(resource_id, data)
     if not updated:
         raise HTTPException(status_code=404, detail="Resource not found or update failed")
     return ResourceResponse.model_validate(updated)
 
-@app.delete(f"{settings.API_V1_PREFIX}/resources/{{resource_id}}", response_model=MessageResponse)
-def delete_resource_item(
+@app.delete(f"{API}/resources/{{resource_id}}", response_model=MessageResponse)
+async def delete_resource_item(
     resource_id: int,
     admin_user: Dict[str, Any] = Depends(require_user_type("admin"))
 ):
-    ok = delete_resource(resource_id)
+    ok = await delete_resource_async(resource_id)
     if not ok:
         raise HTTPException(status_code=404, detail="Resource not found or delete failed")
     return MessageResponse(message="Resource deleted", success=True)
 
-@app.post(f"{settings.API_V1_PREFIX}/resources/{{resource_id}}/favorite", response_model=MessageResponse)
-def favorite_resource_item(
+@app.post(f"{API}/resources/{{resource_id}}/favorite", response_model=MessageResponse)
+async def favorite_resource_item(
     resource_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
-    ok = favorite_resource(current_user["user_id"], resource_id)
+    ok = await favorite_resource_async(current_user["user_id"], resource_id)
     if not ok:
         raise HTTPException(status_code=500, detail="Failed to favorite resource")
     return MessageResponse(message="Favorited", success=True)
 
-@app.delete(f"{settings.API_V1_PREFIX}/resources/{{resource_id}}/favorite", response_model=MessageResponse)
-def unfavorite_resource_item(
+@app.delete(f"{API}/resources/{{resource_id}}/favorite", response_model=MessageResponse)
+async def unfavorite_resource_item(
     resource_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
-    ok = unfavorite_resource(current_user["user_id"], resource_id)
+    ok = await unfavorite_resource_async(current_user["user_id"], resource_id)
     if not ok:
         raise HTTPException(status_code=500, detail="Failed to remove favorite")
     return MessageResponse(message="Unfavorited", success=True)
 
-@app.post(f"{settings.API_V1_PREFIX}/resources/upload")
+@app.post(f"{API}/resources/upload")
 async def upload_resource_file(
     file: UploadFile = File(...),
     current_user: Dict[str, Any] = Depends(require_user_type("admin"))
 ):
     """Upload a file for a resource (Admin only)."""
-    from storage_service import storage_service
-    
     # Validate file type
-    allowed_types = [
-        "application/pdf", 
-        "video/mp4", 
-        "video/mpeg", 
-        "application/msword",
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        "image/jpeg", "image/png"
-    ]
-    
-    if file.content_type not in allowed_types:
+    if file.content_type not in _RESOURCE_UPLOAD_TYPES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Invalid file type: {file.content_type}. Allowed: PDF, MP4, Word, Images."
@@ -415,18 +615,20 @@ async def upload_resource_file(
     # Validate file size (max 50MB for resources)
     # Check content-length header first if available
     content_length = file.headers.get("content-length")
-    if content_length and int(content_length) > 50 * 1024 * 1024:
+    if content_length and int(content_length) > MAX_RESOURCE_FILE_SIZE:
          raise HTTPException(status_code=400, detail="File too large. Max 50MB.")
 
     try:
         public_url = await storage_service.upload_file(file, file.filename)
         return {"url": public_url, "success": True}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Resource upload error: {e}")
         raise HTTPException(status_code=500, detail="Failed to upload file")
 
-@app.get(f"{settings.API_V1_PREFIX}/auth/profile", response_model=UserProfile)
-async def get_profile(current_user: Dict[str, Any] = Depends(get_current_active_user)):
+@app.get(f"{API}/auth/profile", response_model=UserProfile)
+async def get_profile(current_user: Dict[str, Any] = CurrentUser):
     """Get current user's profile."""
     # Transform user data for Pydantic validation
     user_data = current_user.copy()
@@ -438,10 +640,10 @@ async def get_profile(current_user: Dict[str, Any] = Depends(get_current_active_
     return UserProfile.model_validate(user_data)
 
 
-@app.put(f"{settings.API_V1_PREFIX}/auth/profile", response_model=UserProfile)
-async def update_profile(
+@app.put(f"{API}/auth/profile", response_model=UserProfile)
+def update_profile(
     profile_update: UserProfileUpdate,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Update current user's profile."""
     # Update only provided fields
@@ -460,6 +662,7 @@ async def update_profile(
         update_data['profile_picture'] = profile_update.profile_picture
 
     updated_user = update_user(current_user['user_id'], update_data)
+    invalidate_user_cache(current_user['user_id'])
 
     if not updated_user:
         raise HTTPException(
@@ -467,9 +670,8 @@ async def update_profile(
             detail="Failed to update profile"
         )
 
-    # Transform user data for Pydantic validation
-    user_data = current_user.copy()
-    user_data.pop('_sa_instance_state', None)  # Remove SQLAlchemy internal state
+    # The update already returned the stored row, so respond with it rather than the pre-update user
+    user_data = dict(updated_user)
     if 'user_type' in user_data and isinstance(user_data['user_type'], str):
         user_data['user_type'] = user_data['user_type'].lower()
     if 'curriculum_type' in user_data and isinstance(user_data['curriculum_type'], str):
@@ -478,57 +680,49 @@ async def update_profile(
     return UserProfile.model_validate(user_data)
 
 
-@app.post(f"{settings.API_V1_PREFIX}/auth/profile-picture")
+@app.post(f"{API}/auth/profile-picture")
 async def upload_profile_picture(
     file: UploadFile = File(...),
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Upload a profile picture for the current user."""
-    from supabase_db import update_user
 
     # Validate file type
-    allowed_types = ["image/jpeg", "image/png", "image/gif", "image/webp"]
-    if file.content_type not in allowed_types:
+    if file.content_type not in _PROFILE_PICTURE_TYPES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid file type. Only JPEG, PNG, GIF, and WebP images are allowed."
         )
 
-    # Validate file size (max 5MB)
-    file_size = 0
-    content = await file.read()
-    file_size = len(content)
-
-    if file_size > 5 * 1024 * 1024:  # 5MB limit
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="File too large. Maximum size is 5MB."
-        )
-
     # Generate unique filename
-    import uuid
-    file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
+    # The extension comes from the validated content type; the client filename is never used in the path
+    file_extension = _PROFILE_PICTURE_EXTENSIONS[file.content_type]
     unique_filename = f"profile_{current_user['user_id']}_{uuid.uuid4().hex}.{file_extension}"
 
-    # Create uploads directory if it doesn't exist
-    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-
-    # Save file
-    file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
-    async with aiofiles.open(file_path, 'wb') as f:
-        await f.write(content)
+    # Stream the upload to disk in chunks, aborting with 413 past the size cap
+    # (UPLOAD_DIR is created at startup, before StaticFiles is mounted)
+    file_path = f"{settings.UPLOAD_DIR}/{unique_filename}"
+    await save_upload_file(file, file_path, MAX_PROFILE_PICTURE_SIZE)
 
     # Generate URL for the file
     file_url = f"/uploads/{unique_filename}"
 
-    # Update user's profile picture in database
-    updated_user = update_user(current_user['user_id'], {'profile_picture': file_url})
-    if not updated_user:
-        logger.error(f"Failed to update profile picture for user {current_user['user_id']}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update profile picture"
-        )
+    keep_file = False
+    try:
+        # Update user's profile picture in database
+        updated_user = await run_in_threadpool(update_user, current_user['user_id'], {'profile_picture': file_url})
+        invalidate_user_cache(current_user['user_id'])
+        if not updated_user:
+            logger.error(f"Failed to update profile picture for user {current_user['user_id']}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to update profile picture"
+            )
+        keep_file = True
+    finally:
+        # Only a file referenced by the user's row is kept
+        if not keep_file:
+            await asyncio.to_thread(_remove_file_quietly, file_path)
 
     return {"profile_picture_url": file_url, "message": "Profile picture uploaded successfully"}
 
@@ -536,14 +730,14 @@ async def upload_profile_picture(
 
 # ==================== MATH SOLVER ROUTES ====================
 
-@app.post(f"{settings.API_V1_PREFIX}/math/solve")
+@app.post(f"{API}/math/solve")
 async def solve_math(
     file: Optional[UploadFile] = File(None),
     prompt: Optional[str] = Form(None),
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser,
+    llm: LLMService = Depends(get_llm_service)
 ):
     """Solve a math problem from text or uploaded image."""
-    from llm_service import llm_service
     
     if not file and not prompt:
         raise HTTPException(status_code=400, detail="Please provide either an image or a text problem.")
@@ -552,14 +746,13 @@ async def solve_math(
     image_mime_type = None
 
     if file:
-        allowed_types = ["image/jpeg", "image/jpg", "image/png", "image/webp"]
-        if file.content_type not in allowed_types:
+        if file.content_type not in _MATH_IMAGE_TYPES:
             raise HTTPException(status_code=400, detail="Only JPEG, PNG, and WebP images are supported.")
         image_bytes = await file.read()
         image_mime_type = file.content_type
 
     try:
-        solution = await llm_service.solve_math_problem(
+        solution = await llm.solve_math_problem(
             problem_text=prompt,
             image_bytes=image_bytes,
             image_mime_type=image_mime_type
@@ -570,20 +763,20 @@ async def solve_math(
         raise HTTPException(status_code=500, detail="Failed to solve math problem")
 
 
-@app.post(f"{settings.API_V1_PREFIX}/math/practice")
+@app.post(f"{API}/math/practice")
 async def generate_math_practice(
     subject: str = Form(...),
     topic: str = Form(...),
     grade_level: int = Form(...),
     difficulty: str = Form("medium"),
     count: int = Form(3),
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser,
+    llm: LLMService = Depends(get_llm_service)
 ):
     """Generate practice math problems."""
-    from llm_service import llm_service
     
     try:
-        problems = await llm_service.generate_practice_problems(
+        problems = await llm.generate_practice_problems(
             subject=subject,
             topic=topic,
             grade_level=grade_level,
@@ -598,13 +791,13 @@ async def generate_math_practice(
 
 # ==================== CHAT ROUTES ====================
 
-@app.post(f"{settings.API_V1_PREFIX}/chat/send")
+@app.post(f"{API}/chat/send")
 async def chat_send(
     request: ChatRequest,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser,
+    llm: LLMService = Depends(get_llm_service)
 ):
     """Send a message to the AI Tutor."""
-    from llm_service import llm_service
     
     try:
         # Pass user context (grade level) if not explicitly provided
@@ -615,7 +808,7 @@ async def chat_send(
         # Convert history to dict format for service
         history_dicts = [{"role": msg.role, "content": msg.content} for msg in request.history]
         
-        response_text = await llm_service.chat_with_tutor(
+        response_text = await llm.chat_with_tutor(
             message=request.message,
             history=history_dicts,
             subject=request.subject,
@@ -639,10 +832,10 @@ class OCRPreviewResponse(BaseModel):
     message: str
 
 
-@app.post(f"{settings.API_V1_PREFIX}/reports/ocr-preview")
+@app.post(f"{API}/reports/ocr-preview")
 async def preview_ocr(
     file: UploadFile = File(...),
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Preview OCR extraction without saving the report.
     
@@ -660,40 +853,19 @@ async def preview_ocr(
         # Some ASGI servers may not provide size; skip and rely on downstream handling
         pass
     
-    # Validate file type
-    allowed_types = ["application/pdf", "image/jpeg", "image/jpg", "image/png"]
-    if file.content_type not in allowed_types:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type {file.content_type} not supported. Please upload PDF, JPG, or PNG files."
-        )
-    
-    # Create temporary file
-    import tempfile
-    timestamp = datetime.utcnow().timestamp()
+    # Validate file type (declared type and leading magic bytes)
+    await _validate_report_upload(file)
     
     try:
-        # Save to temporary location
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_path = tmp_file.name
-        
-        # Extract grades using Gemini AI
-        from utils import extract_grades_from_file
+        # The preview never keeps the upload, so OCR it straight from memory (no temp file)
+        content = await read_upload_bytes(file)
         
-        # Extract grades directly (Gemini handles both image and PDF)
-        grades = extract_grades_from_file(tmp_path, file.content_type)
+        # Extract grades using Gemini AI off the event loop (Gemini handles both image and PDF)
+        grades = await extract_grades_from_bytes_async(content, file.content_type)
         
         # Get a preview message
         raw_text = f"Analyzed with Gemini AI. Found {len(grades)} subjects." if grades else "No grades detected."
         
-        # Clean up temp file
-        try:
-            os.unlink(tmp_path)
-        except PermissionError:
-            pass
-        
         if not grades:
             return OCRPreviewResponse(
                 extracted_text=raw_text[:1000],  # First 1000 chars
@@ -709,27 +881,23 @@ async def preview_ocr(
             message=f"Successfully extracted {len(grades)} grades. Please review and confirm."
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        # Clean up on error
-        if 'tmp_path' in locals() and os.path.exists(tmp_path):
-            try:
-                os.unlink(tmp_path)
-            except PermissionError:
-                pass
-        
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing file: {str(e)}"
         )
 
 
-@app.post(f"{settings.API_V1_PREFIX}/reports/upload", response_model=ReportResponse, status_code=status.HTTP_201_CREATED)
+@app.post(f"{API}/reports/upload", response_model=ReportResponse, status_code=status.HTTP_201_CREATED)
 async def upload_report(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     term: str = Form(...),
     year: int = Form(...),
     report_date: datetime = Form(...),
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Upload and process an academic report with OCR."""
     # Validate file size
@@ -739,39 +907,35 @@ async def upload_report(
             detail="File size exceeds maximum allowed size"
         )
     
-    # Validate file type
-    allowed_types = ["application/pdf", "image/jpeg", "image/jpg", "image/png"]
-    if file.content_type not in allowed_types:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type {file.content_type} not supported. Please upload PDF, JPG, or PNG files."
-        )
+    # Validate file type (declared type and leading magic bytes)
+    await _validate_report_upload(file)
     
     # Save file
-    timestamp = datetime.utcnow().timestamp()
-    file_path = os.path.join(
-        settings.UPLOAD_DIR, 
-        f"{current_user['user_id']}_{timestamp}_{file.filename}"
-    )
+    # time_ns plus a random token keeps concurrent uploads from colliding; the
+    # extension comes from the validated content type, not the client-supplied name
+    suffix = _REPORT_UPLOAD_EXTENSIONS[file.content_type]
+    file_path = f"{settings.UPLOAD_DIR}/{current_user['user_id']}_{time.time_ns():x}_{secrets.token_hex(4)}{suffix}"
     
+    keep_file = False
     try:
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
-        
-        # Perform OCR to extract grades
-        print(f"🔍 Processing file with OCR: {file.filename}")
-        grades_json = extract_grades_from_file(file_path, file.content_type)
-        print(f"✅ Extracted {len(grades_json)} grades: {grades_json}")
+        # Read the upload once, then write it to disk while OCR runs on the same bytes
+        content = await read_upload_bytes(file)
+        logger.info("Processing file with OCR: %s", file.filename)
+        _, grades_json = await asyncio.gather(
+            asyncio.to_thread(write_file_bytes, file_path, content),
+            extract_grades_from_bytes_async(content, file.content_type)
+        )
+        logger.info("Extracted %d grades: %s", len(grades_json), grades_json)
         
         # If no grades found, return a helpful message
         if not grades_json:
-            print("⚠️ No grades extracted from file")
+            logger.warning("No grades extracted from file %s", file.filename)
             # Still create the report but with empty grades
             # The user can manually enter grades later
         
         # Create report
-        report = ReportService.create_report(
+        report = await run_in_threadpool(
+            ReportService.create_report,
             user_id=current_user['user_id'],
             report_date=report_date,
             term=term,
@@ -780,33 +944,32 @@ async def upload_report(
             file_path=file_path,
             file_type=file.content_type
         )
+        keep_file = True
         
-        # Auto-generate insights after report upload
-        try:
-            logger.info(f"Auto-generating insights for user {current_user['user_id']} after report upload")
-            await InsightService.generate_feedback(current_user['user_id'])
-        except Exception as e:
-            logger.warning(f"Could not auto-generate insights after report upload: {e}")
-            # Don't fail the report upload if insight generation fails
+        # Insights are generated after the response is sent
+        background_tasks.add_task(_generate_feedback_safely, current_user['user_id'])
         
         return ReportResponse.model_validate(report)
         
+    except HTTPException:
+        raise
     except Exception as e:
-        # Clean up file on error
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        
-        print(f"❌ Error processing upload: {str(e)}")
+        logger.error("Error processing upload: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing file: {str(e)}"
         )
+    finally:
+        # Only a file referenced by a saved report is kept
+        if not keep_file:
+            await asyncio.to_thread(_remove_file_quietly, file_path)
 
 
-@app.post(f"{settings.API_V1_PREFIX}/reports/upload-json", response_model=ReportResponse, status_code=status.HTTP_201_CREATED)
+@app.post(f"{API}/reports/upload-json", response_model=ReportResponse, status_code=status.HTTP_201_CREATED)
 async def upload_report_json(
     report_data: ReportUpload,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    background_tasks: BackgroundTasks,
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Upload report data directly as JSON (for testing or manual entry)."""
     if not report_data.grades_json:
@@ -815,7 +978,8 @@ async def upload_report_json(
             detail="grades_json is required in request body"
         )
     
-    report = ReportService.create_report(
+    report = await run_in_threadpool(
+        ReportService.create_report,
         user_id=current_user['user_id'],
         report_date=report_data.report_date,
         term=report_data.term,
@@ -823,73 +987,64 @@ async def upload_report_json(
         grades_json=report_data.grades_json
     )
     
-    # Auto-generate insights after report upload
-    try:
-        logger.info(f"Auto-generating insights for user {current_user['user_id']} after report upload")
-        await InsightService.generate_feedback(current_user['user_id'])
-    except Exception as e:
-        logger.warning(f"Could not auto-generate insights after report upload: {e}")
-        # Don't fail the report upload if insight generation fails
+    # Insights are generated after the response is sent
+    background_tasks.add_task(_generate_feedback_safely, current_user['user_id'])
     
     return ReportResponse.model_validate(report)
 
 
-@app.get(f"{settings.API_V1_PREFIX}/reports/history", response_model=List[ReportResponse])
-async def get_report_history(
-    limit: int = 10,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+@app.get(f"{API}/reports/history", response_model=List[ReportResponse])
+def get_report_history(
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Get user's report history."""
     reports = ReportService.get_report_history(current_user['user_id'], limit)
-    return [ReportResponse.model_validate(r) for r in reports]
+    return _list_response(_REPORT_LIST, reports)
 
 
-@app.post(f"{settings.API_V1_PREFIX}/reports/analyze", response_model=ReportAnalysis)
+@app.post(f"{API}/reports/analyze", response_model=ReportAnalysis)
 async def analyze_report(
     report_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Analyze a specific report and generate AI-powered insights."""
     analysis = await ReportService.analyze_report(report_id)
     return analysis
 
 
-@app.delete(f"{settings.API_V1_PREFIX}/reports/{{report_id}}", response_model=MessageResponse)
+@app.delete(f"{API}/reports/{{report_id}}", response_model=MessageResponse)
 async def delete_report(
     report_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Delete a report."""
-    from supabase_db import supabase, delete_academic_report
-    import os
 
     # First get the report to check for file_path
     try:
-        response = supabase.table('academic_reports').select('file_path').eq('report_id', report_id).eq('user_id', current_user['user_id']).execute()
-        if not response.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Report not found"
-            )
-
-        report = response.data[0]
-
-        # Delete associated file if exists
-        if report.get('file_path') and os.path.exists(report['file_path']):
-            try:
-                os.remove(report['file_path'])
-            except Exception as e:
-                print(f"Warning: Could not delete file {report['file_path']}: {e}")
-
+        response = await run_in_threadpool(
+            supabase.table('academic_reports').select('file_path').eq('report_id', report_id).eq('user_id', current_user['user_id']).execute
+        )
     except Exception as e:
         logger.error(f"Error getting report for deletion: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error deleting report"
         )
-
-    # Delete from database
-    success = delete_academic_report(report_id, current_user['user_id'])
+    if not response.data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Report not found"
+        )
+    file_path = response.data[0].get('file_path')
+
+    # Delete the row and the associated file concurrently; file errors are only logged
+    delete_row = run_in_threadpool(delete_academic_report, report_id, current_user['user_id'])
+    if file_path:
+        success, _ = await asyncio.gather(delete_row, asyncio.to_thread(_remove_file_quietly, file_path))
+    else:
+        success = await delete_row
+    PerformanceService.invalidate_cache(current_user['user_id'])
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -904,28 +1059,28 @@ async def delete_report(
 
 # ==================== PERFORMANCE ROUTES ====================
 
-@app.get(f"{settings.API_V1_PREFIX}/performance/dashboard", response_model=PerformanceDashboard)
-async def get_performance_dashboard(
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+@app.get(f"{API}/performance/dashboard", response_model=PerformanceDashboard)
+def get_performance_dashboard(
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Get performance dashboard data."""
     dashboard = PerformanceService.get_dashboard(current_user['user_id'])
     return dashboard
 
 
-@app.get(f"{settings.API_V1_PREFIX}/performance/trends", response_model=List[GradeTrend])
-async def get_performance_trends(
+@app.get(f"{API}/performance/trends", response_model=List[GradeTrend])
+def get_performance_trends(
     subject: Optional[str] = None,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Get grade trends for subjects."""
     trends = PerformanceService.get_grade_trends(current_user['user_id'], subject)
     return trends
 
 
-@app.get(f"{settings.API_V1_PREFIX}/performance/predictions", response_model=List[PerformancePrediction])
+@app.get(f"{API}/performance/predictions", response_model=List[PerformancePrediction])
 async def get_performance_predictions(
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Get performance predictions."""
     predictions = await PerformanceService.get_predictions(current_user['user_id'])
@@ -934,10 +1089,10 @@ async def get_performance_predictions(
 
 # ==================== FLASHCARD ROUTES ====================
 
-@app.post(f"{settings.API_V1_PREFIX}/flashcards/generate", response_model=List[FlashcardResponse], status_code=status.HTTP_201_CREATED)
+@app.post(f"{API}/flashcards/generate", response_model=List[FlashcardResponse], status_code=status.HTTP_201_CREATED)
 async def generate_flashcards(
     request: FlashcardGenerate,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Generate flashcards using AI."""
     flashcards = await FlashcardService.generate_flashcards(
@@ -949,18 +1104,18 @@ async def generate_flashcards(
         curriculum=current_user['curriculum_type']
     )
     
-    return [FlashcardResponse.model_validate(card) for card in flashcards]
+    return _list_response(_FLASHCARD_LIST, flashcards, status_code=status.HTTP_201_CREATED)
 
 
-@app.get(f"{settings.API_V1_PREFIX}/flashcards/list", response_model=List[FlashcardResponse])
-async def list_flashcards(
+@app.get(f"{API}/flashcards/list", response_model=List[FlashcardResponse])
+def list_flashcards(
     subject: Optional[str] = None,
     difficulty: Optional[str] = None,
-    limit: int = 50,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = PageCursor,
+    current_user: Dict[str, Any] = CurrentUser
 ):
-    """List user's flashcards."""
-    from supabase_db import supabase
+    """List user's flashcards, newest first."""
 
     try:
         # Build query dynamically
@@ -971,10 +1126,14 @@ async def list_flashcards(
         if difficulty:
             query = query.eq('difficulty', difficulty.lower())  # Assuming difficulty is stored as lowercase
 
-        response = query.order('created_at', desc=True).limit(limit).execute()
-        reviews_resp = supabase.table('flashcard_reviews').select('card_id, correct').eq('user_id', current_user['user_id']).execute()
+        response = apply_keyset(query, 'created_at', 'card_id', cursor).limit(limit).execute()
+        # Prefetch review history for just the listed cards in one query (not the user's whole history)
+        card_ids = [c['card_id'] for c in response.data or [] if c.get('card_id') is not None]
+        reviews = []
+        if card_ids:
+            reviews = supabase.table('flashcard_reviews').select('card_id, correct').eq('user_id', current_user['user_id']).in_('card_id', card_ids).execute().data or []
         review_counts: Dict[int, Dict[str, int]] = {}
-        for r in reviews_resp.data or []:
+        for r in reviews:
             cid = r.get('card_id')
             if cid is None:
                 continue
@@ -998,20 +1157,21 @@ async def list_flashcards(
             counts = review_counts.get(cid, {'total': c.get('times_reviewed', 0) or 0, 'correct': c.get('times_correct', 0) or 0})
             c['times_reviewed'] = counts['total']
             c['times_correct'] = counts['correct']
-            normalized_cards.append(FlashcardResponse.model_validate(c))
-        return normalized_cards
+            normalized_cards.append(c)
+        return _list_response(
+            _FLASHCARD_LIST, normalized_cards, cursor=next_cursor(response.data or [], 'created_at', 'card_id', limit)
+        )
     except Exception as e:
         logger.error(f"Error listing flashcards: {e}")
         return []
 
 
-@app.delete(f"{settings.API_V1_PREFIX}/flashcards/{{card_id}}", response_model=MessageResponse)
-async def delete_flashcard(
+@app.delete(f"{API}/flashcards/{{card_id}}", response_model=MessageResponse)
+def delete_flashcard(
     card_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Delete a flashcard."""
-    from supabase_db import delete_flashcard as delete_flashcard_db
 
     success = delete_flashcard_db(card_id, current_user['user_id'])
     if not success:
@@ -1023,11 +1183,11 @@ async def delete_flashcard(
     return MessageResponse(message="Flashcard deleted successfully")
 
 
-@app.post(f"{settings.API_V1_PREFIX}/flashcards/{{card_id}}/review", response_model=MessageResponse)
-async def review_flashcard(
+@app.post(f"{API}/flashcards/{{card_id}}/review", response_model=MessageResponse)
+def review_flashcard(
     card_id: int,
     review_data: FlashcardReviewRequest,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Record a flashcard review."""
     review_result = FlashcardService.review_flashcard(
@@ -1044,11 +1204,11 @@ async def review_flashcard(
     )
 
 
-@app.post(f"{settings.API_V1_PREFIX}/flashcards/{{card_id}}/evaluate", response_model=FlashcardEvaluateResponse)
+@app.post(f"{API}/flashcards/{{card_id}}/evaluate", response_model=FlashcardEvaluateResponse)
 async def evaluate_flashcard_answer(
     card_id: int,
     request: FlashcardEvaluateRequest,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Evaluate student's answer to a flashcard."""
 
@@ -1063,29 +1223,26 @@ async def evaluate_flashcard_answer(
 
 # ==================== CAREER ROUTES ====================
 
-@app.get(f"{settings.API_V1_PREFIX}/career/recommendations", response_model=List[CareerRecommendationResponse])
+@app.get(f"{API}/career/recommendations", response_model=List[CareerRecommendationResponse])
 async def get_career_recommendations(
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Get career recommendations."""
-    from supabase_db import get_user_career_recommendations
-
-    recommendations = get_user_career_recommendations(current_user['user_id'])
 
-    # Sort by match_score descending
-    recommendations.sort(key=lambda x: x.get('match_score', 0), reverse=True)
+    # Already ordered by match_score in the query; an empty result triggers generation
+    recommendations = await run_in_threadpool(get_user_career_recommendations, current_user['user_id'])
 
     if not recommendations:
         logger.info(f"No existing career recommendations for user {current_user['user_id']}. Generating new ones.")
         recommendations = await CareerService.generate_recommendations(user_id=current_user['user_id'])
 
-    return [CareerRecommendationResponse.model_validate(r) for r in recommendations]
+    return _list_response(_CAREER_LIST, recommendations)
 
 
-@app.post(f"{settings.API_V1_PREFIX}/career/quiz", response_model=List[CareerRecommendationResponse])
+@app.post(f"{API}/career/quiz", response_model=List[CareerRecommendationResponse])
 async def career_quiz(
     quiz_data: CareerQuizRequest,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Generate career recommendations based on quiz."""
     recommendations = await CareerService.generate_recommendations(
@@ -1093,19 +1250,18 @@ async def career_quiz(
         interests=quiz_data.interests
     )
     
-    return [CareerRecommendationResponse.model_validate(r) for r in recommendations]
+    return _list_response(_CAREER_LIST, recommendations)
 
 
-@app.get(f"{settings.API_V1_PREFIX}/career/{{recommendation_id}}/details", response_model=CareerRecommendationResponse)
-async def get_career_details(
+@app.get(f"{API}/career/{{recommendation_id}}/details", response_model=CareerRecommendationResponse)
+def get_career_details(
     recommendation_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Get details of a specific career recommendation."""
-    from supabase_db import supabase
 
     try:
-        response = supabase.table('career_recommendations').select('*').eq('recommendation_id', recommendation_id).eq('user_id', current_user['user_id']).execute()
+        response = supabase.table('career_recommendations').select('*').eq('recommendation_id', recommendation_id).eq('user_id', current_user['user_id']).limit(1).execute()
         if not response.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1120,34 +1276,31 @@ async def get_career_details(
             detail="Error retrieving career recommendation"
         )
 
-@app.post(f"{settings.API_V1_PREFIX}/career/{{recommendation_id}}/favorite", response_model=MessageResponse)
-async def favorite_career(
+@app.post(f"{API}/career/{{recommendation_id}}/favorite", response_model=MessageResponse)
+def favorite_career(
     recommendation_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
-    from supabase_db import update_career_recommendation
     updated = update_career_recommendation(recommendation_id, {"is_favorite": True})
     if not updated:
         raise HTTPException(status_code=404, detail="Career recommendation not found")
     return MessageResponse(message="Career saved to favorites", data={"recommendation_id": recommendation_id})
 
-@app.delete(f"{settings.API_V1_PREFIX}/career/{{recommendation_id}}/favorite", response_model=MessageResponse)
-async def unfavorite_career(
+@app.delete(f"{API}/career/{{recommendation_id}}/favorite", response_model=MessageResponse)
+def unfavorite_career(
     recommendation_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
-    from supabase_db import update_career_recommendation
     updated = update_career_recommendation(recommendation_id, {"is_favorite": False})
     if not updated:
         raise HTTPException(status_code=404, detail="Career recommendation not found")
     return MessageResponse(message="Career removed from favorites", data={"recommendation_id": recommendation_id})
 
-@app.post(f"{settings.API_V1_PREFIX}/career/{{recommendation_id}}/share", response_model=MessageResponse)
-async def share_career(
+@app.post(f"{API}/career/{{recommendation_id}}/share", response_model=MessageResponse)
+def share_career(
     recommendation_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
-    from supabase_db import update_career_recommendation
     try:
         update_career_recommendation(recommendation_id, {"share_count": 1})
     except Exception:
@@ -1158,10 +1311,10 @@ async def share_career(
 
 # ==================== STUDY PLAN ROUTES ====================
 
-@app.post(f"{settings.API_V1_PREFIX}/study-plans/generate", response_model=List[StudyPlanResponse], status_code=status.HTTP_201_CREATED)
+@app.post(f"{API}/study-plans/generate", response_model=List[StudyPlanResponse], status_code=status.HTTP_201_CREATED)
 async def generate_study_plan(
     request: StudyPlanGenerate,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Generate a personalized study plan."""
     try:
@@ -1205,7 +1358,7 @@ async def generate_study_plan(
             )
         
         logger.info(f"Successfully generated {len(plans)} study plan(s) for user {current_user['user_id']}")
-        return [StudyPlanResponse.model_validate(plan) for plan in plans]
+        return _list_response(_STUDY_PLAN_LIST, plans, status_code=status.HTTP_201_CREATED)
     except HTTPException:
         raise
     except Exception as e:
@@ -1217,13 +1370,64 @@ async def generate_study_plan(
 
 
 
-@app.get(f"{settings.API_V1_PREFIX}/study-plans/all", response_model=List[dict])
-async def get_all_study_plans(
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+@app.post(f"{API}/study-plans/preview", response_model=dict)
+async def preview_study_plan(
+    request: StudyPlanGenerate,
+    current_user: Dict[str, Any] = CurrentUser,
+    llm: LLMService = Depends(get_llm_service)
+):
+    """Preview a study plan with per-subject learning strategies in a single request (not saved)."""
+    try:
+        return await llm.generate_plan_with_strategies(
+            weak_subjects=request.subjects,
+            available_hours=request.available_hours_per_day,
+            exam_date=request.exam_date,
+            grade_level=current_user.get("grade_level") or 10,
+            focus_areas=request.focus_areas
+        )
+    except Exception as e:
+        logger.error(f"Study plan preview error: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to generate study plan preview"
+        )
+
+
+@app.post(f"{API}/study-plans/preview/stream")
+async def stream_study_plan_preview(
+    request: StudyPlanGenerate,
+    current_user: Dict[str, Any] = CurrentUser,
+    llm: LLMService = Depends(get_llm_service)
+):
+    """Stream a study plan preview as NDJSON: one line per scheduled day, then the full plan (not saved)."""
+    async def ndjson_lines():
+        try:
+            async for event in llm.stream_study_plan(
+                weak_subjects=request.subjects,
+                available_hours=request.available_hours_per_day,
+                exam_date=request.exam_date,
+                grade_level=current_user.get("grade_level") or 10,
+                focus_areas=request.focus_areas
+            ):
+                yield orjson.dumps(event) + b"\n"
+        except Exception as e:
+            logger.error(f"Study plan preview stream error: {e}", exc_info=True)
+            yield orjson.dumps({"type": "error", "detail": "Failed to generate study plan preview"}) + b"\n"
+
+    # An explicit Content-Encoding makes GZipMiddleware pass the stream through, so each
+    # line is flushed as it is produced instead of being held in the compressor
+    return StreamingResponse(
+        ndjson_lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Encoding": "identity"}
+    )
+
+
+@app.get(f"{API}/study-plans/all", response_model=List[dict])
+def get_all_study_plans(
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Get all study plans for the current user, regardless of status."""
-    from supabase_db import get_user_study_plans
-    from supabase_db import supabase
 
     plans = get_user_study_plans(current_user['user_id'])
 
@@ -1286,15 +1490,13 @@ async def get_all_study_plans(
         })
     return simplified_plans
 
-@app.get(f"{settings.API_V1_PREFIX}/study-plans/active", response_model=List[dict])
-async def get_active_study_plans(
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+@app.get(f"{API}/study-plans/active", response_model=List[dict])
+def get_active_study_plans(
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Get active study plans."""
-    from supabase_db import get_user_study_plans
 
-    all_plans = get_user_study_plans(current_user['user_id'])
-    plans = [p for p in all_plans if str(p.get('status', '')).lower() == 'active']
+    plans = get_user_study_plans(current_user['user_id'], status='active')
 
     # For now, return simplified data to avoid date parsing issues
     simplified_plans = []
@@ -1309,16 +1511,15 @@ async def get_active_study_plans(
     return simplified_plans
 
 
-@app.get(f"{settings.API_V1_PREFIX}/study-plans/{{plan_id}}", response_model=StudyPlanResponse)
-async def get_study_plan_by_id(
+@app.get(f"{API}/study-plans/{{plan_id}}", response_model=StudyPlanResponse)
+def get_study_plan_by_id(
     plan_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Get a specific study plan by ID."""
-    from supabase_db import supabase
 
     try:
-        response = supabase.table('study_plans').select('*').eq('plan_id', plan_id).eq('user_id', current_user['user_id']).execute()
+        response = supabase.table('study_plans').select('*').eq('plan_id', plan_id).eq('user_id', current_user['user_id']).limit(1).execute()
         if not response.data:
             raise HTTPException(status_code=404, detail="Study plan not found")
 
@@ -1363,14 +1564,13 @@ async def get_study_plan_by_id(
 
 
 
-@app.put(f"{settings.API_V1_PREFIX}/study-plans/{{plan_id}}/update", response_model=StudyPlanResponse)
-async def update_study_plan(
+@app.put(f"{API}/study-plans/{{plan_id}}/update", response_model=StudyPlanResponse)
+def update_study_plan(
     plan_id: int,
     request: StudyPlanUpdate,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Update a study plan."""
-    from supabase_db import update_study_plan
 
     # Build update data
     update_data = {}
@@ -1391,7 +1591,7 @@ async def update_study_plan(
     if request.priority is not None:
         update_data['priority'] = _convert_priority_to_int(request.priority)
 
-    updated_plan = update_study_plan(plan_id, update_data)
+    updated_plan = update_study_plan_db(plan_id, update_data, user_id=current_user['user_id'])
     if not updated_plan:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1401,15 +1601,13 @@ async def update_study_plan(
     return StudyPlanResponse.model_validate(updated_plan)
 
 
-@app.delete(f"{settings.API_V1_PREFIX}/study-plans/{{plan_id}}", response_model=MessageResponse)
+@app.delete(f"{API}/study-plans/{{plan_id}}", response_model=MessageResponse)
 async def delete_study_plan(
     plan_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Delete a study plan."""
-    from supabase_db import delete_study_plan as delete_study_plan_db
-
-    success = delete_study_plan_db(plan_id, current_user['user_id'])
+    success = await delete_study_plan_async(plan_id, current_user['user_id'])
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1419,26 +1617,58 @@ async def delete_study_plan(
     return MessageResponse(message="Study plan deleted successfully")
 
 
-@app.post(f"{settings.API_V1_PREFIX}/study-plans/{{plan_id}}/log-session", response_model=StudySessionResponse, status_code=status.HTTP_201_CREATED)
-async def log_study_session(
-    plan_id: int,
-    session_data: StudySessionLog,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
-):
-    """Log a study session."""
-    from supabase_db import create_study_session
-    
-    session_to_create = {
-        "user_id": current_user['user_id'],
+def _study_session_row(plan_id: int, session_data: StudySessionLog, user_id: int) -> Dict[str, Any]:
+    """Build the study_sessions row for a logged session (plan_id <= 0 means no plan; date defaults to now() in the database)."""
+    return {
+        "user_id": user_id,
         "plan_id": plan_id if plan_id > 0 else None,
-        "date": datetime.utcnow().isoformat(),
         "duration_minutes": session_data.duration_minutes,
         "completed": session_data.completed,
         "notes": session_data.notes,
         "topics_covered": session_data.topics_covered
     }
-    
-    session = create_study_session(session_to_create)
+
+
+async def _get_own_plan_schedule(plan_id: int, user_id: int) -> Dict[str, Any]:
+    """Fetch the schedule columns of the user's own study plan, or 404."""
+    db = await get_async_supabase()
+    # Only the schedule columns are needed; minutes studied are summed in the database
+    plan_response = await db.table('study_plans').select('start_date,end_date,daily_duration_minutes').eq('plan_id', plan_id).eq('user_id', user_id).limit(1).execute()
+    if not plan_response.data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Study plan not found"
+        )
+    return plan_response.data[0]
+
+
+async def _complete_plan_if_done(plan_id: int, plan: Dict[str, Any], user_id: int) -> None:
+    """Mark a study plan completed once its logged minutes reach the planned total."""
+    start_date = datetime.fromisoformat(plan['start_date']) if plan.get('start_date') else None
+    end_date = datetime.fromisoformat(plan['end_date']) if plan.get('end_date') else None
+    daily_duration_minutes = plan.get('daily_duration_minutes') or 0
+
+    if start_date and end_date and daily_duration_minutes > 0:
+        total_minutes_studied = await get_plan_minutes_studied_async(plan_id)
+
+        days_active_in_plan = (end_date - start_date).days + 1
+        planned_minutes = days_active_in_plan * daily_duration_minutes
+
+        if planned_minutes > 0 and total_minutes_studied >= planned_minutes:
+            logger.info(f"Study plan {plan_id} completed automatically for user {user_id}")
+            await update_study_plan_async(plan_id, {'status': PlanStatus.COMPLETED.value}, user_id=user_id)
+
+
+@app.post(f"{API}/study-plans/{{plan_id}}/log-session", response_model=StudySessionResponse, status_code=status.HTTP_201_CREATED)
+async def log_study_session(
+    plan_id: int,
+    session_data: StudySessionLog,
+    current_user: Dict[str, Any] = CurrentUser
+):
+    """Log a study session."""
+    # Sessions may only be logged against the caller's own plan
+    plan = await _get_own_plan_schedule(plan_id, current_user['user_id']) if plan_id > 0 else None
+    session = await create_study_session_async(_study_session_row(plan_id, session_data, current_user['user_id']))
 
     if not session:
         raise HTTPException(
@@ -1446,100 +1676,103 @@ async def log_study_session(
             detail="Failed to log study session"
         )
 
-    # Check for auto-completion
-    if plan_id > 0:
-        from supabase_db import supabase, update_study_plan
-        from models import PlanStatus
+    if plan:
+        await _complete_plan_if_done(plan_id, plan, current_user['user_id'])
 
-        plan_response = supabase.table('study_plans').select('*').eq('plan_id', plan_id).execute()
-        plan = plan_response.data[0] if plan_response.data else None
+    return _item_response(StudySessionResponse, session, status_code=status.HTTP_201_CREATED)
 
-        if plan:
-            # Calculate progress logic here
-            start_date = datetime.fromisoformat(plan['start_date']) if plan.get('start_date') else None
-            end_date = datetime.fromisoformat(plan['end_date']) if plan.get('end_date') else None
-            daily_duration_minutes = plan.get('daily_duration_minutes', 0)
 
-            if start_date and end_date and daily_duration_minutes > 0:
-                # Get all sessions for this plan
-                sessions_response = supabase.table('study_sessions').select('duration_minutes').eq('plan_id', plan_id).execute()
-                total_minutes_studied = sum(s['duration_minutes'] for s in sessions_response.data)
+@app.post(f"{API}/study-plans/{{plan_id}}/sessions/bulk", response_model=List[StudySessionResponse], status_code=status.HTTP_201_CREATED)
+async def log_study_sessions_bulk(
+    plan_id: int,
+    sessions_data: List[StudySessionLog],
+    current_user: Dict[str, Any] = CurrentUser
+):
+    """Log several study sessions in one request."""
+    _check_bulk_size(sessions_data)
+    plan = await _get_own_plan_schedule(plan_id, current_user['user_id']) if plan_id > 0 else None
+    sessions = await create_study_sessions_async(
+        [_study_session_row(plan_id, s, current_user['user_id']) for s in sessions_data]
+    )
 
-                days_active_in_plan = (end_date - start_date).days + 1
-                planned_minutes = days_active_in_plan * daily_duration_minutes
+    if not sessions:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to log study sessions"
+        )
 
-                if planned_minutes > 0 and total_minutes_studied >= planned_minutes:
-                    logger.info(f"Study plan {plan_id} completed automatically for user {current_user['user_id']}")
-                    update_study_plan(plan_id, {'status': PlanStatus.COMPLETED.value})
-    
-    return StudySessionResponse.model_validate(session)
+    if plan:
+        await _complete_plan_if_done(plan_id, plan, current_user['user_id'])
+
+    return _list_response(_STUDY_SESSION_LIST, sessions, status_code=status.HTTP_201_CREATED)
 
 
 # ==================== INSIGHT ROUTES ====================
 
-@app.get(f"{settings.API_V1_PREFIX}/insights/feedback", response_model=AcademicFeedback)
+@app.get(f"{API}/insights/feedback", response_model=AcademicFeedback)
 async def get_academic_feedback(
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    fresh: bool = False,
+    current_user: Dict[str, Any] = CurrentUser
 ):
-    """Get personalized academic feedback."""
-    feedback = await InsightService.generate_feedback(current_user['user_id'])
+    """Get personalized academic feedback (pass fresh=true to regenerate)."""
+    feedback = await InsightService.generate_feedback(current_user['user_id'], fresh=fresh)
     return feedback
 
 
-@app.get(f"{settings.API_V1_PREFIX}/insights/learning-tips", response_model=List[LearningInsightResponse])
+@app.get(f"{API}/insights/learning-tips", response_model=List[LearningInsightResponse])
 async def get_learning_tips(
-    limit: int = 10,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = PageCursor,
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Get learning tips and insights."""
-    from supabase_db import get_user_insights
-
-    # Get all insights and filter for TIP and RECOMMENDATION types
-    all_insights = get_user_insights(current_user['user_id'], limit * 2)  # Get more to account for filtering
+    # Filter for TIP and RECOMMENDATION types in the query (older rows may be upper-case)
+    insights = await get_user_insights_async(
+        current_user['user_id'], limit, insight_types=['tip', 'recommendation', 'TIP', 'RECOMMENDATION'], cursor=cursor
+    )
+    page_cursor = next_cursor(insights, 'generated_at', 'insight_id', limit)
 
     # Transform insight_type to lowercase
-    for insight in all_insights:
+    for insight in insights:
         if 'insight_type' in insight:
             insight['insight_type'] = insight['insight_type'].lower()
 
-    insights = [i for i in all_insights if i.get('insight_type') in ['tip', 'recommendation']][:limit]
-
-    return [LearningInsightResponse.model_validate(insight) for insight in insights]
+    return _list_response(_INSIGHT_LIST, insights, cursor=page_cursor)
 
 
-@app.get(f"{settings.API_V1_PREFIX}/insights/academic-analysis", response_model=List[LearningInsightResponse])
+@app.get(f"{API}/insights/academic-analysis", response_model=List[LearningInsightResponse])
 async def get_academic_analysis(
-    limit: int = 50,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = PageCursor,
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Get all learning insights for the user."""
-    from supabase_db import get_user_insights
+    insights = await get_user_insights_async(current_user['user_id'], limit, cursor=cursor)
+    page_cursor = next_cursor(insights, 'generated_at', 'insight_id', limit)
 
-    # Get all insights using Supabase
-    insights = get_user_insights(current_user['user_id'], limit)
+    # No insights yet: generate feedback once and use the rows it saved instead of querying again
+    if not insights and not cursor:
+        _, insights = await InsightService.generate_feedback_with_insights(current_user['user_id'])
+        insights = insights[:limit]
 
     # Transform insight_type to lowercase to match enum expectations
     for insight in insights:
         if 'insight_type' in insight:
             insight['insight_type'] = insight['insight_type'].lower()
 
-    # If no insights exist, log the situation (temporarily disabled feedback generation)
-    if not insights:
-        logger.info(f"No insights found for user {current_user['user_id']}")
-
-    return [LearningInsightResponse.model_validate(insight) for insight in insights]
+    return _list_response(_INSIGHT_LIST, insights, cursor=page_cursor)
 
 
-@app.get(f"{settings.API_V1_PREFIX}/insights/{{insight_id}}", response_model=LearningInsightResponse)
+@app.get(f"{API}/insights/{{insight_id}}", response_model=LearningInsightResponse)
 async def get_insight_by_id(
     insight_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    background_tasks: BackgroundTasks,
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Get a specific insight by ID."""
-    from supabase_db import supabase
-
     try:
-        response = supabase.table('learning_insights').select('*').eq('insight_id', insight_id).eq('user_id', current_user['user_id']).execute()
+        db = await get_async_supabase()
+        response = await db.table('learning_insights').select('*').eq('insight_id', insight_id).eq('user_id', current_user['user_id']).limit(1).execute()
         if not response.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1552,12 +1785,13 @@ async def get_insight_by_id(
         if 'insight_type' in insight:
             insight['insight_type'] = insight['insight_type'].lower()
 
-        # Mark as read when viewed
+        # Mark as read when viewed, after the response has been sent
         if not insight.get('is_read', False):
-            from supabase_db import mark_insight_read
-            mark_insight_read(insight_id)
+            background_tasks.add_task(mark_insight_read_async, insight_id, current_user['user_id'])
 
-        return LearningInsightResponse.model_validate(insight)
+        return _item_response(LearningInsightResponse, insight)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting insight {insight_id}: {e}")
         raise HTTPException(
@@ -1566,15 +1800,14 @@ async def get_insight_by_id(
         )
 
 
-@app.put(f"{settings.API_V1_PREFIX}/insights/{{insight_id}}/read", response_model=MessageResponse)
-async def mark_insight_read(
+@app.put(f"{API}/insights/{{insight_id}}/read", response_model=MessageResponse)
+def mark_insight_read(
     insight_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    current_user: Dict[str, Any] = CurrentUser
 ):
     """Mark an insight as read."""
-    from supabase_db import mark_insight_read as mark_read
 
-    success = mark_read(insight_id)
+    success = mark_insight_read_db(insight_id, user_id=current_user['user_id'])
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1586,8 +1819,8 @@ async def mark_insight_read(
 
 # ==================== INVITE CODE ROUTES ====================
 
-@app.post(f"{settings.API_V1_PREFIX}/invite/generate", response_model=InviteCodeResponse, status_code=status.HTTP_201_CREATED)
-async def generate_invite_code(
+@app.post(f"{API}/invite/generate", response_model=InviteCodeResponse, status_code=status.HTTP_201_CREATED)
+def generate_invite_code(
     current_user: Dict[str, Any] = Depends(require_user_type("teacher", "parent"))
 ):
     """Generate an invite code for linking students. Only for teachers and parents."""
@@ -1597,7 +1830,7 @@ async def generate_invite_code(
             creator_id=current_user['user_id'],
             creator_type=creator_type
         )
-        return InviteCodeResponse.model_validate(invite)
+        return _item_response(InviteCodeResponse, invite, status_code=status.HTTP_201_CREATED)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -1605,17 +1838,17 @@ async def generate_invite_code(
         )
 
 
-@app.get(f"{settings.API_V1_PREFIX}/invite/my-codes", response_model=List[InviteCodeResponse])
-async def get_my_invite_codes(
+@app.get(f"{API}/invite/my-codes", response_model=List[InviteCodeResponse])
+def get_my_invite_codes(
     current_user: Dict[str, Any] = Depends(require_user_type("teacher", "parent"))
 ):
     """Get all invite codes created by the current user."""
     codes = InviteService.get_my_codes(current_user['user_id'])
-    return [InviteCodeResponse.model_validate(c) for c in codes]
+    return _list_response(_INVITE_CODE_LIST, codes)
 
 
-@app.post(f"{settings.API_V1_PREFIX}/invite/redeem", response_model=MessageResponse)
-async def redeem_invite_code(
+@app.post(f"{API}/invite/redeem", response_model=MessageResponse)
+def redeem_invite_code(
     request: InviteCodeRedeem,
     current_user: Dict[str, Any] = Depends(require_user_type("student"))
 ):
@@ -1638,62 +1871,58 @@ async def redeem_invite_code(
 
 # ==================== RELATIONSHIP ROUTES ====================
 
-@app.get(f"{settings.API_V1_PREFIX}/relationships/students", response_model=List[LinkedStudentResponse])
-async def get_linked_students(
+@app.get(f"{API}/relationships/students", response_model=List[LinkedStudentResponse])
+def get_linked_students(
     current_user: Dict[str, Any] = Depends(require_user_type("teacher", "parent"))
 ):
     """Get all students linked to the current teacher/parent."""
     students_data = RelationshipService.get_linked_students(current_user['user_id'])
-    return [LinkedStudentResponse.model_validate(s) for s in students_data]
+    return _list_response(_LINKED_STUDENT_LIST, students_data)
 
 
-@app.get(f"{settings.API_V1_PREFIX}/relationships/guardians", response_model=List[LinkedGuardianResponse])
-async def get_linked_guardians(
+@app.get(f"{API}/relationships/guardians", response_model=List[LinkedGuardianResponse])
+def get_linked_guardians(
     current_user: Dict[str, Any] = Depends(require_user_type("student"))
 ):
     """Get all teachers/parents linked to the current student."""
     guardians_data = RelationshipService.get_linked_guardians(current_user['user_id'])
-    return [LinkedGuardianResponse.model_validate(g) for g in guardians_data]
+    return _list_response(_LINKED_GUARDIAN_LIST, guardians_data)
 
 
-@app.get(f"{settings.API_V1_PREFIX}/students/{{student_id}}/dashboard", response_model=StudentDashboardResponse)
+@app.get(f"{API}/students/{{student_id}}/dashboard", response_model=StudentDashboardResponse)
 async def get_student_dashboard(
     student_id: int,
     current_user: Dict[str, Any] = Depends(require_user_type("teacher", "parent"))
 ):
     """Get a student's dashboard data. Only accessible by linked teachers/parents."""
     try:
-        dashboard = RelationshipService.get_student_dashboard(
+        return await RelationshipService.get_student_dashboard(
             guardian_id=current_user['user_id'],
             student_id=student_id
         )
-        return StudentDashboardResponse.model_validate(dashboard)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=str(e)
         )
 
-@app.get(f"{settings.API_V1_PREFIX}/students/{{student_id}}/reports", response_model=List[ReportResponse])
+@app.get(f"{API}/students/{{student_id}}/reports", response_model=List[ReportResponse])
 async def get_student_reports(
     student_id: int,
-    limit: int = 10,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
     current_user: Dict[str, Any] = Depends(require_user_type("teacher", "parent"))
 ):
     """Get a student's reports. Only accessible by linked teachers/parents."""
-    # Verify relationship
-    if not RelationshipService.verify_relationship(current_user['user_id'], student_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You do not have permission to view this student's reports"
-        )
-    
-    reports = ReportService.get_report_history(student_id, limit)
-    return [ReportResponse.model_validate(r) for r in reports]
+    reports = await _read_for_student(
+        current_user['user_id'], student_id,
+        get_user_reports_async(student_id, limit, columns=REPORT_RESPONSE_COLUMNS),
+        "You do not have permission to view this student's reports"
+    )
+    return _list_response(_REPORT_LIST, reports)
 
 
-@app.delete(f"{settings.API_V1_PREFIX}/relationships/{{student_id}}", response_model=MessageResponse)
-async def remove_student_link(
+@app.delete(f"{API}/relationships/{{student_id}}", response_model=MessageResponse)
+def remove_student_link(
     student_id: int,
     current_user: Dict[str, Any] = Depends(require_user_type("teacher", "parent"))
 ):
@@ -1707,61 +1936,63 @@ async def remove_student_link(
     return MessageResponse(message="Student link removed successfully")
 
 
-@app.get(f"{settings.API_V1_PREFIX}/students/{{student_id}}/flashcards", response_model=List[FlashcardResponse])
+@app.get(f"{API}/students/{{student_id}}/flashcards", response_model=List[FlashcardResponse])
 async def get_student_flashcards(
     student_id: int,
     subject: Optional[str] = None,
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = PageCursor,
     current_user: Dict[str, Any] = Depends(require_user_type("teacher", "parent"))
 ):
     """Get a student's flashcards. Only accessible by linked teachers/parents."""
-    from supabase_db import supabase
-
-    if not RelationshipService.verify_relationship(current_user['user_id'], student_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You do not have permission to view this student's flashcards"
-        )
-
-    # Build query dynamically
-    query = supabase.table('flashcards').select('*').eq('user_id', student_id).eq('is_active', True)
-
-    if subject:
-        query = query.eq('subject', subject)
-
-    response = query.order('created_at', desc=True).limit(limit).execute()
-    return [FlashcardResponse.model_validate(card) for card in response.data]
+    flashcards = await _read_for_student(
+        current_user['user_id'], student_id,
+        get_user_flashcards_async(student_id, limit, subject, cursor),
+        "You do not have permission to view this student's flashcards"
+    )
+    return _list_response(
+        _FLASHCARD_LIST, flashcards, cursor=next_cursor(flashcards, 'created_at', 'card_id', limit)
+    )
 
 
-@app.get(f"{settings.API_V1_PREFIX}/students/{{student_id}}/career", response_model=List[CareerRecommendationResponse])
+@app.get(f"{API}/students/{{student_id}}/career", response_model=List[CareerRecommendationResponse])
 async def get_student_career_recommendations(
     student_id: int,
     current_user: Dict[str, Any] = Depends(require_user_type("teacher", "parent"))
 ):
     """Get a student's career recommendations. Only accessible by linked teachers/parents."""
-    from supabase_db import get_user_career_recommendations
+    recommendations = await _read_for_student(
+        current_user['user_id'], student_id,
+        get_user_career_recommendations_async(student_id),
+        "You do not have permission to view this student's career recommendations"
+    )
 
-    if not RelationshipService.verify_relationship(current_user['user_id'], student_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You do not have permission to view this student's career recommendations"
-        )
+    return _list_response(_CAREER_LIST, recommendations)
 
-    recommendations = get_user_career_recommendations(student_id)
-    # Sort by match_score descending
-    recommendations.sort(key=lambda x: x.get('match_score', 0), reverse=True)
 
-    return [CareerRecommendationResponse.model_validate(r) for r in recommendations]
+def _guardian_insight_row(student_id: int, insight_data: GuardianInsightCreate, guardian: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the learning_insights row for an insight a teacher/parent writes for a student."""
+    return {
+        "user_id": student_id,
+        "insight_type": insight_data.insight_type.value, # Use string value
+        "title": insight_data.title,
+        "content": insight_data.content,
+        "created_by": guardian['user_id'],
+        "metadata_json": {
+            "created_by_name": guardian['full_name'],
+            "created_by_type": guardian['user_type'],
+            "source": "guardian"
+        }
+    }
 
 
-@app.post(f"{settings.API_V1_PREFIX}/students/{{student_id}}/insights", response_model=LearningInsightResponse, status_code=status.HTTP_201_CREATED)
-async def create_student_insight(
+@app.post(f"{API}/students/{{student_id}}/insights", response_model=LearningInsightResponse, status_code=status.HTTP_201_CREATED)
+def create_student_insight(
     student_id: int,
     insight_data: GuardianInsightCreate,
     current_user: Dict[str, Any] = Depends(require_user_type("teacher", "parent"))
 ):
     """Create an insight for a student. Only accessible by linked teachers/parents."""
-    from supabase_db import create_learning_insight
     
     # Verify relationship
     if not RelationshipService.verify_relationship(current_user['user_id'], student_id):
@@ -1770,20 +2001,7 @@ async def create_student_insight(
             detail="You do not have permission to create insights for this student"
         )
     
-    # Create the insight
-    insight_to_create = {
-        "user_id": student_id,
-        "insight_type": insight_data.insight_type.value, # Use string value
-        "title": insight_data.title,
-        "content": insight_data.content,
-        "created_by": current_user['user_id'],
-        "metadata_json": {
-            "created_by_name": current_user['full_name'],
-            "created_by_type": current_user['user_type'],
-            "source": "guardian"
-        }
-    }
-    insight = create_learning_insight(insight_to_create)
+    insight = create_learning_insight(_guardian_insight_row(student_id, insight_data, current_user))
 
     if not insight:
         raise HTTPException(
@@ -1791,42 +2009,60 @@ async def create_student_insight(
             detail="Failed to create insight"
         )
     
-    return LearningInsightResponse.model_validate(insight)
+    return _item_response(LearningInsightResponse, insight, status_code=status.HTTP_201_CREATED)
 
 
-@app.get(f"{settings.API_V1_PREFIX}/students/{{student_id}}/insights", response_model=List[LearningInsightResponse])
-async def get_student_insights(
+@app.post(f"{API}/students/{{student_id}}/insights/bulk", response_model=List[LearningInsightResponse], status_code=status.HTTP_201_CREATED)
+async def create_student_insights_bulk(
     student_id: int,
-    limit: int = 50,
+    insights_data: List[GuardianInsightCreate],
     current_user: Dict[str, Any] = Depends(require_user_type("teacher", "parent"))
 ):
-    """Get insights for a student. Only accessible by linked teachers/parents."""
-    from supabase_db import get_user_insights
-
-    # Verify relationship
-    if not RelationshipService.verify_relationship(current_user['user_id'], student_id):
+    """Create several insights for a student in one request. Only accessible by linked teachers/parents."""
+    _check_bulk_size(insights_data)
+    if not await RelationshipService.verify_relationship_async(current_user['user_id'], student_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="You do not have permission to view this student's insights"
+            detail="You do not have permission to create insights for this student"
         )
 
-    insights = get_user_insights(student_id, limit)
+    insights = await create_learning_insights_async(
+        [_guardian_insight_row(student_id, i, current_user) for i in insights_data]
+    )
+
+    if not insights:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create insights"
+        )
+
+    return _list_response(_INSIGHT_LIST, insights, status_code=status.HTTP_201_CREATED)
+
+
+@app.get(f"{API}/students/{{student_id}}/insights", response_model=List[LearningInsightResponse])
+async def get_student_insights(
+    student_id: int,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = PageCursor,
+    current_user: Dict[str, Any] = Depends(require_user_type("teacher", "parent"))
+):
+    """Get insights for a student. Only accessible by linked teachers/parents."""
+    insights = await _read_for_student(
+        current_user['user_id'], student_id,
+        get_user_insights_async(student_id, limit, cursor=cursor),
+        "You do not have permission to view this student's insights"
+    )
+    page_cursor = next_cursor(insights, 'generated_at', 'insight_id', limit)
 
     # Transform insight_type to lowercase
     for insight in insights:
         if 'insight_type' in insight:
             insight['insight_type'] = insight['insight_type'].lower()
 
-    return [LearningInsightResponse.model_validate(insight) for insight in insights]
-
+    return _list_response(_INSIGHT_LIST, insights, cursor=page_cursor)
 
-# ==================== HEALTH CHECK ====================
-
-@app.get("/health")
-async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy", "version": settings.APP_VERSION}
 
+# ==================== ROOT ====================
 
 @app.get("/")
 async def root():
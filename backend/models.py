@@ -6,7 +6,7 @@ from __future__ import annotations
 
 from datetime import datetime
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, EmailStr, Field, validator, ValidationError
+from pydantic import BaseModel, EmailStr, Field, validator, ValidationError, model_validator
 from enum import Enum
 
 
@@ -329,9 +329,10 @@ class FlashcardResponse(BaseModel):
     
     model_config = {"from_attributes": True}
     
+    @model_validator(mode="before")
     @classmethod
-    def model_validate(cls, obj, **kwargs):
-        """Custom validation to calculate mastery_level and review_count."""
+    def _derive_mastery(cls, obj):
+        """Calculate mastery_level and review_count (also runs under TypeAdapter list validation)."""
         from utils import calculate_mastery_level
         from collections.abc import Mapping
         
@@ -358,11 +359,11 @@ class FlashcardResponse(BaseModel):
         review_count = times_reviewed
         
         # Create dict with calculated fields
-        data = obj.__dict__.copy() if hasattr(obj, '__dict__') else dict(obj)
+        data = dict(obj) if isinstance(obj, Mapping) else obj.__dict__.copy()
         data['mastery_level'] = mastery_level
         data['review_count'] = review_count
         
-        return super().model_validate(data, **kwargs)
+        return data
 
 
 class FlashcardReviewRequest(BaseModel):
@@ -465,9 +466,10 @@ class StudyPlanResponse(BaseModel):
     def active_weekly_schedule(self) -> List[Dict[str, Any]]:
         return [day for day in self.weekly_schedule if day.get("is_active", True)]
     
+    @model_validator(mode="before")
     @classmethod
-    def model_validate(cls, obj, **kwargs):
-        """Override to ensure no null values."""
+    def _fill_defaults(cls, obj):
+        """Ensure no null values and derive progress_percentage (also runs under TypeAdapter list validation)."""
         def _parse_dt(value):
             if value is None:
                 return None
@@ -577,12 +579,7 @@ class StudyPlanResponse(BaseModel):
         if isinstance(obj, dict):
             obj["progress_percentage"] = progress_percentage
 
-        validated_obj = super().model_validate(obj, **kwargs)
-
-        # Ensure progress_percentage is set even if it gets overridden
-        validated_obj.progress_percentage = progress_percentage
-
-        return validated_obj
+        return obj
 
     model_config = {"from_attributes": True, "populate_by_name": True}
 
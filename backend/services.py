@@ -2,6 +2,9 @@
 Core business logic services for SmartPath.
 Handles grade analysis, career matching, study planning, and more.
 """
+import asyncio
+import hashlib
+import threading
 from datetime import datetime, timedelta
 import typing
 from typing import Dict, List, Optional, Tuple
@@ -9,11 +12,12 @@ from typing import Dict, List, Optional, Tuple
 # Import Supabase database functions instead of SQLAlchemy
 from supabase_db import (
     create_academic_report, get_user_reports, update_subject_performance, get_subject_performance,
+    REPORT_RESPONSE_COLUMNS,
     create_flashcard, get_user_flashcards, update_flashcard, create_flashcard_review,
     create_career_recommendation, get_user_career_recommendations,
     create_study_plan, get_user_study_plans, update_study_plan,
     create_study_session, get_user_study_sessions,
-    create_learning_insight, get_user_insights, mark_insight_read,
+    create_learning_insight, create_learning_insights, get_user_insights, mark_insight_read,
     get_user_by_id, get_user_by_email, create_user, update_user, get_users_by_type
 )
 from models import (
@@ -33,11 +37,19 @@ from utils import (
     adjust_difficulty, extract_grades_from_text, normalize_subject_name,
     numeric_to_grade
 )
-from llm_service import llm_service
-from config import supabase
+from llm_service import get_llm_service
+from config import supabase, get_async_supabase
+from fastapi.concurrency import run_in_threadpool
+from cachetools import TTLCache
+from pydantic import TypeAdapter
+import orjson
 import logging
 logger = logging.getLogger(__name__)
 
+_SUBJECT_PERFORMANCE_LIST = TypeAdapter(List[SubjectPerformanceResponse])
+_STUDY_SESSION_LIST = TypeAdapter(List[StudySessionResponse])
+_REPORT_LIST = TypeAdapter(List[ReportResponse])
+
 
 # ==================== REPORT SERVICES ====================
 
@@ -66,19 +78,20 @@ class ReportService:
         }
 
         report = create_academic_report(report_data)
+        PerformanceService.invalidate_cache(user_id)
         return report
     
     @staticmethod
     def _update_subject_performance(user_id: int, grades: Dict[str, str]):
         """Update subject performance records."""
         # Get historical grades for trend analysis
-        reports = get_user_reports(user_id)
+        reports = get_user_reports(user_id, columns='grades_json')
 
         for subject, grade in grades.items():
             subject_normalized = normalize_subject_name(subject)
 
             # Get existing performance record
-            existing_perf = supabase.table('subject_performance').select('*').eq('user_id', user_id).eq('subject', subject_normalized).execute()
+            existing_perf = supabase.table('subject_performance').select('*').eq('user_id', user_id).eq('subject', subject_normalized).limit(1).execute()
             perf_record = existing_perf.data[0] if existing_perf.data else None
 
             # Get grade history for trend
@@ -119,12 +132,10 @@ class ReportService:
     @staticmethod
     async def analyze_report(report_id: int) -> ReportAnalysis:
         """Analyze a report and generate insights."""
-        # Get all reports for the user to find this specific report
-        # This is a simplified approach - in production, you'd want to optimize this
-        from supabase_db import supabase
-
-        # Get the specific report
-        response = supabase.table('academic_reports').select('*').eq('report_id', report_id).execute()
+        # Supabase calls are blocking, so run them off the event loop
+        response = await run_in_threadpool(
+            supabase.table('academic_reports').select('*').eq('report_id', report_id).limit(1).execute
+        )
         if not response.data:
             raise ValueError("Report not found")
 
@@ -134,9 +145,12 @@ class ReportService:
         weak_subjects = identify_weak_subjects(grades, "B")  # Changed from "C" to "B" to catch more subjects
 
         # Get previous reports for trend analysis
-        prev_reports = supabase.table('academic_reports').select('*').eq('user_id', report['user_id']).neq('report_id', report_id).lt('report_date', report['report_date']).order('report_date', desc=True).limit(1).execute()
+        prev_reports = await run_in_threadpool(
+            supabase.table('academic_reports').select('grades_json').eq('user_id', report['user_id']).neq('report_id', report_id).lt('report_date', report['report_date']).order('report_date', desc=True).limit(1).execute
+        )
 
         trend_analysis = {}
+        prev_report = None
         if prev_reports.data:
             prev_report = prev_reports.data[0]
             for subject in grades.keys():
@@ -155,7 +169,7 @@ class ReportService:
         
         # Generate AI-powered recommendations using Gemini
         try:
-                recommendations = await llm_service.generate_study_recommendations(
+                recommendations = await get_llm_service().generate_study_recommendations(
                     grades=grades,
                     strong_subjects=strong_subjects,
                     weak_subjects=weak_subjects,
@@ -188,19 +202,49 @@ class ReportService:
     @staticmethod
     def get_report_history(user_id: int, limit: int = 10) -> List[Dict[str, any]]:
         """Get user's report history."""
-        return get_user_reports(user_id)[:limit]
+        return get_user_reports(user_id, limit, columns=REPORT_RESPONSE_COLUMNS)
 
 
 # ==================== PERFORMANCE SERVICES ====================
 
+# Per-user dashboard/trend results: {user_id: {view_key: result}}, dropped when the user's reports change.
+# The cache is per process: invalidation only clears the worker that handled the change, so other
+# workers can serve the previous results until the 60s TTL expires.
+_performance_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+_performance_cache_lock = threading.Lock()
+
+
 class PerformanceService:
     """Service for performance analytics."""
+
+    @staticmethod
+    def _cached(user_id: int, view_key: typing.Hashable, build: typing.Callable[[], typing.Any]) -> typing.Any:
+        """Return a cached view for the user, building and storing it on a miss."""
+        with _performance_cache_lock:
+            views = _performance_cache.get(user_id)
+            if views is not None and view_key in views:
+                return views[view_key]
+        result = build()
+        with _performance_cache_lock:
+            _performance_cache.setdefault(user_id, {})[view_key] = result
+        return result
+
+    @staticmethod
+    def invalidate_cache(user_id: int) -> None:
+        """Drop cached dashboard/trend views after the user's reports change."""
+        with _performance_cache_lock:
+            _performance_cache.pop(user_id, None)
     
     @staticmethod
     def get_dashboard(user_id: int) -> PerformanceDashboard:
-        """Get performance dashboard data."""
-        # Get reports for the user
-        reports = get_user_reports(user_id)
+        """Get performance dashboard data (cached briefly per user)."""
+        return PerformanceService._cached(user_id, "dashboard", lambda: PerformanceService._build_dashboard(user_id))
+
+    @staticmethod
+    def _build_dashboard(user_id: int) -> PerformanceDashboard:
+        """Compute performance dashboard data."""
+        # Only the latest report and the recent list are shown, so fetch just those
+        reports = get_user_reports(user_id, limit=5, columns=REPORT_RESPONSE_COLUMNS)
 
         if not reports:
             return PerformanceDashboard(
@@ -224,51 +268,37 @@ class PerformanceService:
         for sp in subject_perfs:
             sp['gpa'] = grade_to_gpa(sp.get('current_grade', 'E'))
 
-        strong_subjects = [sp for sp in subject_perfs if sp['strength_score'] >= 70]
-        weak_subjects = [sp for sp in subject_perfs if sp['strength_score'] < 60]
+        # Validate every subject once; the strong/weak lists reuse the validated models
+        subject_performance = _SUBJECT_PERFORMANCE_LIST.validate_python(subject_perfs)
+        strong_subjects = [sp for sp in subject_performance if sp.strength_score >= 70]
+        weak_subjects = [sp for sp in subject_performance if sp.strength_score < 60]
         improving = [sp['subject'] for sp in subject_perfs if sp['trend'] == "improving"]
         declining = [sp['subject'] for sp in subject_perfs if sp['trend'] == "declining"]
 
-        # Get recent reports (up to 5)
-        recent_reports = reports[:5]
-
-        # Convert to response format
-        from models import ReportResponse, SubjectPerformanceResponse
-        recent_reports_response = []
-        def _parse_dt(value: typing.Any) -> datetime:
-            if isinstance(value, datetime):
-                return value
-            if isinstance(value, str):
-                v = value.strip()
-                if v.endswith("Z"):
-                    v = v[:-1] + "+00:00"
-                try:
-                    return datetime.fromisoformat(v)
-                except Exception:
-                    return datetime.utcnow()
-            return datetime.utcnow()
-
-        for report in recent_reports:
-            # Convert datetime string back to datetime for validation
-            report_copy = report.copy()
-            report_copy['report_date'] = _parse_dt(report_copy.get('report_date'))
-            recent_reports_response.append(ReportResponse.model_validate(report_copy))
-
         return PerformanceDashboard(
             overall_gpa=latest_report.get('overall_gpa', 0.0) or 0.0,
             total_subjects=len(latest_report.get('grades_json', {})),
-            subject_performance=[SubjectPerformanceResponse.model_validate(sp) for sp in subject_perfs],
-            strong_subjects=[SubjectPerformanceResponse.model_validate(sp) for sp in strong_subjects],
-            weak_subjects=[SubjectPerformanceResponse.model_validate(sp) for sp in weak_subjects],
+            subject_performance=subject_performance,
+            strong_subjects=strong_subjects,
+            weak_subjects=weak_subjects,
             improving_subjects=improving,
             declining_subjects=declining,
-            recent_reports=recent_reports_response
+            # Up to 5 recent reports; ISO timestamps from PostgREST parse directly
+            recent_reports=_REPORT_LIST.validate_python(reports)
         )
     
     @staticmethod
     def get_grade_trends(user_id: int, subject: Optional[str] = None) -> List[GradeTrend]:
-        """Get grade trends for subjects."""
-        reports = get_user_reports(user_id)
+        """Get grade trends for subjects (cached briefly per user and subject)."""
+        trends = PerformanceService._cached(
+            user_id, ("trends", subject), lambda: PerformanceService._build_grade_trends(user_id, subject)
+        )
+        return list(trends)
+
+    @staticmethod
+    def _build_grade_trends(user_id: int, subject: Optional[str] = None) -> List[GradeTrend]:
+        """Compute grade trends for subjects."""
+        reports = get_user_reports(user_id, columns='report_date, grades_json')
         
         if not reports:
             return []
@@ -321,7 +351,7 @@ class PerformanceService:
     async def get_predictions(user_id: int) -> List[PerformancePrediction]:
         """Get performance predictions using LLM."""
         # Get grade history
-        reports = get_user_reports(user_id)
+        reports = await run_in_threadpool(get_user_reports, user_id, columns='grades_json')
         
         if not reports:
             return []
@@ -335,7 +365,7 @@ class PerformanceService:
                 grade_history[subject].append(grade_to_numeric(grade))
         
         # Get LLM analysis
-        analysis = await llm_service.analyze_performance_trends(grade_history, list(grade_history.keys()))
+        analysis = await get_llm_service().analyze_performance_trends(grade_history, list(grade_history.keys()))
         
         predictions = []
         for subject, history in grade_history.items():
@@ -371,7 +401,7 @@ class FlashcardService:
         curriculum: str
     ) -> List[Dict[str, typing.Any]]:
         """Generate flashcards using LLM."""
-        flashcards_data = await llm_service.generate_flashcards(
+        flashcards_data = await get_llm_service().generate_flashcards(
             subject=subject,
             topic=topic,
             grade_level=grade_level,
@@ -382,7 +412,7 @@ class FlashcardService:
         flashcards = []
         for card_data in flashcards_data:
             difficulty = card_data.get("difficulty", "medium")
-            flashcard = create_flashcard({
+            flashcard = await run_in_threadpool(create_flashcard, {
                 "user_id": user_id,
                 "subject": subject,
                 "topic": topic,
@@ -404,11 +434,13 @@ class FlashcardService:
         card_id: int,
         user_id: int,
         correct: bool,
-        user_answer: Optional[str] = None
+        user_answer: Optional[str] = None,
+        flashcard: Optional[Dict[str, typing.Any]] = None
     ) -> Dict[str, typing.Any]:
-        """Record a flashcard review."""
-        existing_flashcard = supabase.table('flashcards').select('*').eq('card_id', card_id).eq('user_id', user_id).execute()
-        flashcard = existing_flashcard.data[0] if existing_flashcard.data else None
+        """Record a flashcard review (pass the already-loaded flashcard to skip re-fetching it)."""
+        if flashcard is None:
+            existing_flashcard = supabase.table('flashcards').select('*').eq('card_id', card_id).eq('user_id', user_id).limit(1).execute()
+            flashcard = existing_flashcard.data[0] if existing_flashcard.data else None
         
         if not flashcard:
             raise ValueError("Flashcard not found")
@@ -471,22 +503,25 @@ class FlashcardService:
         user_answer: str
     ) -> Dict[str, typing.Any]:
         """Evaluate student's answer using LLM."""
-        flashcard_response = supabase.table('flashcards').select('*').eq('card_id', card_id).eq('user_id', user_id).execute()
+        flashcard_response = await run_in_threadpool(
+            supabase.table('flashcards').select('*').eq('card_id', card_id).eq('user_id', user_id).limit(1).execute
+        )
         flashcard = flashcard_response.data[0] if flashcard_response.data else None
         
         if not flashcard:
             raise ValueError("Flashcard not found")
         
-        evaluation = await llm_service.evaluate_answer(
+        evaluation = await get_llm_service().evaluate_answer(
             question=flashcard['question'],
             correct_answer=flashcard['answer'],
             student_answer=user_answer,
             subject=flashcard['subject']
         )
         
-        # Record review
-        FlashcardService.review_flashcard(
-            card_id, user_id, evaluation.get("correct", False), user_answer
+        # Record review, reusing the flashcard loaded above
+        await run_in_threadpool(
+            FlashcardService.review_flashcard,
+            card_id, user_id, evaluation.get("correct", False), user_answer, flashcard=flashcard
         )
         
         return evaluation
@@ -503,20 +538,24 @@ class CareerService:
         interests: Optional[List[str]] = None
     ) -> List[Dict[str, typing.Any]]:
         """Generate career recommendations using LLM."""
-        # Get user's latest grades
-        latest_report_response = supabase.table('academic_reports').select('*').eq('user_id', user_id).order('report_date', desc=True).limit(1).execute()
+        # Get user's latest grades and grade level concurrently
+        latest_report_response, user_response = await asyncio.gather(
+            run_in_threadpool(
+                supabase.table('academic_reports').select('grades_json').eq('user_id', user_id).order('report_date', desc=True).limit(1).execute
+            ),
+            run_in_threadpool(supabase.table('users').select('grade_level').eq('user_id', user_id).limit(1).execute),
+        )
         latest_report = latest_report_response.data[0] if latest_report_response.data else None
         
         if not latest_report:
             raise ValueError("No academic reports found. Please upload a report first.")
         
-        user_response = supabase.table('users').select('*').eq('user_id', user_id).limit(1).execute()
         user = user_response.data[0] if user_response.data else None
         grades = latest_report['grades_json']
         subjects = list(grades.keys())
         
         # Get LLM recommendations
-        recommendations_data = await llm_service.generate_career_recommendations(
+        recommendations_data = await get_llm_service().generate_career_recommendations(
             subjects=subjects,
             grades=grades,
             interests=interests,
@@ -524,12 +563,12 @@ class CareerService:
         )
         
         # Delete old recommendations
-        supabase.table('career_recommendations').delete().eq('user_id', user_id).execute()
+        await run_in_threadpool(supabase.table('career_recommendations').delete().eq('user_id', user_id).execute)
         
         # Create new recommendations
         recommendations = []
         for rec_data in recommendations_data:
-            rec = create_career_recommendation({
+            rec = await run_in_threadpool(create_career_recommendation, {
                 "user_id": user_id,
                 "career_path": rec_data.get("career_path", ""),
                 "career_description": rec_data.get("career_description"),
@@ -561,12 +600,15 @@ class StudyPlanService:
         active_days: Optional[List[str]] = None # Added active_days parameter
     ) -> List[Dict[str, typing.Any]]:
         """Generate study plans using LLM."""
-        # Get weak subjects
-        weak_subjects_response = supabase.table('subject_performance').select('subject').eq('user_id', user_id).in_('subject', subjects).lt('strength_score', 60).execute()
+        # Get weak subjects and the user's grade level (for better LLM context) concurrently
+        weak_subjects_response, user_response = await asyncio.gather(
+            run_in_threadpool(
+                supabase.table('subject_performance').select('subject').eq('user_id', user_id).in_('subject', subjects).lt('strength_score', 60).execute
+            ),
+            run_in_threadpool(supabase.table('users').select('grade_level').eq('user_id', user_id).limit(1).execute),
+        )
         weak_subject_names = [sp['subject'] for sp in weak_subjects_response.data] if weak_subjects_response.data else subjects
         
-        # Get user's grade level for better LLM context
-        user_response = supabase.table('users').select('grade_level').eq('user_id', user_id).limit(1).execute()
         user = user_response.data[0] if user_response.data else None
         grade_level = user['grade_level'] if user and 'grade_level' in user else 10
         
@@ -579,7 +621,7 @@ class StudyPlanService:
         for attempt in range(max_retries):
             try:
                 logger.info(f"Attempting to generate study plan (attempt {attempt + 1}/{max_retries})")
-                plan_data = await llm_service.generate_study_plan(
+                plan_data = await get_llm_service().generate_study_plan(
                     weak_subjects=weak_subject_names,
                     available_hours=available_hours,
                     exam_date=exam_date,
@@ -601,7 +643,6 @@ class StudyPlanService:
                     }
                 else:
                     # Wait a bit before retry
-                    import asyncio
                     await asyncio.sleep(1)
         
         # Create study plans
@@ -727,7 +768,7 @@ class StudyPlanService:
                                 else:
                                     subj_entry["focus"] = topics
 
-            plan = create_study_plan({
+            plan = await run_in_threadpool(create_study_plan, {
                 "user_id": user_id,
                 "subject": subject,
                 "focus_area": focus_area,
@@ -747,7 +788,7 @@ class StudyPlanService:
     @staticmethod
     def get_plan_by_id(plan_id: int) -> Dict[str, typing.Any]:
         """Get study plan by ID with sessions and weekly schedule."""
-        plan_response = supabase.table('study_plans').select('*').eq('plan_id', plan_id).execute()
+        plan_response = supabase.table('study_plans').select('*').eq('plan_id', plan_id).limit(1).execute()
         plan = plan_response.data[0] if plan_response.data else None
         if not plan:
             raise ValueError("Study plan not found")
@@ -758,7 +799,7 @@ class StudyPlanService:
         
         # Convert to response models
         weekly_schedule = plan.get('weekly_schedule_json', []) or []
-        session_responses = [StudySessionResponse.model_validate(s) for s in sessions]
+        session_responses = _STUDY_SESSION_LIST.validate_python(sessions)
         
         # Create response with additional fields
         response_data = {
@@ -775,16 +816,35 @@ class StudyPlanService:
 
 # ==================== INSIGHT SERVICES ====================
 
+# Generated feedback keyed by a digest of its inputs, so a new report or profile change misses naturally
+_feedback_cache: TTLCache = TTLCache(maxsize=10_000, ttl=15 * 60)
+
+
 class InsightService:
     """Service for learning insights."""
     
     @staticmethod
     async def generate_feedback(
-        user_id: int
+        user_id: int,
+        fresh: bool = False
     ) -> AcademicFeedback:
-        """Generate academic feedback using LLM."""
-        # Get latest reports
-        reports_response = supabase.table('academic_reports').select('*').eq('user_id', user_id).order('report_date', desc=True).limit(2).execute()
+        """Generate academic feedback using LLM (reused while the inputs are unchanged unless fresh)."""
+        feedback, _ = await InsightService.generate_feedback_with_insights(user_id, fresh)
+        return feedback
+
+    @staticmethod
+    async def generate_feedback_with_insights(
+        user_id: int,
+        fresh: bool = False
+    ) -> Tuple[AcademicFeedback, List[Dict[str, typing.Any]]]:
+        """Generate academic feedback and return it with the insight rows saved from it (none on a cache hit)."""
+        # Get latest reports and the user's grade level/curriculum concurrently
+        reports_response, user_response = await asyncio.gather(
+            run_in_threadpool(
+                supabase.table('academic_reports').select('grades_json').eq('user_id', user_id).order('report_date', desc=True).limit(2).execute
+            ),
+            run_in_threadpool(supabase.table('users').select('grade_level, curriculum_type').eq('user_id', user_id).limit(1).execute),
+        )
         reports = reports_response.data
         
         if not reports:
@@ -794,12 +854,11 @@ class InsightService:
                 recommendations=["Upload your first report to get personalized feedback."],
                 motivational_message="Start your learning journey today!",
                 next_steps=["Upload academic report"]
-            )
+            ), []
         
         current = reports[0]['grades_json']
         previous = reports[1]['grades_json'] if len(reports) > 1 else None
         
-        user_response = supabase.table('users').select('*').eq('user_id', user_id).limit(1).execute()
         user = user_response.data[0] if user_response.data else None
         if not user:
             return AcademicFeedback(
@@ -808,21 +867,38 @@ class InsightService:
                 recommendations=["User not found."],
                 motivational_message="Please contact support.",
                 next_steps=[]
-            )
-        
-        feedback = await llm_service.generate_academic_feedback(
+            ), []
+        
+        grade_level = user.get('grade_level', 10)
+        curriculum = user.get('curriculum_type', 'CBE')
+        cache_key = hashlib.sha256(
+            orjson.dumps([user_id, current, previous, grade_level, curriculum], option=orjson.OPT_SORT_KEYS)
+        ).digest()
+        if not fresh:
+            cached = _feedback_cache.get(cache_key)
+            if cached is not None:
+                # Already saved as insights when it was generated
+                return AcademicFeedback(**cached), []
+        
+        feedback = await get_llm_service().generate_academic_feedback(
             current_grades=current,
             previous_grades=previous,
-            grade_level=user.get('grade_level', 10),
-            curriculum=user.get('curriculum_type', 'CBE')
+            grade_level=grade_level,
+            curriculum=curriculum
         )
         
-        # Save as insight
-        import logging
-        logger = logging.getLogger(__name__)
+        insights = await run_in_threadpool(InsightService._save_feedback_insights, user_id, feedback)
+        if feedback.get("strengths") or feedback.get("weaknesses"):
+            # The generic fallback returned when Gemini fails has neither, so it is not kept
+            _feedback_cache[cache_key] = feedback
         
+        return AcademicFeedback(**feedback), insights
+
+    @staticmethod
+    def _save_feedback_insights(user_id: int, feedback: Dict[str, typing.Any]) -> List[Dict[str, typing.Any]]:
+        """Persist generated feedback as learning insights and return the created rows (blocking; run in a worker thread)."""
         try:
-            # Create feedback insight
+            # Create feedback insight first; the recommendation rows reference its id
             feedback_insight_data = {
                 "user_id": user_id,
                 "insight_type": "feedback", # Use string literal
@@ -831,65 +907,69 @@ class InsightService:
                 "metadata_json": feedback
             }
             feedback_insight = create_learning_insight(feedback_insight_data)
+            rows = []
             
             # Create additional insights from recommendations
             if feedback.get("recommendations") and feedback_insight:
                 for i, rec in enumerate(feedback.get("recommendations", [])[:5]):  # Limit to 5
-                    rec_insight_data = {
+                    rows.append({
                         "user_id": user_id,
                         "insight_type": "recommendation", # Use string literal
                         "title": f"Study Recommendation {i+1}",
                         "content": rec,
                         "metadata_json": {"source": "academic_feedback", "related_feedback": feedback_insight['insight_id']}
-                    }
-                    create_learning_insight(rec_insight_data)
+                    })
             
             # Create insights from strengths
             if feedback.get("strengths"):
                 strengths_text = "Your academic strengths:\n" + "\n".join(f"• {s}" for s in feedback.get("strengths", []))
-                strength_insight_data = {
+                rows.append({
                     "user_id": user_id,
                     "insight_type": "analysis", # Use string literal
                     "title": "Academic Strengths",
                     "content": strengths_text,
                     "metadata_json": {"source": "academic_feedback", "type": "strengths"}
-                }
-                create_learning_insight(strength_insight_data)
+                })
             
             # Create insights from weaknesses
             if feedback.get("weaknesses"):
                 weaknesses_text = "Areas for improvement:\n" + "\n".join(f"• {w}" for w in feedback.get("weaknesses", []))
-                weakness_insight_data = {
+                rows.append({
                     "user_id": user_id,
                     "insight_type": "analysis", # Use string literal
                     "title": "Areas for Improvement",
                     "content": weaknesses_text,
                     "metadata_json": {"source": "academic_feedback", "type": "weaknesses"}
-                }
-                create_learning_insight(weakness_insight_data)
+                })
             
             # Create tips insight from next steps
             if feedback.get("next_steps"):
                 tips_text = "Recommended next steps:\n" + "\n".join(f"• {step}" for step in feedback.get("next_steps", []))
-                tips_insight_data = {
+                rows.append({
                     "user_id": user_id,
                     "insight_type": "tip", # Use string literal
                     "title": "Learning Tips",
                     "content": tips_text,
                     "metadata_json": {"source": "academic_feedback", "type": "next_steps"}
-                }
-                create_learning_insight(tips_insight_data)
+                })
+            
+            # The rest go in one multi-row insert
+            created = create_learning_insights(rows) if rows else []
             
             logger.info(f"Successfully created insights for user {user_id}")
+            return ([feedback_insight] if feedback_insight else []) + created
         except Exception as e:
             # Log error but don't fail the request
             logger.warning(f"Could not save insights: {e}", exc_info=True)
-        
-        return AcademicFeedback(**feedback)
+            return []
 
 
 # ==================== INVITE SERVICES ====================
 
+# Fresh codes to try when an insert collides with an existing one
+_INVITE_CODE_ATTEMPTS = 5
+
+
 class InviteService:
     """Service for invite code management."""
     
@@ -906,22 +986,23 @@ class InviteService:
         if creator_type not in [UserType.TEACHER, UserType.PARENT]:
             raise ValueError("Only teachers and parents can create invite codes")
         
-        # Generate unique code
-        code = InviteService.generate_code()
-        while supabase.table('invite_codes').select('*').eq('code', code).execute().data:
-            code = InviteService.generate_code()
-        
-        # Create invite code (expires in 7 days)
+        # Create invite code (expires in 7 days). The unique constraint on code rejects the rare
+        # collision, so insert directly and only draw a new code when that happens
         invite_data = {
-            "code": code,
             "creator_id": creator_id,
             "creator_type": creator_type.value, # Use string value
             "expires_at": (datetime.utcnow() + timedelta(days=7)).isoformat(),
             "used": False
         }
-        response = supabase.table('invite_codes').insert(invite_data).execute()
-        
-        return response.data[0]
+        for attempt in range(_INVITE_CODE_ATTEMPTS):
+            invite_data["code"] = InviteService.generate_code()
+            try:
+                response = supabase.table('invite_codes').insert(invite_data).execute()
+            except Exception as e:
+                if getattr(e, 'code', None) == '23505' and attempt + 1 < _INVITE_CODE_ATTEMPTS:
+                    continue
+                raise
+            return response.data[0]
     
     @staticmethod
     def get_my_codes(user_id: int) -> List[Dict[str, typing.Any]]:
@@ -932,46 +1013,58 @@ class InviteService:
     @staticmethod
     def redeem_code(code: str, student_id: int) -> Dict[str, typing.Any]:
         """Redeem an invite code and create a relationship."""
-        # Find the invite code
-        invite_response = supabase.table('invite_codes').select('*').eq('code', code.upper()).execute()
-        invite = invite_response.data[0] if invite_response.data else None
-        
-        if not invite:
-            raise ValueError("Invalid invite code")
-        
-        if invite['used']:
-            raise ValueError("This invite code has already been used")
-        
-        if datetime.fromisoformat(invite['expires_at']) < datetime.utcnow():
-            raise ValueError("This invite code has expired")
+        code = code.upper()
         
         # Verify the redeemer is a student
-        student_response = supabase.table('users').select('*').eq('user_id', student_id).limit(1).execute()
+        student_response = supabase.table('users').select('user_type').eq('user_id', student_id).limit(1).execute()
         student = student_response.data[0] if student_response.data else None
         if not student or student.get('user_type') != 'STUDENT':
             raise ValueError("Only students can redeem invite codes")
         
-        # Check if relationship already exists
-        existing_rel_response = supabase.table('user_relationships').select('*').eq('guardian_id', invite['creator_id']).eq('student_id', student_id).execute()
-        if existing_rel_response.data:
-            raise ValueError("You are already linked to this teacher/parent")
-        
-        # Determine relationship type
-        relationship_type = "teacher-student" if invite.get('creator_type') == 'TEACHER' else "parent-child"
-        
-        # Create relationship
-        relationship_data = {
-            "guardian_id": invite['creator_id'],
-            "student_id": student_id,
-            "relationship_type": relationship_type
-        }
-        relationship_response = supabase.table('user_relationships').insert(relationship_data).execute()
-        relationship = relationship_response.data[0] if relationship_response.data else None
+        # Claim the code in one conditional update, so two students cannot both redeem it
+        claim_response = (
+            supabase.table('invite_codes').update({'used': True, 'used_by': student_id})
+            .eq('code', code).eq('used', False).gt('expires_at', datetime.utcnow().isoformat())
+            .execute()
+        )
+        invite = claim_response.data[0] if claim_response.data else None
+        if not invite:
+            InviteService._raise_unredeemable(code)
         
-        # Mark invite as used
-        supabase.table('invite_codes').update({'used': True, 'used_by': student_id}).eq('code', code.upper()).execute()
+        try:
+            # Check if relationship already exists
+            existing_rel_response = supabase.table('user_relationships').select('guardian_id').eq('guardian_id', invite['creator_id']).eq('student_id', student_id).limit(1).execute()
+            if existing_rel_response.data:
+                raise ValueError("You are already linked to this teacher/parent")
+            
+            # Determine relationship type
+            relationship_type = "teacher-student" if invite.get('creator_type') == 'TEACHER' else "parent-child"
+            
+            # Create relationship
+            relationship_data = {
+                "guardian_id": invite['creator_id'],
+                "student_id": student_id,
+                "relationship_type": relationship_type
+            }
+            relationship_response = supabase.table('user_relationships').insert(relationship_data).execute()
+            relationship = relationship_response.data[0] if relationship_response.data else None
+        except Exception:
+            # Release the claim so the code can still be used
+            supabase.table('invite_codes').update({'used': False, 'used_by': None}).eq('code', code).eq('used_by', student_id).execute()
+            raise
         
         return relationship
+    
+    @staticmethod
+    def _raise_unredeemable(code: str) -> typing.NoReturn:
+        """Explain why a code could not be claimed (only reached on the failure path)."""
+        invite_response = supabase.table('invite_codes').select('used, expires_at').eq('code', code).limit(1).execute()
+        invite = invite_response.data[0] if invite_response.data else None
+        if not invite:
+            raise ValueError("Invalid invite code")
+        if invite['used']:
+            raise ValueError("This invite code has already been used")
+        raise ValueError("This invite code has expired")
 
 
 # ==================== RELATIONSHIP SERVICES ====================
@@ -1029,27 +1122,37 @@ class RelationshipService:
     @staticmethod
     def verify_relationship(guardian_id: int, student_id: int) -> bool:
         """Verify that a relationship exists between guardian and student."""
-        relationship_response = supabase.table('user_relationships').select('*').eq('guardian_id', guardian_id).eq('student_id', student_id).execute()
+        relationship_response = supabase.table('user_relationships').select('*').eq('guardian_id', guardian_id).eq('student_id', student_id).limit(1).execute()
+        return len(relationship_response.data) > 0
+
+    @staticmethod
+    async def verify_relationship_async(guardian_id: int, student_id: int) -> bool:
+        """Async version of verify_relationship."""
+        db = await get_async_supabase()
+        relationship_response = await db.table('user_relationships').select('guardian_id').eq('guardian_id', guardian_id).eq('student_id', student_id).limit(1).execute()
         return len(relationship_response.data) > 0
     
     @staticmethod
-    def get_student_dashboard(guardian_id: int, student_id: int) -> StudentDashboardResponse:
+    async def get_student_dashboard(guardian_id: int, student_id: int) -> StudentDashboardResponse:
         """Get dashboard data for a student (for teacher/parent view)."""
-        # Verify relationship exists
-        if not RelationshipService.verify_relationship(guardian_id, student_id):
+        db = await get_async_supabase()
+        # The link check and the three reads are independent, so issue them together
+        linked, student_response, reports_response, subject_perfs_response = await asyncio.gather(
+            RelationshipService.verify_relationship_async(guardian_id, student_id),
+            db.table('users').select('full_name').eq('user_id', student_id).limit(1).execute(),
+            # The latest report is the first of the recent ones
+            db.table('academic_reports').select(REPORT_RESPONSE_COLUMNS).eq('user_id', student_id).order('report_date', desc=True).limit(5).execute(),
+            db.table('subject_performance').select('subject, strength_score, trend').eq('user_id', student_id).execute(),
+        )
+        if not linked:
             raise ValueError("You do not have permission to view this student's data")
         
-        # Get student info
-        student_response = supabase.table('users').select('*').eq('user_id', student_id).limit(1).execute()
         student = student_response.data[0] if student_response.data else None
         if not student:
             raise ValueError("Student not found")
         
-        # Get latest report
-        latest_report_response = supabase.table('academic_reports').select('*').eq('user_id', student_id).order('report_date', desc=True).limit(1).execute()
-        latest_report = latest_report_response.data[0] if latest_report_response.data else None
-        
-        if not latest_report:
+        recent_reports = reports_response.data
+        if not recent_reports:
             return StudentDashboardResponse(
                 student_id=student_id,
                 student_name=student['full_name'],
@@ -1061,27 +1164,14 @@ class RelationshipService:
                 improving_subjects=[],
                 declining_subjects=[]
             )
+        latest_report = recent_reports[0]
         
-        # Get subject performances
-        subject_perfs_response = supabase.table('subject_performance').select('*').eq('user_id', student_id).execute()
         subject_perfs = subject_perfs_response.data
-        
         strong_subjects = [sp['subject'] for sp in subject_perfs if sp['strength_score'] >= 70]
         weak_subjects = [sp['subject'] for sp in subject_perfs if sp['strength_score'] < 60]
         improving = [sp['subject'] for sp in subject_perfs if sp['trend'] == "improving"]
         declining = [sp['subject'] for sp in subject_perfs if sp['trend'] == "declining"]
         
-        # Get recent reports
-        recent_reports_response = supabase.table('academic_reports').select('*').eq('user_id', student_id).order('report_date', desc=True).limit(5).execute()
-        recent_reports = recent_reports_response.data
-        
-        # Convert datetime strings back to datetime objects for validation
-        formatted_recent_reports = []
-        for report in recent_reports:
-            report_copy = report.copy()
-            report_copy['report_date'] = datetime.fromisoformat(report['report_date'])
-            formatted_recent_reports.append(ReportResponse.model_validate(report_copy))
-
         return StudentDashboardResponse(
             student_id=student_id,
             student_name=student['full_name'],
@@ -1089,7 +1179,8 @@ class RelationshipService:
             total_subjects=len(latest_report.get('grades_json', {})),
             strong_subjects=strong_subjects,
             weak_subjects=weak_subjects,
-            recent_reports=formatted_recent_reports,
+            # Pydantic parses the ISO report_date strings itself
+            recent_reports=_REPORT_LIST.validate_python(recent_reports),
             improving_subjects=improving,
             declining_subjects=declining
         )
@@ -1,14 +1,30 @@
 import os
-import shutil
+import re
 import uuid
 from abc import ABC, abstractmethod
 from typing import Optional
 from fastapi import UploadFile
 from config import settings
+from utils import save_upload_file
 import logging
 
 logger = logging.getLogger(__name__)
 
+MAX_RESOURCE_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def _unique_filename(path: Optional[str]) -> str:
+    """Build a storage name from a client-supplied filename: last path component only, safe characters, random suffix."""
+    # Split on both separator styles so a Windows-style "..\\x" name is reduced to "x"
+    filename = (path or "").replace("\\", "/").rsplit("/", 1)[-1]
+    name, ext = os.path.splitext(filename)
+    name = _UNSAFE_FILENAME_CHARS.sub("_", name).strip("._") or "file"
+    ext = _UNSAFE_FILENAME_CHARS.sub("", ext)
+    return f"{name[:100]}_{uuid.uuid4().hex[:8]}{ext[:10]}"
+
+
 class StorageProvider(ABC):
     @abstractmethod
     async def upload_file(self, file: UploadFile, path: str) -> str:
@@ -26,17 +42,12 @@ class LocalStorageProvider(StorageProvider):
         os.makedirs(self.upload_dir, exist_ok=True)
 
     async def upload_file(self, file: UploadFile, path: str) -> str:
-        # Sanitize path to prevent directory traversal
-        filename = os.path.basename(path)
-        # Ensure unique filename
-        name, ext = os.path.splitext(filename)
-        unique_filename = f"{name}_{uuid.uuid4().hex[:8]}{ext}"
-        
-        file_path = os.path.join(self.upload_dir, unique_filename)
+        # Sanitized, unique name; the client path never reaches the filesystem
+        unique_filename = _unique_filename(path)
+        file_path = f"{self.upload_dir}/{unique_filename}"
         
         try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            await save_upload_file(file, file_path, max_size=MAX_RESOURCE_FILE_SIZE)
             
             # Return relative URL for static mounting
             # Assuming app mounts /uploads -> upload_dir
@@ -71,10 +82,8 @@ class SupabaseStorageProvider(StorageProvider):
         # Read file content
         content = await file.read()
         
-        # Ensure unique path
-        filename = os.path.basename(path)
-        name, ext = os.path.splitext(filename)
-        unique_path = f"{name}_{uuid.uuid4().hex[:8]}{ext}"
+        # Ensure unique, sanitized path
+        unique_path = _unique_filename(path)
         
         try:
             # Upload to bucket
@@ -1,6 +1,8 @@
+import asyncio
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from config import supabase
+import httpx
+from config import supabase, get_async_supabase
 import logging
 logger = logging.getLogger(__name__)
 
@@ -9,12 +11,57 @@ if supabase is None:
     raise ImportError("Supabase client not available. Install with: pip install supabase")
 
 
+class DuplicateRecordError(Exception):
+    """Raised when an insert violates a unique constraint (Postgres error 23505)."""
+
+
+def _execute_read(query):
+    """Execute a read query, retrying once if a pooled keep-alive connection was dropped."""
+    try:
+        return query.execute()
+    except httpx.TransportError as e:
+        # Reads are idempotent, and the pool hands out a fresh connection on retry
+        logger.warning(f"Retrying read after connection error: {e}")
+        return query.execute()
+
+
+async def _aexecute_read(query):
+    """Async counterpart of _execute_read for queries built on the async client."""
+    try:
+        return await query.execute()
+    except httpx.TransportError as e:
+        logger.warning(f"Retrying read after connection error: {e}")
+        return await query.execute()
+
+
+# Shape of a next_cursor value; the space stands for a "+" that query-string decoding turned into one
+CURSOR_PATTERN = r"^[0-9T:.+\- ]+\|\d+$"
+
+
+def apply_keyset(query, sort_column: str, id_column: str, cursor: Optional[str] = None):
+    """Order newest first (id breaks ties) and start after a "<timestamp>|<id>" cursor from next_cursor."""
+    if cursor:
+        ts, _, row_id = cursor.rpartition('|')
+        # PostgREST timestamps use "T", so a space can only be a "+00:00" offset sent unencoded
+        ts = ts.replace(' ', '+')
+        query = query.or_(f'{sort_column}.lt."{ts}",and({sort_column}.eq."{ts}",{id_column}.lt.{int(row_id)})')
+    return query.order(sort_column, desc=True).order(id_column, desc=True)
+
+
+def next_cursor(rows: List[Dict[str, Any]], sort_column: str, id_column: str, limit: int) -> Optional[str]:
+    """Cursor for the page after rows, or None when rows is the last page."""
+    if len(rows) < limit:
+        return None
+    last = rows[-1]
+    return f"{last[sort_column]}|{last[id_column]}"
+
+
 # ==================== USER OPERATIONS ====================
 
 def get_user_by_id(user_id: int) -> Optional[Dict[str, Any]]:
     """Get user by ID."""
     try:
-        response = supabase.table('users').select('*').eq('user_id', user_id).execute()
+        response = _execute_read(supabase.table('users').select('*').eq('user_id', user_id).limit(1))
         return response.data[0] if response.data else None
     except Exception as e:
         logger.error(f"Error getting user {user_id}: {e}")
@@ -23,7 +70,17 @@ def get_user_by_id(user_id: int) -> Optional[Dict[str, Any]]:
 def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
     """Get user by email."""
     try:
-        response = supabase.table('users').select('*').eq('email', email).execute()
+        response = _execute_read(supabase.table('users').select('*').eq('email', email).limit(1))
+        return response.data[0] if response.data else None
+    except Exception as e:
+        logger.error(f"Error getting user by email {email}: {e}")
+        return None
+
+async def get_user_by_email_async(email: str) -> Optional[Dict[str, Any]]:
+    """Async version of get_user_by_email."""
+    try:
+        db = await get_async_supabase()
+        response = await _aexecute_read(db.table('users').select('*').eq('email', email).limit(1))
         return response.data[0] if response.data else None
     except Exception as e:
         logger.error(f"Error getting user by email {email}: {e}")
@@ -33,7 +90,7 @@ def get_user_by_reset_token(token: str) -> Optional[Dict[str, Any]]:
     """Get user by valid reset token."""
     try:
         now = datetime.utcnow().isoformat()
-        response = supabase.table('users').select('*').eq('reset_token', token).gt('reset_token_expires', now).execute()
+        response = supabase.table('users').select('*').eq('reset_token', token).gt('reset_token_expires', now).limit(1).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         logger.error(f"Error getting user by reset token: {e}")
@@ -45,6 +102,8 @@ def create_user(user_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         response = supabase.table('users').insert(user_data).execute()
         return response.data[0] if response.data else None
     except Exception as e:
+        if getattr(e, 'code', None) == '23505':
+            raise DuplicateRecordError(str(e)) from e
         logger.error(f"Error creating user: {e}")
         return None
 
@@ -90,10 +149,30 @@ def create_academic_report(report_data: Dict[str, Any]) -> Optional[Dict[str, An
         logger.error(f"Error creating academic report: {e}")
         return None
 
-def get_user_reports(user_id: int) -> List[Dict[str, Any]]:
-    """Get academic reports for a user."""
+# Columns needed to build a ReportResponse (skips file_path/file_type)
+REPORT_RESPONSE_COLUMNS = 'report_id, user_id, report_date, term, year, grades_json, overall_gpa, uploaded_at, processed'
+
+
+def get_user_reports(user_id: int, limit: Optional[int] = None, columns: str = '*') -> List[Dict[str, Any]]:
+    """Get academic reports for a user, newest first (optionally only some columns)."""
     try:
-        response = supabase.table('academic_reports').select('*').eq('user_id', user_id).order('report_date', desc=True).execute()
+        query = supabase.table('academic_reports').select(columns).eq('user_id', user_id).order('report_date', desc=True)
+        if limit is not None:
+            query = query.limit(limit)
+        response = _execute_read(query)
+        return response.data
+    except Exception as e:
+        logger.error(f"Error getting reports for user {user_id}: {e}")
+        return []
+
+async def get_user_reports_async(user_id: int, limit: Optional[int] = None, columns: str = '*') -> List[Dict[str, Any]]:
+    """Async version of get_user_reports."""
+    try:
+        db = await get_async_supabase()
+        query = db.table('academic_reports').select(columns).eq('user_id', user_id).order('report_date', desc=True)
+        if limit is not None:
+            query = query.limit(limit)
+        response = await _aexecute_read(query)
         return response.data
     except Exception as e:
         logger.error(f"Error getting reports for user {user_id}: {e}")
@@ -115,9 +194,9 @@ def update_subject_performance(user_id: int, grades: Dict[str, str]):
     """Update subject performance records."""
     try:
         # Get historical grades for trend analysis
-        reports = get_user_reports(user_id)
+        reports = get_user_reports(user_id, limit=5, columns='grades_json')
         grade_history = {}
-        for report in reports[:5]:  # Last 5 reports
+        for report in reports:  # Last 5 reports
             for subject, grade in report.get('grades_json', {}).items():
                 if subject not in grade_history:
                     grade_history[subject] = []
@@ -127,7 +206,7 @@ def update_subject_performance(user_id: int, grades: Dict[str, str]):
             subject_normalized = normalize_subject_name(subject)
 
             # Get existing performance record
-            existing = supabase.table('subject_performance').select('*').eq('user_id', user_id).eq('subject', subject_normalized).execute()
+            existing = supabase.table('subject_performance').select('*').eq('user_id', user_id).eq('subject', subject_normalized).limit(1).execute()
             perf_record = existing.data[0] if existing.data else None
 
             # Calculate trend and other metrics
@@ -157,7 +236,7 @@ def update_subject_performance(user_id: int, grades: Dict[str, str]):
 def get_subject_performance(user_id: int) -> List[Dict[str, Any]]:
     """Get subject performance for a user."""
     try:
-        response = supabase.table('subject_performance').select('*').eq('user_id', user_id).execute()
+        response = _execute_read(supabase.table('subject_performance').select('*').eq('user_id', user_id))
         return response.data
     except Exception as e:
         logger.error(f"Error getting subject performance for user {user_id}: {e}")
@@ -178,7 +257,20 @@ def create_flashcard(card_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
 def get_user_flashcards(user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
     """Get flashcards for a user."""
     try:
-        response = supabase.table('flashcards').select('*').eq('user_id', user_id).eq('is_active', True).limit(limit).execute()
+        response = _execute_read(supabase.table('flashcards').select('*').eq('user_id', user_id).eq('is_active', True).limit(limit))
+        return response.data
+    except Exception as e:
+        logger.error(f"Error getting flashcards for user {user_id}: {e}")
+        return []
+
+async def get_user_flashcards_async(user_id: int, limit: int = 50, subject: Optional[str] = None, cursor: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Get a user's active flashcards, newest first, optionally for one subject and after a page cursor."""
+    try:
+        db = await get_async_supabase()
+        query = db.table('flashcards').select('*').eq('user_id', user_id).eq('is_active', True)
+        if subject:
+            query = query.eq('subject', subject)
+        response = await _aexecute_read(apply_keyset(query, 'created_at', 'card_id', cursor).limit(limit))
         return response.data
     except Exception as e:
         logger.error(f"Error getting flashcards for user {user_id}: {e}")
@@ -205,56 +297,66 @@ def delete_flashcard(card_id: int, user_id: int) -> bool:
 
 # ==================== RESOURCES ====================
 
-def create_resource(resource: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+async def create_resource_async(resource: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """Create a new resource."""
     try:
+        db = await get_async_supabase()
         resource["created_at"] = datetime.utcnow().isoformat()
-        response = supabase.table('resources').insert(resource).execute()
+        response = await db.table('resources').insert(resource).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         logger.error(f"Error creating resource: {e}")
         return None
 
-def update_resource(resource_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+async def update_resource_async(resource_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """Update a resource."""
     try:
+        db = await get_async_supabase()
         data["updated_at"] = datetime.utcnow().isoformat()
-        response = supabase.table('resources').update(data).eq('resource_id', resource_id).execute()
+        response = await db.table('resources').update(data).eq('resource_id', resource_id).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         logger.error(f"Error updating resource {resource_id}: {e}")
         return None
 
-def delete_resource(resource_id: int) -> bool:
+async def delete_resource_async(resource_id: int) -> bool:
     """Delete a resource."""
     try:
-        response = supabase.table('resources').delete().eq('resource_id', resource_id).execute()
+        db = await get_async_supabase()
+        response = await db.table('resources').delete().eq('resource_id', resource_id).execute()
         return len(response.data) > 0
     except Exception as e:
         logger.error(f"Error deleting resource {resource_id}: {e}")
         return False
 
-def get_resource(resource_id: int, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+async def get_resource_async(resource_id: int, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
     """Get a single resource. Includes is_favorite if user_id provided."""
     try:
-        resp = supabase.table('resources').select('*').eq('resource_id', resource_id).limit(1).execute()
+        db = await get_async_supabase()
+        resource_query = _aexecute_read(db.table('resources').select('*').eq('resource_id', resource_id).limit(1))
+        if user_id:
+            # The favorite lookup does not depend on the resource row, so run both together
+            resp, fav = await asyncio.gather(
+                resource_query,
+                db.table('resource_favorites').select('resource_id').eq('user_id', user_id).eq('resource_id', resource_id).limit(1).execute(),
+            )
+        else:
+            resp, fav = await resource_query, None
         resource = resp.data[0] if resp.data else None
         if not resource:
             return None
-        if user_id:
-            fav = supabase.table('resource_favorites').select('resource_id').eq('user_id', user_id).eq('resource_id', resource_id).execute()
-            resource["is_favorite"] = len(fav.data) > 0
-        else:
-            resource["is_favorite"] = False
+        resource["is_favorite"] = bool(fav and fav.data)
         return resource
     except Exception as e:
         logger.error(f"Error getting resource {resource_id}: {e}")
         return None
 
-def list_resources(filters: Dict[str, Any], user_id: Optional[int] = None, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+async def list_resources_async(filters: Dict[str, Any], user_id: Optional[int] = None, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
     """List resources with filters."""
     try:
-        query = supabase.table('resources').select('*')
+        db = await get_async_supabase()
+        # count='exact' returns the filtered total with the page itself
+        query = db.table('resources').select('*', count='exact')
         if filters.get("subject"):
             query = query.ilike('subject', f'%{filters["subject"]}%')
         if filters.get("grade_level") is not None:
@@ -264,32 +366,30 @@ def list_resources(filters: Dict[str, Any], user_id: Optional[int] = None, page:
         if filters.get("q"):
             q = filters["q"]
             # Search in title and description
-            # Supabase supports ilike chained with or via rpc; here do simple title filter then client-side merge
             query = query.or_(f"title.ilike.%{q}%,description.ilike.%{q}%")  # requires PostgREST or_ syntax
         # Pagination
         offset = (page - 1) * page_size
         query = query.range(offset, offset + page_size - 1)
-        resp = query.order('created_at', desc=True).execute()
+        resp = await _aexecute_read(query.order('created_at', desc=True))
         items = resp.data or []
-        total_resp = supabase.table('resources').select('resource_id', count='exact').execute()
-        total = total_resp.count or len(items)
-        if user_id:
-            fav_ids = supabase.table('resource_favorites').select('resource_id').eq('user_id', user_id).execute()
-            fav_set = set([r['resource_id'] for r in fav_ids.data])
-            for it in items:
-                it["is_favorite"] = it['resource_id'] in fav_set
-        else:
-            for it in items:
-                it["is_favorite"] = False
+        total = resp.count if resp.count is not None else len(items)
+        fav_set = set()
+        if user_id and items:
+            # Only the favorites among this page's resources are needed
+            fav_ids = await db.table('resource_favorites').select('resource_id').eq('user_id', user_id).in_('resource_id', [it['resource_id'] for it in items]).execute()
+            fav_set = {r['resource_id'] for r in fav_ids.data}
+        for it in items:
+            it["is_favorite"] = it['resource_id'] in fav_set
         return {"items": items, "total": total, "page": page, "page_size": page_size}
     except Exception as e:
         logger.error(f"Error listing resources: {e}")
         return {"items": [], "total": 0, "page": page, "page_size": page_size}
 
-def favorite_resource(user_id: int, resource_id: int) -> bool:
+async def favorite_resource_async(user_id: int, resource_id: int) -> bool:
     """Favorite a resource."""
     try:
-        supabase.table('resource_favorites').insert({
+        db = await get_async_supabase()
+        await db.table('resource_favorites').insert({
             "user_id": user_id,
             "resource_id": resource_id,
             "created_at": datetime.utcnow().isoformat()
@@ -299,10 +399,11 @@ def favorite_resource(user_id: int, resource_id: int) -> bool:
         logger.error(f"Error favoriting resource {resource_id} for user {user_id}: {e}")
         return False
 
-def unfavorite_resource(user_id: int, resource_id: int) -> bool:
+async def unfavorite_resource_async(user_id: int, resource_id: int) -> bool:
     """Remove favorite."""
     try:
-        resp = supabase.table('resource_favorites').delete().eq('user_id', user_id).eq('resource_id', resource_id).execute()
+        db = await get_async_supabase()
+        resp = await db.table('resource_favorites').delete().eq('user_id', user_id).eq('resource_id', resource_id).execute()
         return len(resp.data) > 0
     except Exception as e:
         logger.error(f"Error unfavoriting resource {resource_id} for user {user_id}: {e}")
@@ -332,9 +433,25 @@ def create_career_recommendation(rec_data: Dict[str, Any]) -> Optional[Dict[str,
         return None
 
 def get_user_career_recommendations(user_id: int) -> List[Dict[str, Any]]:
-    """Get career recommendations for a user."""
+    """Get career recommendations for a user, best match first (newest first on ties)."""
+    try:
+        response = _execute_read(
+            supabase.table('career_recommendations').select('*').eq('user_id', user_id)
+            .order('match_score', desc=True).order('generated_at', desc=True)
+        )
+        return response.data
+    except Exception as e:
+        logger.error(f"Error getting career recommendations for user {user_id}: {e}")
+        return []
+
+async def get_user_career_recommendations_async(user_id: int) -> List[Dict[str, Any]]:
+    """Async version of get_user_career_recommendations."""
     try:
-        response = supabase.table('career_recommendations').select('*').eq('user_id', user_id).order('generated_at', desc=True).execute()
+        db = await get_async_supabase()
+        response = await _aexecute_read(
+            db.table('career_recommendations').select('*').eq('user_id', user_id)
+            .order('match_score', desc=True).order('generated_at', desc=True)
+        )
         return response.data
     except Exception as e:
         logger.error(f"Error getting career recommendations for user {user_id}: {e}")
@@ -370,19 +487,38 @@ def create_study_plan(plan_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         logger.error(f"Error creating study plan: {e}")
         return None
 
-def get_user_study_plans(user_id: int) -> List[Dict[str, Any]]:
-    """Get study plans for a user."""
+def get_user_study_plans(user_id: int, status: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Get study plans for a user, optionally only those with a status (case-insensitive)."""
     try:
-        response = supabase.table('study_plans').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
+        query = supabase.table('study_plans').select('*').eq('user_id', user_id)
+        if status:
+            query = query.ilike('status', status)
+        response = _execute_read(query.order('created_at', desc=True))
         return response.data
     except Exception as e:
         logger.error(f"Error getting study plans for user {user_id}: {e}")
         return []
 
-def update_study_plan(plan_id: int, plan_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    """Update a study plan."""
+def update_study_plan(plan_id: int, plan_data: Dict[str, Any], user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Update a study plan (only the user's own plan when user_id is given)."""
+    try:
+        query = supabase.table('study_plans').update(plan_data).eq('plan_id', plan_id)
+        if user_id is not None:
+            query = query.eq('user_id', user_id)
+        response = query.execute()
+        return response.data[0] if response.data else None
+    except Exception as e:
+        logger.error(f"Error updating study plan {plan_id}: {e}")
+        return None
+
+async def update_study_plan_async(plan_id: int, plan_data: Dict[str, Any], user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Async version of update_study_plan."""
     try:
-        response = supabase.table('study_plans').update(plan_data).eq('plan_id', plan_id).execute()
+        db = await get_async_supabase()
+        query = db.table('study_plans').update(plan_data).eq('plan_id', plan_id)
+        if user_id is not None:
+            query = query.eq('user_id', user_id)
+        response = await query.execute()
         return response.data[0] if response.data else None
     except Exception as e:
         logger.error(f"Error updating study plan {plan_id}: {e}")
@@ -397,6 +533,16 @@ def delete_study_plan(plan_id: int, user_id: int) -> bool:
         logger.error(f"Error deleting study plan {plan_id}: {e}")
         return False
 
+async def delete_study_plan_async(plan_id: int, user_id: int) -> bool:
+    """Async version of delete_study_plan."""
+    try:
+        db = await get_async_supabase()
+        response = await db.table('study_plans').delete().eq('plan_id', plan_id).eq('user_id', user_id).execute()
+        return len(response.data) > 0
+    except Exception as e:
+        logger.error(f"Error deleting study plan {plan_id}: {e}")
+        return False
+
 
 # ==================== STUDY SESSIONS ====================
 
@@ -409,15 +555,74 @@ def create_study_session(session_data: Dict[str, Any]) -> Optional[Dict[str, Any
         logger.error(f"Error creating study session: {e}")
         return None
 
+async def create_study_sessions_async(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Insert several study sessions in one request."""
+    try:
+        db = await get_async_supabase()
+        response = await db.table('study_sessions').insert(rows).execute()
+        return response.data or []
+    except Exception as e:
+        logger.error(f"Error creating {len(rows)} study sessions: {e}")
+        return []
+
+async def create_study_session_async(session_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Async version of create_study_session."""
+    try:
+        db = await get_async_supabase()
+        response = await db.table('study_sessions').insert(session_data).execute()
+        return response.data[0] if response.data else None
+    except Exception as e:
+        logger.error(f"Error creating study session: {e}")
+        return None
+
 def get_user_study_sessions(user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
     """Get study sessions for a user."""
     try:
-        response = supabase.table('study_sessions').select('*').eq('user_id', user_id).order('date', desc=True).limit(limit).execute()
+        response = _execute_read(supabase.table('study_sessions').select('*').eq('user_id', user_id).order('date', desc=True).limit(limit))
         return response.data
     except Exception as e:
         logger.error(f"Error getting study sessions for user {user_id}: {e}")
         return []
 
+# Cleared the first time the database reports that study_plan_minutes does not exist;
+# after that the minutes are summed from the rows without trying the RPC again
+_plan_minutes_rpc_available = True
+
+# PostgREST "function not in schema cache" and Postgres undefined_function
+_MISSING_FUNCTION_CODES = frozenset({'PGRST202', '42883'})
+
+
+def _disable_plan_minutes_rpc(e: Exception) -> None:
+    """Remember that study_plan_minutes is missing, or re-raise any other error."""
+    global _plan_minutes_rpc_available
+    if getattr(e, 'code', None) not in _MISSING_FUNCTION_CODES:
+        raise e
+    logger.warning(f"study_plan_minutes function not found, summing study session rows instead: {e}")
+    _plan_minutes_rpc_available = False
+
+def get_plan_minutes_studied(plan_id: int) -> int:
+    """Total minutes logged against a study plan, summed in the database."""
+    if _plan_minutes_rpc_available:
+        try:
+            response = supabase.rpc('study_plan_minutes', {'p_plan_id': plan_id}).execute()
+            return int(response.data or 0)
+        except Exception as e:
+            _disable_plan_minutes_rpc(e)
+    response = _execute_read(supabase.table('study_sessions').select('duration_minutes').eq('plan_id', plan_id))
+    return sum(s['duration_minutes'] for s in response.data)
+
+async def get_plan_minutes_studied_async(plan_id: int) -> int:
+    """Async version of get_plan_minutes_studied."""
+    db = await get_async_supabase()
+    if _plan_minutes_rpc_available:
+        try:
+            response = await db.rpc('study_plan_minutes', {'p_plan_id': plan_id}).execute()
+            return int(response.data or 0)
+        except Exception as e:
+            _disable_plan_minutes_rpc(e)
+    response = await _aexecute_read(db.table('study_sessions').select('duration_minutes').eq('plan_id', plan_id))
+    return sum(s['duration_minutes'] for s in response.data)
+
 
 # ==================== LEARNING INSIGHTS ====================
 
@@ -430,19 +635,70 @@ def create_learning_insight(insight_data: Dict[str, Any]) -> Optional[Dict[str,
         logger.error(f"Error creating learning insight: {e}")
         return None
 
-def get_user_insights(user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
-    """Get learning insights for a user."""
+def get_user_insights(user_id: int, limit: int = 20, insight_types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Get learning insights for a user, optionally restricted to some insight types."""
+    try:
+        query = supabase.table('learning_insights').select('*').eq('user_id', user_id)
+        if insight_types:
+            query = query.in_('insight_type', insight_types)
+        response = _execute_read(query.order('generated_at', desc=True).limit(limit))
+        return response.data
+    except Exception as e:
+        logger.error(f"Error getting insights for user {user_id}: {e}")
+        return []
+
+def create_learning_insights(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Insert several learning insights in one request."""
+    try:
+        response = supabase.table('learning_insights').insert(rows).execute()
+        return response.data or []
+    except Exception as e:
+        logger.error(f"Error creating {len(rows)} learning insights: {e}")
+        return []
+
+async def create_learning_insights_async(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Insert several learning insights in one request."""
+    try:
+        db = await get_async_supabase()
+        response = await db.table('learning_insights').insert(rows).execute()
+        return response.data or []
+    except Exception as e:
+        logger.error(f"Error creating {len(rows)} learning insights: {e}")
+        return []
+
+async def get_user_insights_async(user_id: int, limit: int = 20, insight_types: Optional[List[str]] = None, cursor: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Async version of get_user_insights, optionally starting after a page cursor."""
     try:
-        response = supabase.table('learning_insights').select('*').eq('user_id', user_id).order('generated_at', desc=True).limit(limit).execute()
+        db = await get_async_supabase()
+        query = db.table('learning_insights').select('*').eq('user_id', user_id)
+        if insight_types:
+            query = query.in_('insight_type', insight_types)
+        response = await _aexecute_read(apply_keyset(query, 'generated_at', 'insight_id', cursor).limit(limit))
         return response.data
     except Exception as e:
         logger.error(f"Error getting insights for user {user_id}: {e}")
         return []
 
-def mark_insight_read(insight_id: int) -> bool:
-    """Mark an insight as read."""
+def mark_insight_read(insight_id: int, user_id: Optional[int] = None) -> bool:
+    """Mark an insight as read (only the user's own insight when user_id is given); False if none matched."""
+    try:
+        query = supabase.table('learning_insights').update({'is_read': True}).eq('insight_id', insight_id)
+        if user_id is not None:
+            query = query.eq('user_id', user_id)
+        response = query.execute()
+        return len(response.data) > 0
+    except Exception as e:
+        logger.error(f"Error marking insight {insight_id} as read: {e}")
+        return False
+
+async def mark_insight_read_async(insight_id: int, user_id: Optional[int] = None) -> bool:
+    """Async version of mark_insight_read; skips rows that are already read."""
     try:
-        supabase.table('learning_insights').update({'is_read': True}).eq('insight_id', insight_id).execute()
+        db = await get_async_supabase()
+        query = db.table('learning_insights').update({'is_read': True}).eq('insight_id', insight_id).eq('is_read', False)
+        if user_id is not None:
+            query = query.eq('user_id', user_id)
+        await query.execute()
         return True
     except Exception as e:
         logger.error(f"Error marking insight {insight_id} as read: {e}")
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Tests import the flat backend modules directly. config refuses to load without a SECRET_KEY,
+# and supabase_db refuses to import without a client (never contacted by these tests)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SKIP_SECRET_CHECK", "1")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.dGVzdA")
@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+
+import auth
+
+
+def _request():
+    return SimpleNamespace(state=SimpleNamespace())
+
+
+@pytest.fixture(autouse=True)
+def _clear_user_cache():
+    auth._user_cache.clear()
+    yield
+    auth._user_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_user_lookup_is_cached_until_invalidated():
+    token = auth.create_access_token({"sub": "7"})
+    lookup = Mock(side_effect=[
+        {"user_id": 7, "is_active": True, "full_name": "Before"},
+        {"user_id": 7, "is_active": True, "full_name": "After"},
+    ])
+    with patch.object(auth, "get_user_by_id", lookup):
+        first = await auth.get_current_user(_request(), token)
+        second = await auth.get_current_user(_request(), token)
+        assert lookup.call_count == 1
+        assert second["full_name"] == first["full_name"] == "Before"
+
+        auth.invalidate_user_cache(7)
+        third = await auth.get_current_user(_request(), token)
+
+    assert lookup.call_count == 2
+    assert third["full_name"] == "After"
+
+
+def test_invalidate_user_cache_ignores_unknown_users():
+    auth._user_cache[1] = {"user_id": 1}
+    auth.invalidate_user_cache(2)
+    assert 1 in auth._user_cache
+    auth.invalidate_user_cache(1)
+    assert 1 not in auth._user_cache
@@ -0,0 +1,76 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from cachetools import TTLCache
+
+from llm_service import LLMService
+
+
+def _service() -> LLMService:
+    service = LLMService.__new__(LLMService)
+    service.client_available = True
+    return service
+
+
+@pytest.mark.asyncio
+async def test_generate_without_schema_reaches_generate_raw():
+    with patch.object(LLMService, "_generate_raw", new=AsyncMock(return_value="ok")) as raw:
+        assert await _service().generate("prompt") == "ok"
+    raw.assert_awaited_once_with("prompt", None, None, False, None)
+
+
+@pytest.mark.asyncio
+async def test_generate_passes_schema_to_generate_raw():
+    schema = {"type": "object", "properties": {"title": {"type": "string"}}}
+    with patch.object(LLMService, "_generate_raw", new=AsyncMock(return_value="{}")) as raw:
+        assert await _service().generate("prompt", json_mode=True, schema=schema) == "{}"
+    raw.assert_awaited_once_with("prompt", None, None, True, schema)
+
+
+def _caching_service() -> LLMService:
+    service = _service()
+    service._cache = TTLCache(maxsize=16, ttl=60)
+    service._inflight = {}
+    service._redis = None
+    return service
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_prompts_share_one_call():
+    service = _caching_service()
+    release = asyncio.Event()
+
+    async def generate_json(prompt, schema=None):
+        await release.wait()
+        return {"answer": 42}
+
+    generate = AsyncMock(side_effect=generate_json)
+    with patch.object(LLMService, "_generate_json", new=generate):
+        callers = asyncio.gather(*(service._cached_generate_json("same prompt") for _ in range(3)))
+        await asyncio.sleep(0)
+        release.set()
+        results = await callers
+
+        assert generate.await_count == 1
+        assert results == [{"answer": 42}] * 3
+        # Each caller gets its own copy of the cached dict
+        results[0]["answer"] = 0
+        assert await service._cached_generate_json("same prompt") == {"answer": 42}
+        assert generate.await_count == 1
+    assert service._inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_failed_call_is_not_cached():
+    service = _caching_service()
+    generate = AsyncMock(side_effect=[RuntimeError("Gemini API error"), {"answer": 42}])
+    with patch.object(LLMService, "_generate_json", new=generate):
+        with pytest.raises(RuntimeError):
+            await service._cached_generate_json("prompt")
+        await asyncio.sleep(0)
+        assert len(service._cache) == 0
+        assert service._inflight == {}
+
+        assert await service._cached_generate_json("prompt") == {"answer": 42}
+    assert generate.await_count == 2
@@ -0,0 +1,71 @@
+import re
+from urllib.parse import parse_qs, urlencode
+
+from supabase_db import CURSOR_PATTERN, apply_keyset, next_cursor
+
+
+class _RecordingQuery:
+    """Stands in for a PostgREST query builder and records the filters applied to it."""
+
+    def __init__(self):
+        self.filters = []
+        self.orders = []
+
+    def or_(self, expression):
+        self.filters.append(expression)
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+
+def _round_trip(cursor: str, encode: bool) -> str:
+    """What the route receives when a client sends the cursor back in the query string."""
+    query_string = urlencode({"cursor": cursor}) if encode else f"cursor={cursor}"
+    return parse_qs(query_string)["cursor"][0]
+
+
+ROWS = [
+    {"created_at": "2026-10-15T10:00:00.5+00:00", "flashcard_id": 12},
+    {"created_at": "2026-10-15T09:00:00+00:00", "flashcard_id": 11},
+]
+
+
+def test_next_cursor_is_none_for_a_short_page():
+    assert next_cursor(ROWS, "created_at", "flashcard_id", limit=3) is None
+
+
+def test_next_cursor_points_at_the_last_row():
+    assert next_cursor(ROWS, "created_at", "flashcard_id", limit=2) == "2026-10-15T09:00:00+00:00|11"
+
+
+def test_apply_keyset_without_cursor_only_orders():
+    query = apply_keyset(_RecordingQuery(), "created_at", "flashcard_id")
+    assert query.filters == []
+    assert query.orders == [("created_at", True), ("flashcard_id", True)]
+
+
+def test_cursor_round_trip_encoded():
+    cursor = _round_trip(next_cursor(ROWS, "created_at", "flashcard_id", limit=2), encode=True)
+    assert re.match(CURSOR_PATTERN, cursor)
+    query = apply_keyset(_RecordingQuery(), "created_at", "flashcard_id", cursor)
+    assert query.filters == [
+        'created_at.lt."2026-10-15T09:00:00+00:00",'
+        'and(created_at.eq."2026-10-15T09:00:00+00:00",flashcard_id.lt.11)'
+    ]
+
+
+def test_cursor_sent_unencoded_restores_the_offset_sign():
+    cursor = _round_trip(next_cursor(ROWS, "created_at", "flashcard_id", limit=2), encode=False)
+    # The "+" arrives decoded as a space; the route pattern must still accept it
+    assert cursor == "2026-10-15T09:00:00 00:00|11"
+    assert re.match(CURSOR_PATTERN, cursor)
+    query = apply_keyset(_RecordingQuery(), "created_at", "flashcard_id", cursor)
+    assert '"2026-10-15T09:00:00+00:00"' in query.filters[0]
+    assert " " not in query.filters[0]
+
+
+def test_cursor_pattern_rejects_filter_injection():
+    assert not re.match(CURSOR_PATTERN, '2026-10-15T09:00:00",user_id.neq.0|11')
+    assert not re.match(CURSOR_PATTERN, "2026-10-15T09:00:00|abc")
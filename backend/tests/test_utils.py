@@ -0,0 +1,34 @@
+import io
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from utils import UPLOAD_CHUNK_SIZE, _copy_upload, _read_upload
+
+
+def test_read_upload_accepts_exactly_max_size():
+    assert _read_upload(io.BytesIO(b"x" * 10), max_size=10) == b"x" * 10
+
+
+def test_read_upload_rejects_one_byte_over():
+    with pytest.raises(HTTPException) as exc:
+        _read_upload(io.BytesIO(b"x" * 11), max_size=10)
+    assert exc.value.status_code == 413
+
+
+def test_copy_upload_accepts_exactly_max_size(tmp_path):
+    path = tmp_path / "upload.bin"
+    data = b"x" * (UPLOAD_CHUNK_SIZE + 5)
+    assert _copy_upload(io.BytesIO(data), str(path), max_size=len(data)) == len(data)
+    assert path.read_bytes() == data
+
+
+def test_copy_upload_rejects_and_removes_partial_file(tmp_path):
+    path = tmp_path / "upload.bin"
+    # Over the limit only in the second chunk, after the first has been written
+    data = b"x" * (UPLOAD_CHUNK_SIZE + 1)
+    with pytest.raises(HTTPException) as exc:
+        _copy_upload(io.BytesIO(data), str(path), max_size=UPLOAD_CHUNK_SIZE)
+    assert exc.value.status_code == 413
+    assert not os.path.exists(path)
@@ -2,10 +2,21 @@
 Utility functions and algorithms for SmartPath.
 Includes grade conversion, GPA calculation, trend analysis, and more.
 """
+import asyncio
+import hashlib
+import logging
 import os
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import BinaryIO, Dict, List, Optional, Tuple
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from cachetools import TTLCache
+from fastapi import HTTPException, UploadFile, status
+
+logger = logging.getLogger(__name__)
 
 
 # ==================== GRADE CONVERSION ====================
@@ -345,6 +356,7 @@ def calculate_next_review_date(
     return last_reviewed + timedelta(days=interval_days)
 
 
+@lru_cache(maxsize=4096)
 def calculate_mastery_level(
     times_reviewed: int,
     times_correct: int,
@@ -495,8 +507,16 @@ def extract_grades_with_gemini(image_path: str) -> Dict[str, str]:
         Dictionary of {subject: grade}
     """
     try:
-        import google.generativeai as genai
         from PIL import Image
+    except ImportError:
+        raise RuntimeError("Pillow not installed. Please install it:\npip install Pillow")
+    return _extract_grades_from_image(Image.open(image_path))
+
+
+def _extract_grades_from_image(image) -> Dict[str, str]:
+    """Extract grades from an in-memory PIL image using Gemini Vision AI."""
+    try:
+        from llm_service import get_gemini_model
         
         # Get API key from config
         from config import settings
@@ -507,14 +527,9 @@ def extract_grades_with_gemini(image_path: str) -> Dict[str, str]:
                 "Get your API key from: https://makersuite.google.com/app/apikey"
             )
         
-        # Configure Gemini
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        
-        # Use Gemini 1.5 Flash for vision (fast and cost-effective)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        # Open the image
-        image = Image.open(image_path)
+        # Shared model instance: reuses the configured client and its warm connection
+        # instead of reconfiguring Gemini for every uploaded report
+        model = get_gemini_model('gemini-2.5-flash')
         
         # Create a detailed prompt for grade extraction
         prompt = """You are analyzing a student report card. Extract ALL subject names and their corresponding grades.
@@ -581,7 +596,7 @@ CRITICAL: Return ONLY the JSON object, no other text. If no grades are found, re
             
         except json.JSONDecodeError:
             # If JSON parsing fails, try to extract key-value pairs manually
-            print(f"Failed to parse JSON response: {response_text}")
+            logger.warning("Failed to parse JSON response: %s", response_text)
             return {}
             
     except ImportError:
@@ -593,10 +608,14 @@ CRITICAL: Return ONLY the JSON object, no other text. If no grades are found, re
         raise RuntimeError(f"Gemini AI extraction failed: {str(e)}")
 
 
+_PDF_MAX_PAGES = 4  # report cards rarely span more pages; bounds Gemini calls per upload
+
+
 def extract_grades_from_pdf_with_gemini(pdf_path: str) -> Dict[str, str]:
     """Extract grades from PDF report card using Gemini Vision AI.
     
-    For PDFs, we convert the first page to an image and use Gemini to analyze it.
+    For PDFs, we convert the first few pages to images and analyze them concurrently.
+    Grades found on earlier pages take precedence.
     
     Args:
         pdf_path: Path to the PDF file
@@ -606,12 +625,11 @@ def extract_grades_from_pdf_with_gemini(pdf_path: str) -> Dict[str, str]:
     """
     try:
         from pdf2image import convert_from_path
-        import tempfile
         
-        # Convert first page of PDF to image
+        # Convert the leading pages of the PDF to images
         # Check if poppler is available (but don't require it)
         try:
-            images = convert_from_path(pdf_path, dpi=300, first_page=1, last_page=1)
+            images = convert_from_path(pdf_path, dpi=300, first_page=1, last_page=_PDF_MAX_PAGES)
         except Exception as e:
             # If pdf2image fails, try without it (user might have removed poppler)
             raise RuntimeError(
@@ -619,23 +637,31 @@ def extract_grades_from_pdf_with_gemini(pdf_path: str) -> Dict[str, str]:
                 "Alternatively, convert the PDF to an image (PNG/JPG) and upload that.\n"
                 f"Error: {str(e)}"
             )
-        
-        if not images:
-            raise RuntimeError("Could not extract any pages from the PDF")
-        
-        # Save the first page as a temporary image
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-            images[0].save(tmp_file.name, 'PNG')
-            temp_image_path = tmp_file.name
+        return _extract_grades_from_pdf_pages(images)
+                
+    except ImportError:
+        raise RuntimeError(
+            "pdf2image not installed. Please install it:\n"
+            "pip install pdf2image\n"
+            "Or convert your PDF to PNG/JPG and upload the image instead."
+        )
+
+
+def extract_grades_from_pdf_bytes(content: bytes) -> Dict[str, str]:
+    """Extract grades from an in-memory PDF using Gemini Vision AI (no temp file)."""
+    try:
+        from pdf2image import convert_from_bytes
         
         try:
-            # Use Gemini to extract grades from the image
-            grades = extract_grades_with_gemini(temp_image_path)
-            return grades
-        finally:
-            # Clean up temp file
-            if os.path.exists(temp_image_path):
-                os.unlink(temp_image_path)
+            images = convert_from_bytes(content, dpi=300, first_page=1, last_page=_PDF_MAX_PAGES)
+        except Exception as e:
+            # If pdf2image fails, try without it (user might have removed poppler)
+            raise RuntimeError(
+                "Could not convert PDF to image. Please install poppler-utils.\n"
+                "Alternatively, convert the PDF to an image (PNG/JPG) and upload that.\n"
+                f"Error: {str(e)}"
+            )
+        return _extract_grades_from_pdf_pages(images)
                 
     except ImportError:
         raise RuntimeError(
@@ -645,6 +671,34 @@ def extract_grades_from_pdf_with_gemini(pdf_path: str) -> Dict[str, str]:
         )
 
 
+def _extract_grades_from_pdf_pages(images) -> Dict[str, str]:
+    """Extract grades from rendered PDF pages; grades on earlier pages take precedence."""
+    if not images:
+        raise RuntimeError("Could not extract any pages from the PDF")
+    
+    if len(images) == 1:
+        return _extract_grades_from_image(images[0])
+    
+    # Pages run one after another inside the caller's OCR slot, so OCR_CONCURRENCY
+    # stays the bound on concurrent Gemini calls; a failed page does not sink the rest
+    results = []
+    for image in images:
+        try:
+            results.append(_extract_grades_from_image(image))
+        except Exception as e:
+            results.append(e)
+    
+    grades: Dict[str, str] = {}
+    errors = [r for r in results if isinstance(r, Exception)]
+    if len(errors) == len(results):
+        raise errors[0]
+    for page_grades in results:
+        if not isinstance(page_grades, Exception):
+            for subject, grade in page_grades.items():
+                grades.setdefault(subject, grade)
+    return grades
+
+
 def extract_grades_from_file(file_path: str, file_type: Optional[str] = None) -> Dict[str, str]:
     """Extract grades from an uploaded file (image or PDF).
     
@@ -677,10 +731,78 @@ def extract_grades_from_file(file_path: str, file_type: Optional[str] = None) ->
             raise ValueError(f"Unsupported file type: {file_type}")
     except Exception as e:
         # Return empty dict on error but log it
-        print(f"Error extracting grades from file: {e}")
+        logger.error("Error extracting grades from file: %s", e)
+        return {}
+
+
+def extract_grades_from_bytes(content: bytes, file_type: Optional[str]) -> Dict[str, str]:
+    """Extract grades from an in-memory upload (image or PDF) without writing it to disk."""
+    try:
+        if file_type == 'application/pdf':
+            return extract_grades_from_pdf_bytes(content)
+        elif file_type and file_type.startswith('image/'):
+            try:
+                from PIL import Image
+            except ImportError:
+                raise RuntimeError("Pillow not installed. Please install it:\npip install Pillow")
+            import io
+            return _extract_grades_from_image(Image.open(io.BytesIO(content)))
+        else:
+            raise ValueError(f"Unsupported file type: {file_type}")
+    except Exception as e:
+        # Return empty dict on error but log it
+        logger.error("Error extracting grades from upload: %s", e)
         return {}
 
 
+_ocr_semaphore: Optional[asyncio.Semaphore] = None
+_ocr_executor: Optional[ThreadPoolExecutor] = None
+
+# Grades keyed by SHA-256 of the file bytes, so retried uploads of the same file skip Gemini
+_ocr_cache: TTLCache = TTLCache(maxsize=256, ttl=3600)
+_ocr_cache_lock = threading.Lock()
+
+
+def _memoized_grades(digest: str, file_type: Optional[str], extract) -> Dict[str, str]:
+    """Return cached grades for a content hash, running extract() on a miss."""
+    key = (digest, file_type)
+    with _ocr_cache_lock:
+        cached = _ocr_cache.get(key)
+    if cached is not None:
+        return dict(cached)
+
+    grades = extract()
+    # Empty results are usually transient failures, so they are not cached
+    if grades:
+        with _ocr_cache_lock:
+            _ocr_cache[key] = dict(grades)
+    return grades
+
+
+def _extract_grades_from_bytes_cached(content: bytes, file_type: Optional[str]) -> Dict[str, str]:
+    """extract_grades_from_bytes memoized on the content hash."""
+    digest = hashlib.sha256(content).hexdigest()
+    return _memoized_grades(digest, file_type, lambda: extract_grades_from_bytes(content, file_type))
+
+
+async def _run_ocr(func, *args) -> Dict[str, str]:
+    """Run an extraction on a dedicated OCR pool, bounded by OCR_CONCURRENCY."""
+    global _ocr_semaphore, _ocr_executor
+    if _ocr_semaphore is None:
+        from config import settings
+        _ocr_semaphore = asyncio.Semaphore(settings.OCR_CONCURRENCY)
+        # Own pool so slow Gemini/Tesseract calls never starve the default threadpool used by sync routes
+        _ocr_executor = ThreadPoolExecutor(max_workers=settings.OCR_CONCURRENCY, thread_name_prefix="ocr")
+    async with _ocr_semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_ocr_executor, func, *args)
+
+
+async def extract_grades_from_bytes_async(content: bytes, file_type: Optional[str]) -> Dict[str, str]:
+    """Async extract_grades_from_bytes on the OCR pool."""
+    return await _run_ocr(_extract_grades_from_bytes_cached, content, file_type)
+
+
 def normalize_subject_name(subject: str) -> str:
     """Normalize subject name to standard format."""
     subject = subject.strip().title()
@@ -746,3 +868,63 @@ def get_term_dates(year: int, term: int) -> Tuple[datetime, datetime]:
     
     return start, end
 
+
+# ==================== FILE UPLOADS ====================
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+def write_file_bytes(path: str, data: bytes) -> None:
+    """Write a buffer to disk in one go; call via asyncio.to_thread from async code."""
+    with open(path, 'wb') as out:
+        out.write(data)
+
+
+def _copy_upload(src: BinaryIO, path: str, max_size: int) -> int:
+    """Copy a spooled upload to disk in chunks, raising 413 once it exceeds max_size."""
+    written = 0
+    try:
+        with open(path, 'wb') as out:
+            while chunk := src.read(UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > max_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="File size exceeds maximum allowed size"
+                    )
+                out.write(chunk)
+    except BaseException:
+        # Never leave a partial file behind
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return written
+
+
+def _read_upload(src: BinaryIO, max_size: int) -> bytes:
+    """Read a spooled upload into memory, raising 413 once it exceeds max_size."""
+    content = src.read(max_size + 1)
+    if len(content) > max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="File size exceeds maximum allowed size"
+        )
+    return content
+
+
+async def read_upload_bytes(file: UploadFile, max_size: Optional[int] = None) -> bytes:
+    """Read an upload into memory in a single worker-thread hop, aborting with 413 past max_size."""
+    if max_size is None:
+        from config import settings
+        max_size = settings.MAX_FILE_SIZE
+    await file.seek(0)
+    return await asyncio.to_thread(_read_upload, file.file, max_size)
+
+
+async def save_upload_file(file: UploadFile, path: str, max_size: Optional[int] = None) -> int:
+    """Copy an upload to disk in a single worker-thread hop, aborting with 413 past max_size."""
+    if max_size is None:
+        from config import settings
+        max_size = settings.MAX_FILE_SIZE
+    await file.seek(0)
+    return await asyncio.to_thread(_copy_upload, file.file, path, max_size)